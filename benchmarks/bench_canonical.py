@@ -0,0 +1,77 @@
+# benchmarks/bench_canonical.py
+"""
+Сравнивает подготовку кадра для GIF из исходного файла и из канонического
+кадра, который image_processing создаёт при загрузке (поворот по EXIF
+применён, RGB/RGBA, размер не больше CANONICAL_MAX_SIZE).
+
+Для каждого формата печатает время подготовки кадра на генерацию (из
+исходного файла и из канонического), разовое время нормализации при
+загрузке и размеры файлов. Исходные файлы — фотографии 12 Мп с тегом EXIF
+Orientation (кроме BMP).
+
+Запуск:
+    python benchmarks/bench_canonical.py [--size 480x360]
+"""
+
+import argparse  # Для разбора аргументов
+import os  # Для работы с файловой системой
+import sys  # Для доступа к путям
+import tempfile  # Для временных каталогов
+import time  # Для измерения времени
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'gif_generator'))
+sys.path.insert(0, os.path.join(ROOT, 'image_processing'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from PIL import Image  # noqa: E402
+from corpus import make_corpus  # noqa: E402
+from derivatives import CANONICAL_MAX_SIZE, _normalize, _save_canonical  # noqa: E402
+from pipeline import load_frame, parse_resize  # noqa: E402
+
+FORMATS = ('JPEG', 'PNG', 'TIFF', 'BMP')
+IMAGE_COUNT = 8
+# Размер типичной фотографии с телефона
+IMAGE_SIZE = (4032, 3024)
+
+
+def per_frame(loader, paths):
+    """Возвращает среднее время вызова loader(path) в миллисекундах."""
+    started = time.perf_counter()
+    for path in paths:
+        loader(path)
+    return (time.perf_counter() - started) / len(paths) * 1000
+
+
+def normalize(source, target):
+    with Image.open(source) as img:
+        _save_canonical(_normalize(img, CANONICAL_MAX_SIZE), target)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', default='480x360', help='Размер кадра GIF')
+    args = parser.parse_args()
+    size = parse_resize(args.size)
+
+    print(f'Кадр {size[0]}x{size[1]}, исходные файлы {IMAGE_SIZE[0]}x{IMAGE_SIZE[1]}, '
+          f'канонический кадр не больше {CANONICAL_MAX_SIZE} px')
+    with tempfile.TemporaryDirectory() as folder:
+        for fmt in FORMATS:
+            fmt_folder = os.path.join(folder, fmt)
+            names = make_corpus(fmt_folder, IMAGE_COUNT, *IMAGE_SIZE, fmt, orientations=True)
+            sources = [os.path.join(fmt_folder, name) for name in names]
+            canonicals = [f'{path}.canonical' for path in sources]
+            ingest = per_frame(lambda path: normalize(path, f'{path}.canonical'), sources)
+            original = per_frame(lambda path: load_frame(path, size), sources)
+            canonical = per_frame(lambda path: load_frame(path, size), canonicals)
+            source_mib = sum(map(os.path.getsize, sources)) / len(sources) / 1024 / 1024
+            canonical_mib = sum(map(os.path.getsize, canonicals)) / len(canonicals) / 1024 / 1024
+            print(f'{fmt:>5}: кадр из исходного файла {original:6.1f} мс, из канонического {canonical:5.1f} мс '
+                  f'(x{original / canonical:.1f}); нормализация при загрузке {ingest:6.1f} мс; '
+                  f'файл {source_mib:.1f} -> {canonical_mib:.1f} МиБ')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# benchmarks/bench_delta_encoding.py
+"""
+Измеряет эффект межкадрового дельта-кодирования в GifEncoder:
+размер файла, время кодирования и долю перерисованных пикселей
+для полных кадров и для записи только изменившихся областей.
+
+Запуск:
+    python benchmarks/bench_delta_encoding.py
+"""
+
+import io  # Для кодирования в память
+import os  # Для работы с путями
+import sys  # Для доступа к путям
+
+import numpy as np  # Для подготовки кадров
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'gif_generator'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from corpus import make_image, make_slideshow  # noqa: E402
+from encoder import GifEncoder  # noqa: E402
+
+VARIANTS = (
+    ('полные кадры', {'delta': False}),
+    ('дельта', {'delta': True}),
+    ('дельта, допуск 8', {'delta': True, 'tolerance': 8}),
+)
+
+
+def main():
+    corpora = {
+        'слайд-шоу': make_slideshow(60),
+        'фотографии': [np.array(make_image(640, 480, seed)) for seed in range(30)],
+    }
+    for corpus_name, frames in corpora.items():
+        for variant_name, options in VARIANTS:
+            buffer = io.BytesIO()
+            with GifEncoder(buffer, 200, 0, **options) as encoder:
+                for frame in frames:
+                    encoder.add_frame(frame)
+            print(f'{corpus_name:>10} {variant_name:>17}: {encoder.bytes_written / 1024:8.1f} КиБ, '
+                  f'{encoder.encode_seconds:5.2f} с, перерисовано {encoder.changed_ratio():6.1%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# benchmarks/bench_draft_decode.py
+"""
+Сравнивает загрузку кадра с уменьшенным декодированием (draft/reduce)
+с полной загрузкой и передискретизацией LANCZOS.
+
+Печатает время на кадр для обоих путей и расхождение результатов
+(средняя и максимальная абсолютная разница в уровнях 0..255).
+
+Запуск:
+    python benchmarks/bench_draft_decode.py
+"""
+
+import os  # Для работы с файловой системой
+import sys  # Для доступа к путям
+import tempfile  # Для временных каталогов
+import time  # Для измерения времени
+
+import numpy as np  # Для сравнения кадров
+from PIL import Image, ImageOps  # Для эталонного пути загрузки
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'gif_generator'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from corpus import make_corpus  # noqa: E402
+from pipeline import load_frame  # noqa: E402
+
+SIZE = (320, 240)
+FORMATS = ('JPEG', 'PNG')
+
+
+def load_frame_full(image_path, size):
+    """Эталонный путь: полное декодирование и LANCZOS без предварительного уменьшения."""
+    with Image.open(image_path) as img:
+        img = ImageOps.exif_transpose(img)
+        return np.array(img.resize(size, Image.LANCZOS))
+
+
+def timed(loader, paths):
+    """Загружает все кадры и возвращает (кадры, секунды на кадр)."""
+    started = time.perf_counter()
+    frames = [loader(path, SIZE) for path in paths]
+    return frames, (time.perf_counter() - started) / len(paths)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        for fmt in FORMATS:
+            # Разрешение типичной фотографии с телефона (12 Мп)
+            names = make_corpus(os.path.join(folder, fmt), 8, 4000, 3000, fmt)
+            paths = [os.path.join(folder, fmt, name) for name in names]
+            full, full_time = timed(load_frame_full, paths)
+            fast, fast_time = timed(load_frame, paths)
+            diff = np.abs(np.stack(full).astype(np.int16) - np.stack(fast).astype(np.int16))
+            print(f'{fmt}: полный путь {full_time * 1000:.0f} мс/кадр, '
+                  f'уменьшенное декодирование {fast_time * 1000:.0f} мс/кадр '
+                  f'(x{full_time / fast_time:.1f}); '
+                  f'расхождение: среднее {diff.mean():.2f}, максимум {diff.max()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+# benchmarks/bench_flow.py
+"""
+Сквозной бенчмарк пути загрузка → перестановка → генерация GIF.
+
+Для каждого корпуса (формат × количество × размер, см. corpus.make_corpus;
+JPEG, PNG и TIFF — с тегами EXIF Orientation 1–8) выполняются этапы:
+- upload: image_processing /upload через тестовый клиент, пачками по --batch
+  файлов (тело multipart собирается заранее и в замер не входит); отдельно —
+  время до готовности миниатюр и превью (фоновые потоки);
+- reorder: image_processing /reorder_images, --reorders случайных
+  перестановок с проверкой версии манифеста;
+- generate: gif_generator /generate_gif и опрос /jobs/<id> до завершения,
+  --runs запусков на каждый способ оптимизации. Кэш готовых GIF перед каждым
+  запуском очищается; первый запуск идёт с пустым кэшем кадров (cold), для
+  остальных кадры уже подготовлены (warm).
+
+Каждый этап выполняется в отдельном процессе сервиса с общей папкой
+загрузок, поэтому пиковый RSS (VmHWM) относится к одному этапу. Процессы
+пула декодирования gif_generator в RSS не входят.
+
+Результаты записываются в JSON (--output) вместе с коммитом, версиями и
+параметрами запуска. Два файла сравниваются командой --compare.
+
+Запуск:
+    python benchmarks/bench_flow.py [--formats JPEG,PNG,BMP,TIFF] [--counts 20] [--sizes 1280x960]
+        [--batch 10] [--reorders 50] [--runs 3] [--optimizers inprocess,none] [--resize 480x360]
+        [--output bench_flow.json]
+    python benchmarks/bench_flow.py --compare old.json new.json
+"""
+
+import argparse  # Для разбора аргументов
+import io  # Для тела запроса в памяти
+import json  # Для передачи результатов и файла отчёта
+import os  # Для работы с файловой системой
+import platform  # Для описания окружения
+import random  # Для случайных перестановок
+import shutil  # Для очистки кэша результатов
+import subprocess  # Для запуска этапов в отдельных процессах
+import sys  # Для доступа к интерпретатору и путям
+import tempfile  # Для временных каталогов
+import time  # Для измерения времени
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from corpus import make_corpus  # noqa: E402
+
+FORMATS = ('JPEG', 'PNG', 'BMP', 'TIFF')
+SERVICES = {'upload': 'image_processing', 'reorder': 'image_processing', 'generate': 'gif_generator'}
+SESSION_ID = 'bench'
+BOUNDARY = 'benchflowboundary'
+# Интервал опроса статуса задачи генерации, с
+POLL_INTERVAL = 0.01
+
+
+def proc_value(key):
+    """Возвращает числовое значение поля key из /proc/self/status (в КиБ)."""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(key):
+                return int(line.split()[1])
+    return 0
+
+
+def summary(values):
+    """Возвращает среднее, p50, p90, p99 и максимум списка длительностей в миллисекундах."""
+    values = sorted(value * 1000 for value in values)
+    if not values:
+        return None
+
+    def percentile(q):
+        return round(values[min(len(values) - 1, int(len(values) * q))], 2)
+
+    return {'count': len(values), 'mean': round(sum(values) / len(values), 2), 'p50': percentile(0.5),
+            'p90': percentile(0.9), 'p99': percentile(0.99), 'max': round(values[-1], 2)}
+
+
+def multipart_body(folder, names):
+    """Собирает тело multipart/form-data с файлами names из folder."""
+    parts = []
+    for name in names:
+        with open(os.path.join(folder, name), 'rb') as f:
+            data = f.read()
+        parts.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; filename="{name}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n'.encode() + data + b'\r\n')
+    parts.append(f'--{BOUNDARY}--\r\n'.encode())
+    return b''.join(parts)
+
+
+def stage_upload(uploads, corpus_dir, batch):
+    import main
+    import derivatives
+
+    main.uploads_root = uploads
+    client = main.app.test_client()
+    names = sorted(os.listdir(corpus_dir))
+    bodies = [multipart_body(corpus_dir, names[i:i + batch]) for i in range(0, len(names), batch)]
+    latencies = []
+    started = time.perf_counter()
+    for body in bodies:
+        request_started = time.perf_counter()
+        response = client.post('/upload', input_stream=io.BytesIO(body), content_length=len(body),
+                               content_type=f'multipart/form-data; boundary={BOUNDARY}',
+                               headers={'X-Session-ID': SESSION_ID})
+        latencies.append(time.perf_counter() - request_started)
+        assert response.status_code == 200, response.data
+    elapsed = time.perf_counter() - started
+    # Миниатюры и превью создаются в фоне после ответа: ждём их отдельно
+    if derivatives._executor is not None:
+        derivatives._executor.shutdown(wait=True)
+    derivatives_elapsed = time.perf_counter() - started
+    total_bytes = sum(len(body) for body in bodies)
+    return {'requests': len(bodies), 'files': len(names), 'bytes': total_bytes,
+            'seconds': round(elapsed, 4), 'mib_per_s': round(total_bytes / 1024 / 1024 / elapsed, 2),
+            'files_per_s': round(len(names) / elapsed, 2), 'latency_ms': summary(latencies),
+            'derivatives_ready_seconds': round(derivatives_elapsed, 4)}
+
+
+def stage_reorder(uploads, reorders):
+    import main
+    from common.manifest import read_manifest, image_names
+
+    main.uploads_root = uploads
+    client = main.app.test_client()
+    manifest = read_manifest(os.path.join(uploads, SESSION_ID))
+    names, version = image_names(manifest), manifest['version']
+    rng = random.Random(0)
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(reorders):
+        rng.shuffle(names)
+        data = {'image_order': json.dumps({str(idx): name for idx, name in enumerate(names)}),
+                'version': str(version)}
+        request_started = time.perf_counter()
+        response = client.post('/reorder_images', data=data, headers={'X-Session-ID': SESSION_ID})
+        latencies.append(time.perf_counter() - request_started)
+        assert response.status_code == 200, response.data
+        version = response.get_json()['version']
+    elapsed = time.perf_counter() - started
+    return {'requests': reorders, 'frames': len(names), 'seconds': round(elapsed, 4),
+            'requests_per_s': round(reorders / elapsed, 2), 'latency_ms': summary(latencies)}
+
+
+def stage_generate(uploads, runs, optimizers, resize):
+    import main
+
+    main.uploads_root = uploads
+    client = main.app.test_client()
+    headers = {'X-Session-ID': SESSION_ID}
+    gif_file = os.path.join(uploads, SESSION_ID, 'animation.gif')
+    results = {}
+    for optimizer in optimizers:
+        latencies = []
+        cold = None
+        frames = gif_bytes = 0
+        for run in range(runs):
+            # Иначе второй и следующие запуски отдали бы GIF из кэша результатов
+            shutil.rmtree(main.result_cache.root, ignore_errors=True)
+            if run == 0:
+                shutil.rmtree(os.path.join(uploads, SESSION_ID, '.frames'), ignore_errors=True)
+            started = time.perf_counter()
+            response = client.post('/generate_gif', headers=headers,
+                                   data={'duration': 100, 'loop': 0, 'resize': resize or '', 'optimizer': optimizer})
+            assert response.status_code == 202, response.data
+            job_id = response.get_json()['job_id']
+            while True:
+                job = client.get(f'/jobs/{job_id}', headers=headers).get_json()
+                if job['status'] in ('done', 'failed'):
+                    break
+                time.sleep(POLL_INTERVAL)
+            elapsed = time.perf_counter() - started
+            assert job['status'] == 'done', job
+            frames, gif_bytes = job['frames_total'], os.path.getsize(gif_file)
+            if run == 0:
+                cold = elapsed
+            else:
+                latencies.append(elapsed)
+        results[optimizer] = {'frames': frames, 'gif_bytes': gif_bytes, 'cold_seconds': round(cold, 4),
+                              'warm_latency_ms': summary(latencies),
+                              'warm_frames_per_s': round(frames / (sum(latencies) / len(latencies)), 2)
+                              if latencies else None}
+    return results
+
+
+def run_child(stage, args):
+    """Выполняет этап в процессе сервиса и печатает результат одной JSON-строкой."""
+    sys.path.insert(0, os.path.join(ROOT, SERVICES[stage]))
+    if stage == 'upload':
+        result = stage_upload(args['uploads'], args['corpus'], args['batch'])
+    elif stage == 'reorder':
+        result = stage_reorder(args['uploads'], args['reorders'])
+    else:
+        result = stage_generate(args['uploads'], args['runs'], args['optimizers'], args['resize'])
+    result['peak_rss_mib'] = round(proc_value('VmHWM:') / 1024, 1)
+    print(json.dumps(result))
+
+
+def run_stage(stage, args, env):
+    output = subprocess.check_output([sys.executable, __file__, '--child', stage, json.dumps(args)], env=env)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def environment():
+    """Коммит, версии и параметры машины для отчёта."""
+    def git(*command):
+        try:
+            return subprocess.check_output(['git', *command], cwd=ROOT, stderr=subprocess.DEVNULL).decode().strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    import numpy
+    import PIL
+
+    return {'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'python': platform.python_version(),
+            'platform': platform.platform(), 'cpus': os.cpu_count(), 'pillow': PIL.__version__,
+            'numpy': numpy.__version__}
+
+
+def run(args):
+    report = {'environment': environment(), 'parameters': vars(args), 'corpora': []}
+    env = dict(os.environ, PYTHONPATH=ROOT, LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING'))
+    for fmt in args.formats.split(','):
+        for count in map(int, args.counts.split(',')):
+            for size in args.sizes.split(','):
+                width, height = map(int, size.lower().split('x'))
+                with tempfile.TemporaryDirectory() as folder:
+                    corpus_dir = os.path.join(folder, 'corpus')
+                    uploads = os.path.join(folder, 'uploads')
+                    make_corpus(corpus_dir, count, width, height, fmt, orientations=True)
+                    stage_env = dict(env, GIF_JOBS_DB=os.path.join(folder, 'jobs.sqlite3'),
+                                     GIF_CACHE_DIR=os.path.join(uploads, '.cache', 'results'))
+                    corpus = {'format': fmt, 'count': count, 'size': size,
+                              'corpus_bytes': sum(os.path.getsize(os.path.join(corpus_dir, name))
+                                                  for name in os.listdir(corpus_dir))}
+                    print(f'{fmt} {count} × {size}:', flush=True)
+                    corpus['upload'] = run_stage('upload', {'uploads': uploads, 'corpus': corpus_dir,
+                                                            'batch': args.batch}, stage_env)
+                    print_stage('upload', corpus['upload'])
+                    corpus['reorder'] = run_stage('reorder', {'uploads': uploads, 'reorders': args.reorders},
+                                                  stage_env)
+                    print_stage('reorder', corpus['reorder'])
+                    corpus['generate'] = run_stage('generate', {
+                        'uploads': uploads, 'runs': args.runs, 'resize': args.resize,
+                        'optimizers': args.optimizers.split(',')}, stage_env)
+                    print_stage('generate', corpus['generate'])
+                    report['corpora'].append(corpus)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'Результаты записаны в {args.output}')
+
+
+def print_stage(stage, result):
+    if stage == 'upload':
+        print(f'  upload:   {result["mib_per_s"]:8.1f} МиБ/с, {result["files_per_s"]:7.1f} файлов/с, '
+              f'p50 {result["latency_ms"]["p50"]:8.1f} мс, p99 {result["latency_ms"]["p99"]:8.1f} мс, '
+              f'производные через {result["derivatives_ready_seconds"]:.2f} с, RSS {result["peak_rss_mib"]} МиБ')
+    elif stage == 'reorder':
+        print(f'  reorder:  {result["requests_per_s"]:8.1f} запросов/с, p50 {result["latency_ms"]["p50"]:8.1f} мс, '
+              f'p99 {result["latency_ms"]["p99"]:8.1f} мс, RSS {result["peak_rss_mib"]} МиБ')
+    else:
+        for optimizer, values in result.items():
+            if optimizer == 'peak_rss_mib':
+                continue
+            warm = values['warm_latency_ms']
+            warm_text = f'warm p50 {warm["p50"] / 1000:6.2f} с' if warm else 'warm —'
+            print(f'  generate {optimizer:>9}: cold {values["cold_seconds"]:6.2f} с, {warm_text}, '
+                  f'GIF {values["gif_bytes"] / 1024:8.1f} КиБ, RSS {result["peak_rss_mib"]} МиБ')
+
+
+def compare(old_path, new_path):
+    """Печатает изменение основных показателей между двумя отчётами."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f'{old["environment"]["commit"]} → {new["environment"]["commit"]}')
+    old_corpora = {(c['format'], c['count'], c['size']): c for c in old['corpora']}
+
+    def line(name, before, after, lower_is_better=True):
+        if before in (None, 0) or after is None:
+            return
+        change = (after - before) / before * 100
+        better = change < 0 if lower_is_better else change > 0
+        mark = '' if abs(change) < 5 else (' лучше' if better else ' хуже')
+        print(f'  {name:<40} {before:12.2f} → {after:12.2f} ({change:+6.1f}%){mark}')
+
+    for corpus in new['corpora']:
+        key = (corpus['format'], corpus['count'], corpus['size'])
+        if key not in old_corpora:
+            continue
+        before = old_corpora[key]
+        print(f'{key[0]} {key[1]} × {key[2]}:')
+        line('upload МиБ/с', before['upload']['mib_per_s'], corpus['upload']['mib_per_s'], False)
+        line('upload p50, мс', before['upload']['latency_ms']['p50'], corpus['upload']['latency_ms']['p50'])
+        line('upload RSS, МиБ', before['upload']['peak_rss_mib'], corpus['upload']['peak_rss_mib'])
+        line('reorder p50, мс', before['reorder']['latency_ms']['p50'], corpus['reorder']['latency_ms']['p50'])
+        for optimizer, values in corpus['generate'].items():
+            old_values = before['generate'].get(optimizer)
+            if optimizer == 'peak_rss_mib' or not old_values:
+                continue
+            line(f'generate {optimizer} cold, с', old_values['cold_seconds'], values['cold_seconds'])
+            if values['warm_latency_ms'] and old_values['warm_latency_ms']:
+                line(f'generate {optimizer} warm p50, мс', old_values['warm_latency_ms']['p50'],
+                     values['warm_latency_ms']['p50'])
+            line(f'generate {optimizer} GIF, байт', old_values['gif_bytes'], values['gif_bytes'])
+        line('generate RSS, МиБ', before['generate']['peak_rss_mib'], corpus['generate']['peak_rss_mib'])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--formats', default=','.join(FORMATS))
+    parser.add_argument('--counts', default='20', help='количество изображений через запятую')
+    parser.add_argument('--sizes', default='1280x960', help='размеры изображений через запятую')
+    parser.add_argument('--batch', type=int, default=10, help='файлов в одном запросе загрузки')
+    parser.add_argument('--reorders', type=int, default=50)
+    parser.add_argument('--runs', type=int, default=3, help='запусков генерации на способ оптимизации')
+    parser.add_argument('--optimizers', default='inprocess,none')
+    parser.add_argument('--resize', default='480x360')
+    parser.add_argument('--output', default='bench_flow.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        run_child(sys.argv[2], json.loads(sys.argv[3]))
+    else:
+        main()
@@ -0,0 +1,104 @@
+# benchmarks/bench_formats.py
+"""
+Сравнивает форматы результата по времени кодирования и размеру файла на
+одном корпусе: кадры один раз готовятся конвейером gif_generator
+(pipeline.iter_frames: декодирование и изменение размера), затем
+кодируются в каждый формат.
+
+- gif: GifEncoder с общей палитрой, как в режиме inprocess сервиса;
+- webp, apng, mp4: FfmpegEncoder (если ffmpeg найден);
+- webp (Pillow), apng (Pillow): кодирование в процессе через Pillow для
+  сравнения. Pillow держит все кадры в памяти, поэтому сервис его не
+  использует.
+
+Запуск:
+    python benchmarks/bench_formats.py [--count 40] [--size 640x480]
+"""
+
+import argparse  # Для разбора аргументов
+import os  # Для работы с файловой системой
+import sys  # Для доступа к путям
+import tempfile  # Для временных каталогов
+import time  # Для измерения времени
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'gif_generator'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from PIL import Image  # noqa: E402
+from corpus import make_corpus  # noqa: E402
+from encoder import GifEncoder, PALETTE_COLORS  # noqa: E402
+from ffmpeg_encoder import FfmpegEncoder, ffmpeg_available  # noqa: E402
+from palette import PaletteBuilder  # noqa: E402
+from pipeline import iter_frames, parse_resize  # noqa: E402
+
+DURATION = 200
+
+
+def encode_gif(frames, path):
+    builder = PaletteBuilder()
+    for frame in frames:
+        builder.add(frame)
+    palette = builder.build(PALETTE_COLORS)
+    with open(path, 'wb') as fp, GifEncoder(fp, DURATION, 0, global_palette=palette) as encoder:
+        for frame in frames:
+            encoder.add_frame(frame)
+
+
+def encode_ffmpeg(output_format):
+    def encode(frames, path):
+        with FfmpegEncoder(path, output_format, DURATION, 0) as encoder:
+            for frame in frames:
+                encoder.add_frame(frame)
+    return encode
+
+
+def encode_pillow(image_format, **options):
+    def encode(frames, path):
+        images = [Image.fromarray(frame) for frame in frames]
+        images[0].save(path, image_format, save_all=True, append_images=images[1:], duration=DURATION, loop=0,
+                       **options)
+    return encode
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=40, help='Количество кадров')
+    parser.add_argument('--size', default='640x480', help='Размер кадра')
+    args = parser.parse_args()
+    size = parse_resize(args.size)
+
+    encoders = {'gif': (encode_gif, 'gif')}
+    if ffmpeg_available():
+        encoders.update({
+            'webp': (encode_ffmpeg('webp'), 'webp'),
+            'apng': (encode_ffmpeg('apng'), 'png'),
+            'mp4': (encode_ffmpeg('mp4'), 'mp4'),
+        })
+    else:
+        print('ffmpeg не найден: webp, apng и mp4 через ffmpeg пропущены')
+    encoders.update({
+        'webp (Pillow)': (encode_pillow('WEBP', quality=80), 'webp'),
+        'apng (Pillow)': (encode_pillow('PNG'), 'png'),
+    })
+
+    with tempfile.TemporaryDirectory() as folder:
+        names = make_corpus(os.path.join(folder, 'corpus'), args.count, 1600, 1200)
+        frames = list(iter_frames(os.path.join(folder, 'corpus'), names, size, workers=1, use_cache=False))
+        print(f'{len(frames)} кадров {size[0]}x{size[1]}')
+        gif_size = None
+        for name, (encode, extension) in encoders.items():
+            path = os.path.join(folder, f'result.{extension}')
+            started = time.perf_counter()
+            encode(frames, path)
+            elapsed = time.perf_counter() - started
+            output_size = os.path.getsize(path)
+            gif_size = gif_size or output_size
+            print(f'{name:>14}: {elapsed:6.2f} с, {output_size / 1024:8.1f} КиБ '
+                  f'({output_size / gif_size * 100:5.1f}% от GIF)')
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/bench_frame_modes.py
+"""
+Проверяет и измеряет подготовку кадров из файлов в разных режимах Pillow:
+16-битные оттенки серого (I;16), 1-битные, оттенки серого с альфа-каналом
+(LA), палитровые (P, в том числе с прозрачным цветом) и RGB для сравнения.
+
+Каждый файл проходит путь кадра в режиме inprocess: pipeline.load_frame,
+гистограмма палитры (PaletteBuilder) и GifEncoder. Для каждого режима
+печатает время подготовки кадра и проверяет, что кадр — 8-битный RGB или
+RGBA с сохранённой яркостью; при ошибке завершается с ненулевым кодом.
+
+Запуск:
+    python benchmarks/bench_frame_modes.py [--size 640x480]
+"""
+
+import argparse  # Для разбора аргументов
+import io  # Для записи GIF в память
+import os  # Для работы с файловой системой
+import sys  # Для доступа к путям
+import tempfile  # Для временных каталогов
+import time  # Для измерения времени
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'gif_generator'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+from corpus import make_image  # noqa: E402
+from encoder import GifEncoder, PALETTE_COLORS  # noqa: E402
+from palette import PaletteBuilder  # noqa: E402
+from pipeline import load_frame, parse_resize  # noqa: E402
+
+IMAGE_SIZE = (1600, 1200)
+REPEATS = 5
+
+
+def make_sources():
+    """Возвращает словарь {описание: (изображение, формат файла, ожидаемое число каналов)}."""
+    rgb = make_image(*IMAGE_SIZE, seed=0)
+    gray = rgb.convert('L')
+    gray16 = Image.fromarray(np.asarray(gray, dtype=np.uint16) * 257)
+    paletted = rgb.quantize(64)
+    transparent = paletted.copy()
+    transparent.info['transparency'] = 0
+    gray_alpha = Image.merge('LA', (gray, gray.point(lambda value: 255 - value)))
+    return {
+        'I;16 (TIFF)': (gray16, 'TIFF', 3),
+        '1 (PNG)': (gray.convert('1'), 'PNG', 3),
+        'LA (PNG)': (gray_alpha, 'PNG', 4),
+        'P (PNG)': (paletted, 'PNG', 3),
+        'P + прозрачность (GIF)': (transparent, 'GIF', 4),
+        'RGB (JPEG)': (rgb, 'JPEG', 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', default='640x480', help='Размер кадра GIF')
+    args = parser.parse_args()
+    size = parse_resize(args.size)
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as folder:
+        for name, (image, image_format, channels) in make_sources().items():
+            path = os.path.join(folder, f'source.{image_format.lower()}')
+            image.save(path, image_format)
+            try:
+                started = time.perf_counter()
+                for _ in range(REPEATS):
+                    frame = load_frame(path, size)
+                elapsed = (time.perf_counter() - started) / REPEATS * 1000
+                builder = PaletteBuilder()
+                builder.add(frame)
+                with GifEncoder(io.BytesIO(), 100, 0, global_palette=builder.build(PALETTE_COLORS)) as encoder:
+                    encoder.add_frame(frame)
+                assert frame.dtype == np.uint8, f'тип {frame.dtype}'
+                assert frame.shape == (size[1], size[0], channels), f'форма {frame.shape}'
+                # Яркость 16-битного кадра масштабируется, а не обрезается до 255
+                assert 64 < frame[..., :3].mean() < 192, f'средняя яркость {frame[..., :3].mean():.0f}'
+            except Exception as e:
+                failures += 1
+                print(f'{name:>24}: ОШИБКА {e}')
+                continue
+            print(f'{name:>24}: кадр {frame.shape[1]}x{frame.shape[0]}x{frame.shape[2]} uint8, {elapsed:6.1f} мс')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/bench_gif_optimizers.py
+"""
+Сравнивает способы оптимизации GIF по времени кодирования и размеру файла:
+- inprocess: GifEncoder (общая палитра, обрезка и прозрачность при кодировании);
+- gifsicle: imageio и последующий вызов gifsicle (если утилита установлена);
+- none: imageio без оптимизации.
+
+Замеряются два корпуса: слайд-шоу (кадры отличаются небольшой областью)
+и независимые фотографии.
+
+Запуск:
+    python benchmarks/bench_gif_optimizers.py
+"""
+
+import os  # Для работы с файловой системой
+import shutil  # Для проверки наличия gifsicle
+import subprocess  # Для вызова gifsicle
+import sys  # Для доступа к путям
+import tempfile  # Для временных каталогов
+import time  # Для измерения времени
+
+import imageio  # Для эталонного кодирования
+import numpy as np  # Для подготовки кадров
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'gif_generator'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from corpus import make_image, make_slideshow  # noqa: E402
+from encoder import GifEncoder  # noqa: E402
+
+DURATION = 200
+
+
+def encode_inprocess(frames, path):
+    with open(path, 'wb') as fp, GifEncoder(fp, DURATION, 0) as encoder:
+        for frame in frames:
+            encoder.add_frame(frame)
+    return path
+
+
+def encode_imageio(frames, path):
+    with imageio.get_writer(path, mode='I', duration=DURATION / 1000.0, loop=0) as writer:
+        for frame in frames:
+            writer.append_data(frame)
+    return path
+
+
+def encode_gifsicle(frames, path):
+    temp_path = encode_imageio(frames, path + '.raw.gif')
+    subprocess.run(['gifsicle', '--optimize=3', '--colors', '256', temp_path, '-o', path], check=True)
+    os.remove(temp_path)
+    return path
+
+
+def main():
+    backends = {'inprocess': encode_inprocess, 'none': encode_imageio}
+    if shutil.which('gifsicle'):
+        backends['gifsicle'] = encode_gifsicle
+    else:
+        print('gifsicle не найден: способ gifsicle пропущен')
+    corpora = {
+        'слайд-шоу': make_slideshow(40),
+        'фотографии': [np.array(make_image(640, 480, seed)) for seed in range(40)],
+    }
+    with tempfile.TemporaryDirectory() as folder:
+        for corpus_name, frames in corpora.items():
+            for name, encode in backends.items():
+                started = time.perf_counter()
+                path = encode(frames, os.path.join(folder, f'{name}.gif'))
+                elapsed = time.perf_counter() - started
+                print(f'{corpus_name:>10} {name:>10}: {elapsed:6.2f} с, {os.path.getsize(path) / 1024:8.1f} КиБ')
+
+
+if __name__ == '__main__':
+    main()
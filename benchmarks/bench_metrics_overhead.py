@@ -0,0 +1,127 @@
+# benchmarks/bench_metrics_overhead.py
+"""
+Измеряет накладные расходы метрик (common/metrics.py):
+- стоимость одной записи: счётчик, гистограмма, гистограмма с метками, таймер;
+- добавку к обработке HTTP-запроса: один и тот же маршрут Flask с
+  init_metrics и без него (тестовый клиент, без сети);
+- долю метрик во времени генерации GIF: число записей на кадр, умноженное
+  на стоимость записи, относительно подготовки одного кадра (декодирование
+  JPEG 1920x1080 с уменьшением до 480x270).
+
+Запуск:
+    python benchmarks/bench_metrics_overhead.py [--iterations 200000] [--requests 5000]
+"""
+
+import argparse  # Для разбора аргументов
+import io  # Для JPEG в памяти
+import os  # Для работы с путями
+import sys  # Для доступа к путям
+import tempfile  # Для временного файла изображения
+import time  # Для измерения времени
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'gif_generator'))
+
+import numpy as np  # noqa: E402
+from flask import Flask, request  # noqa: E402
+from PIL import Image  # noqa: E402
+from common.metrics import Counter, Histogram, init_metrics  # noqa: E402
+from pipeline import load_frame  # noqa: E402
+
+# Записей метрик на кадр в gif_generator: decode, resize, frame_cache_write,
+# gif_frames_total, gif_input_bytes_total, gif_frame_cache_requests_total
+WRITES_PER_FRAME = 6
+
+
+def per_call(func, iterations):
+    """Возвращает среднее время одного вызова func в наносекундах."""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e9
+
+
+def bench_writes(iterations):
+    counter = Counter('bench_total', 'bench')
+    histogram = Histogram('bench_seconds', 'bench')
+    labelled = Histogram('bench_labelled_seconds', 'bench', ['stage'])
+
+    def timer():
+        with histogram.time():
+            pass
+
+    results = {
+        'пустой вызов': per_call(lambda: None, iterations),
+        'Counter.inc()': per_call(counter.inc, iterations),
+        'Histogram.observe()': per_call(lambda: histogram.observe(0.003), iterations),
+        'labels().observe()': per_call(lambda: labelled.labels('decode').observe(0.003), iterations),
+        'with time()': per_call(timer, iterations),
+    }
+    baseline = results.pop('пустой вызов')
+    print(f'Стоимость записи (за вычетом пустого вызова {baseline:.0f} нс):')
+    for name, value in results.items():
+        print(f'  {name:>22}: {value - baseline:6.0f} нс')
+    return results['labels().observe()'] - baseline
+
+
+def make_app(with_metrics):
+    app = Flask(__name__)
+    if with_metrics:
+        init_metrics(app, request)
+
+    @app.route('/jobs/<job_id>')
+    def job(job_id):
+        return {'status': 'running'}
+
+    return app
+
+
+def bench_requests(requests_count):
+    timings = {}
+    # Несколько повторов в чередующемся порядке сглаживают шум
+    for _ in range(3):
+        for with_metrics in (False, True):
+            client = make_app(with_metrics).test_client()
+            for i in range(200):
+                client.get(f'/jobs/{i}')
+            started = time.perf_counter()
+            for i in range(requests_count):
+                client.get(f'/jobs/{i}')
+            elapsed = (time.perf_counter() - started) / requests_count * 1e6
+            timings[with_metrics] = min(timings.get(with_metrics, elapsed), elapsed)
+    overhead = timings[True] - timings[False]
+    print(f'HTTP-запрос: без метрик {timings[False]:.1f} мкс, с метриками {timings[True]:.1f} мкс, '
+          f'добавка {overhead:.1f} мкс ({overhead / timings[False] * 100:.1f}%)')
+
+
+def bench_frame(write_ns):
+    buffer = io.BytesIO()
+    Image.fromarray(np.random.randint(0, 255, (1080, 1920, 3), dtype=np.uint8)).save(buffer, 'JPEG')
+    with tempfile.NamedTemporaryFile(suffix='.jpg') as f:
+        f.write(buffer.getvalue())
+        f.flush()
+        load_frame(f.name, (480, 270))
+        runs = 20
+        started = time.perf_counter()
+        for _ in range(runs):
+            load_frame(f.name, (480, 270), {})
+        frame_us = (time.perf_counter() - started) / runs * 1e6
+    metrics_us = WRITES_PER_FRAME * write_ns / 1000
+    print(f'Кадр: подготовка {frame_us:.0f} мкс, метрики {metrics_us:.1f} мкс '
+          f'({metrics_us / frame_us * 100:.3f}%)')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    write_ns = bench_writes(args.iterations)
+    bench_requests(args.requests)
+    bench_frame(write_ns)
+
+
+if __name__ == '__main__':
+    main()
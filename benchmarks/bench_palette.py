@@ -0,0 +1,83 @@
+# benchmarks/bench_palette.py
+"""
+Сравнивает квантование кадров в палитру:
+- Pillow: палитра по первому кадру, поиск ближайшего цвета для каждого кадра;
+- LUT: общая палитра по гистограмме всех кадров и таблица поиска 32x32x32
+  (без дизеринга и с упорядоченным дизерингом).
+
+Выводит время построения палитры, пропускную способность отображения
+в мегапикселях в секунду и среднюю ошибку цвета.
+
+Запуск:
+    python benchmarks/bench_palette.py
+"""
+
+import os  # Для работы с путями
+import sys  # Для доступа к путям
+import time  # Для измерения времени
+
+import numpy as np  # Для подготовки кадров и оценки ошибки
+from PIL import Image  # Для квантования Pillow
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'gif_generator'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from corpus import make_image, make_slideshow  # noqa: E402
+from palette import PaletteBuilder  # noqa: E402
+
+COLORS = 255
+
+
+def mean_error(frame, colors):
+    """Средняя абсолютная ошибка канала между кадром и его отображением в палитру."""
+    return float(np.abs(colors.astype(np.int16) - frame).mean())
+
+
+def bench_pillow(frames):
+    started = time.perf_counter()
+    palette_image = Image.fromarray(frames[0]).quantize(COLORS, method=Image.Quantize.MEDIANCUT)
+    build_seconds = time.perf_counter() - started
+    errors = []
+    map_seconds = 0.0
+    for frame in frames:
+        started = time.perf_counter()
+        indexed = Image.fromarray(frame).quantize(palette=palette_image, dither=Image.Dither.NONE)
+        map_seconds += time.perf_counter() - started
+        errors.append(mean_error(frame, np.asarray(indexed.convert('RGB'))))
+    return build_seconds, map_seconds, float(np.mean(errors))
+
+
+def bench_lut(frames, dither):
+    started = time.perf_counter()
+    builder = PaletteBuilder()
+    for frame in frames:
+        builder.add(frame)
+    palette = builder.build(COLORS)
+    build_seconds = time.perf_counter() - started
+    errors = []
+    for frame in frames:
+        indices = palette.map(frame, dither)
+        errors.append(mean_error(frame, palette.colors[indices]))
+    return build_seconds, palette.seconds, float(np.mean(errors))
+
+
+def main():
+    corpora = {
+        'слайд-шоу': make_slideshow(30),
+        'фотографии': [np.array(make_image(640, 480, seed)) for seed in range(20)],
+    }
+    for corpus_name, frames in corpora.items():
+        megapixels = sum(frame.shape[0] * frame.shape[1] for frame in frames) / 1e6
+        results = {
+            'Pillow, палитра 1-го кадра': bench_pillow(frames),
+            'LUT, общая палитра': bench_lut(frames, False),
+            'LUT, общая палитра + дизеринг': bench_lut(frames, True),
+        }
+        for name, (build_seconds, map_seconds, error) in results.items():
+            print(f'{corpus_name:>10} {name:>30}: палитра {build_seconds:5.2f} с, '
+                  f'отображение {megapixels / map_seconds:7.1f} Мп/с, ошибка {error:5.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# benchmarks/bench_parallel_decode.py
+"""
+Измеряет ускорение декодирования и изменения размера кадров в зависимости
+от количества процессов пула на синтетической сессии из 200 изображений.
+
+Запуск:
+    python benchmarks/bench_parallel_decode.py [количество_изображений]
+"""
+
+import os  # Для работы с файловой системой
+import sys  # Для доступа к аргументам и путям
+import tempfile  # Для временных каталогов
+import time  # Для измерения времени
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'gif_generator'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from corpus import make_corpus  # noqa: E402
+from pipeline import iter_frames, get_pool  # noqa: E402
+
+
+def measure(folder, names, workers):
+    """Возвращает время полной обработки сессии в секундах."""
+    if workers > 1:
+        # Пул запускается заранее, чтобы не учитывать старт процессов
+        get_pool(workers)
+    started = time.perf_counter()
+    # Без кэша подготовленных кадров: иначе после первого замера кадры читаются из .frames, а не декодируются
+    count = sum(1 for _ in iter_frames(folder, names, (320, 240), workers=workers, use_cache=False))
+    assert count == len(names)
+    return time.perf_counter() - started
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+    with tempfile.TemporaryDirectory() as folder:
+        names = make_corpus(folder, count)
+        baseline = measure(folder, names, 1)
+        print(f'Ядер: {cores}, изображений: {count}')
+        print(f'{1:3d} процесс(ов): {baseline:7.2f} с')
+        for workers in worker_counts[1:]:
+            elapsed = measure(folder, names, workers)
+            print(f'{workers:3d} процесс(ов): {elapsed:7.2f} с, ускорение x{baseline / elapsed:.2f}')
+
+
+if __name__ == '__main__':
+    main()
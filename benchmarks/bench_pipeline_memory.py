@@ -0,0 +1,69 @@
+# benchmarks/bench_pipeline_memory.py
+"""
+Проверяет, что пиковое потребление памяти при генерации GIF не растёт
+с количеством кадров.
+
+Для каждого количества кадров генерация запускается в отдельном процессе,
+после чего сравнивается пиковый RSS этих процессов (VmHWM из /proc: в отличие
+от ru_maxrss он не наследуется от родительского процесса через fork/exec).
+
+Запуск:
+    python benchmarks/bench_pipeline_memory.py
+"""
+
+import os  # Для работы с файловой системой
+import subprocess  # Для запуска замеров в отдельных процессах
+import sys  # Для доступа к интерпретатору и путям
+import tempfile  # Для временных каталогов
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'gif_generator'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+FRAME_COUNTS = (10, 40, 160)
+
+
+def peak_rss_kib():
+    """Возвращает пиковый RSS текущего процесса в КиБ."""
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+    return 0
+
+
+def run_child(folder, count):
+    """Генерирует GIF из первых count кадров и печатает пиковый RSS в КиБ."""
+    import imageio
+    from pipeline import iter_frames
+
+    names = sorted(os.listdir(folder))[:count]
+    output = os.path.join(folder, f'out_{count}.gif')
+    with imageio.get_writer(output, mode='I', duration=0.2, loop=0) as writer:
+        # Без кэша подготовленных кадров: каталог .frames попал бы в список файлов следующих замеров
+        for frame in iter_frames(folder, names, (640, 480), use_cache=False):
+            writer.append_data(frame)
+    print(peak_rss_kib())
+
+
+def main():
+    from corpus import make_corpus
+
+    with tempfile.TemporaryDirectory() as folder:
+        make_corpus(folder, max(FRAME_COUNTS))
+        results = {}
+        for count in FRAME_COUNTS:
+            output = subprocess.check_output([sys.executable, __file__, '--child', folder, str(count)])
+            results[count] = int(output.decode().strip().splitlines()[-1])
+            print(f'{count:5d} кадров: пиковый RSS {results[count] / 1024:.1f} МиБ')
+        growth = results[max(FRAME_COUNTS)] / results[min(FRAME_COUNTS)]
+        print(f'Рост пикового RSS при увеличении числа кадров в '
+              f'{max(FRAME_COUNTS) // min(FRAME_COUNTS)} раз: x{growth:.2f}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        run_child(sys.argv[2], int(sys.argv[3]))
+    else:
+        main()
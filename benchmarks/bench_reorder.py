@@ -0,0 +1,102 @@
+# benchmarks/bench_reorder.py
+"""
+Сравнивает перестановку 500 кадров:
+- прежний способ: каждый файл переименовывается во временное имя и обратно;
+- перестановка в манифесте сессии: одна атомарная запись небольшого файла.
+
+Сетевой том имитируется задержкой на каждую операцию с метаданными
+(open, stat, rename/replace, unlink): выводится число таких операций и время
+без задержки и с задержкой (по умолчанию 1 мс, типичная для NFS).
+Каталог можно указать явно, чтобы измерить на настоящем сетевом томе.
+
+Запуск:
+    python benchmarks/bench_reorder.py [--frames 500] [--latency-ms 1] [--dir /mnt/nfs/tmp]
+"""
+
+import argparse  # Для разбора аргументов
+import builtins  # Для подсчёта вызовов open
+import json  # Для передачи порядка
+import os  # Для работы с файловой системой
+import sys  # Для доступа к путям
+import tempfile  # Для временных каталогов
+import time  # Для измерения времени
+from contextlib import contextmanager  # Для подмены функций на время замера
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'image_processing'))
+
+from common.manifest import make_entry, update_manifest  # noqa: E402
+from main import apply_order  # noqa: E402
+
+
+def legacy_reorder(upload_folder, image_order):
+    """Прежняя перестановка из image_processing/reorder_images (переименования туда и обратно)."""
+    temp_renames = {}
+    for idx, image_name in sorted(image_order.items(), key=lambda x: int(x[0])):
+        old_path = os.path.join(upload_folder, image_name)
+        new_path = os.path.join(upload_folder, f'temp_{int(idx):04d}_{image_name}')
+        if os.path.isfile(old_path):
+            os.rename(old_path, new_path)
+            temp_renames[new_path] = old_path
+    for new_path, old_path in temp_renames.items():
+        os.rename(new_path, os.path.join(upload_folder, os.path.basename(old_path)))
+
+
+def manifest_reorder(upload_folder, image_order):
+    """Перестановка в манифесте сессии."""
+    update_manifest(upload_folder, lambda manifest: apply_order(manifest, image_order))
+
+
+@contextmanager
+def metadata_ops(latency):
+    """Считает операции с метаданными и добавляет к каждой задержку latency секунд."""
+    counter = {'ops': 0}
+    patched = [(os, 'rename'), (os, 'replace'), (os, 'remove'), (os, 'stat'), (builtins, 'open')]
+    originals = {(module, name): getattr(module, name) for module, name in patched}
+
+    def wrap(func):
+        def wrapper(*args, **kwargs):
+            counter['ops'] += 1
+            if latency:
+                time.sleep(latency)
+            return func(*args, **kwargs)
+        return wrapper
+
+    for (module, name), func in originals.items():
+        setattr(module, name, wrap(func))
+    try:
+        yield counter
+    finally:
+        for (module, name), func in originals.items():
+            setattr(module, name, func)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--latency-ms', type=float, default=1.0)
+    parser.add_argument('--dir', default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as folder:
+        names = [f'IMG_{idx:04d}.jpg' for idx in range(args.frames)]
+        for name in names:
+            open(os.path.join(folder, name), 'wb').close()
+        update_manifest(folder, lambda manifest: manifest['images'].extend(make_entry(name) for name in names))
+        image_order = {str(idx + 1): name for idx, name in enumerate(reversed(names))}
+        image_order = json.loads(json.dumps(image_order))
+
+        print(f'{args.frames} кадров, задержка сетевого тома {args.latency_ms} мс на операцию')
+        for label, reorder in (('переименование файлов', legacy_reorder), ('манифест', manifest_reorder)):
+            for latency in (0.0, args.latency_ms / 1000):
+                with metadata_ops(latency) as counter:
+                    started = time.perf_counter()
+                    reorder(folder, image_order)
+                    elapsed = time.perf_counter() - started
+                print(f'{label:>22}: {counter["ops"]:5d} операций, '
+                      f'{elapsed * 1000:8.1f} мс (задержка {latency * 1000:.1f} мс)')
+
+
+if __name__ == '__main__':
+    main()
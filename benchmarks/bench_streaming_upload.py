@@ -0,0 +1,106 @@
+# benchmarks/bench_streaming_upload.py
+"""
+Сравнивает приём большой пачки файлов в image_processing/upload:
+- прежний способ: разбор формы Werkzeug (части сохраняются во временные
+  файлы) и file.save в каталог сессии;
+- потоковый приём: части пишутся сразу в каталог сессии.
+
+Для каждого способа запрос выполняется в отдельном процессе; выводятся
+пропускная способность, пиковый RSS (VmHWM) и объём записанных процессом
+данных (wchar из /proc/self/io).
+
+Запуск:
+    python benchmarks/bench_streaming_upload.py [размер пачки в МиБ, по умолчанию 400]
+"""
+
+import os  # Для работы с файловой системой
+import subprocess  # Для запуска замеров в отдельных процессах
+import sys  # Для доступа к интерпретатору и путям
+import tempfile  # Для временных каталогов
+import time  # Для измерения времени
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'image_processing'))
+
+BOUNDARY = 'bench-boundary-7d3c1e'
+FILE_SIZE = 10 * 1024 * 1024
+MODES = ('legacy', 'streaming')
+
+
+def proc_value(path, key):
+    """Возвращает числовое значение поля key из файла /proc/self/<path>."""
+    with open(f'/proc/self/{path}') as f:
+        for line in f:
+            if line.startswith(key):
+                return int(line.split()[1])
+    return 0
+
+
+def make_body(path, total_mb):
+    """Записывает тело multipart-запроса из файлов по FILE_SIZE байт общим размером total_mb МиБ."""
+    count = max(1, total_mb * 1024 * 1024 // FILE_SIZE)
+    with open(path, 'wb') as body:
+        for index in range(count):
+            body.write(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; '
+                       f'filename="{index:04d}.jpg"\r\nContent-Type: image/jpeg\r\n\r\n'.encode())
+            body.write(os.urandom(FILE_SIZE))
+            body.write(b'\r\n')
+        body.write(f'--{BOUNDARY}--\r\n'.encode())
+
+
+def legacy_upload():
+    """Прежний обработчик загрузки: request.files и file.save."""
+    import main
+    from flask import request, jsonify
+
+    upload_folder = os.path.join(main.uploads_root, 'bench')
+    os.makedirs(upload_folder, exist_ok=True)
+    for file in request.files.getlist('files'):
+        file.save(os.path.join(upload_folder, file.filename))
+    return jsonify(success=True)
+
+
+def run_child(mode, body_path, folder):
+    """Выполняет один запрос загрузки и печатает время, пиковый RSS и объём записи."""
+    import logging
+    import main
+
+    logging.disable(logging.INFO)
+    main.uploads_root = folder
+    main.UPLOAD_MAX_REQUEST_SIZE = main.UPLOAD_MAX_FILE_SIZE = 1 << 40
+    main.app.add_url_rule('/upload_legacy', 'upload_legacy', legacy_upload, methods=['POST'])
+    client = main.app.test_client()
+    url = '/upload' if mode == 'streaming' else '/upload_legacy'
+    written_before = proc_value('io', 'wchar:')
+    started = time.perf_counter()
+    with open(body_path, 'rb') as body:
+        response = client.post(url, input_stream=body, content_length=os.path.getsize(body_path),
+                               content_type=f'multipart/form-data; boundary={BOUNDARY}',
+                               headers={'X-Session-ID': 'bench'})
+    elapsed = time.perf_counter() - started
+    assert response.status_code == 200, response.data
+    print(elapsed, proc_value('status', 'VmHWM:'), proc_value('io', 'wchar:') - written_before)
+
+
+def main():
+    total_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    with tempfile.TemporaryDirectory() as folder:
+        body_path = os.path.join(folder, 'body.bin')
+        make_body(body_path, total_mb)
+        size_mb = os.path.getsize(body_path) / 1024 / 1024
+        print(f'Тело запроса: {size_mb:.0f} МиБ')
+        for mode in MODES:
+            uploads = os.path.join(folder, f'uploads_{mode}')
+            output = subprocess.check_output([sys.executable, __file__, '--child', mode, body_path, uploads],
+                                             env=dict(os.environ, TMPDIR=folder))
+            elapsed, peak_kib, written = output.decode().split()
+            print(f'{mode:>10}: {size_mb / float(elapsed):7.1f} МиБ/с, пиковый RSS {int(peak_kib) / 1024:6.1f} МиБ, '
+                  f'записано {int(written) / 1024 / 1024:7.1f} МиБ')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == '--child':
+        run_child(sys.argv[2], sys.argv[3], sys.argv[4])
+    else:
+        main()
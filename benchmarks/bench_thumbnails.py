@@ -0,0 +1,53 @@
+# benchmarks/bench_thumbnails.py
+"""
+Оценивает объём данных, передаваемых при отрисовке галереи: оригиналы
+против миниатюр, которые image_processing создаёт при загрузке, и время
+создания производных изображений на один файл.
+
+Запуск:
+    python benchmarks/bench_thumbnails.py
+"""
+
+import os  # Для работы с файловой системой
+import sys  # Для доступа к путям
+import tempfile  # Для временных каталогов
+import time  # Для измерения времени
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'image_processing'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from corpus import make_corpus  # noqa: E402
+from derivatives import (make_derivatives, derivative_path,  # noqa: E402
+                         THUMBNAILS_DIR, PREVIEWS_DIR)
+
+IMAGE_COUNT = 20
+# Размер типичной фотографии с телефона
+IMAGE_SIZE = (4032, 3024)
+
+
+def total_size(paths):
+    return sum(os.path.getsize(path) for path in paths)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        names = make_corpus(folder, IMAGE_COUNT, *IMAGE_SIZE)
+        started = time.perf_counter()
+        for name in names:
+            make_derivatives(folder, name)
+        elapsed = time.perf_counter() - started
+
+        originals = total_size(os.path.join(folder, name) for name in names)
+        thumbnails = total_size(derivative_path(folder, THUMBNAILS_DIR, name) for name in names)
+        previews = total_size(derivative_path(folder, PREVIEWS_DIR, name) for name in names)
+        print(f'{IMAGE_COUNT} изображений {IMAGE_SIZE[0]}x{IMAGE_SIZE[1]}, '
+              f'{elapsed / IMAGE_COUNT * 1000:.0f} мс на изображение')
+        print(f'Галерея из оригиналов: {originals / 1024 / 1024:8.2f} МиБ')
+        print(f'Галерея из миниатюр:   {thumbnails / 1024 / 1024:8.2f} МиБ (в {originals / thumbnails:.0f} раз меньше)')
+        print(f'Превью:                {previews / 1024 / 1024:8.2f} МиБ')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+# benchmarks/bench_upload_relay.py
+"""
+Сравнивает передачу загрузки из web_ui в image_processing:
+- прежний способ: разбор формы Werkzeug (части сохраняются во временные
+  файлы) и повторная сборка multipart-тела для requests.post(files=...);
+- ретрансляция: тело запроса передаётся как есть, блоками.
+
+image_processing заменён заглушкой в отдельном процессе, которая читает и
+отбрасывает тело. Каждый способ выполняется в отдельном процессе web_ui;
+выводятся процессорное время web_ui на МиБ, пиковый RSS (VmHWM) и объём
+записанных процессом данных (wchar из /proc/self/io).
+
+Запуск:
+    python benchmarks/bench_upload_relay.py [размер пачки в МиБ, по умолчанию 200]
+"""
+
+import json  # Для ответа заглушки
+import os  # Для работы с файловой системой
+import resource  # Для процессорного времени
+import subprocess  # Для запуска замеров в отдельных процессах
+import sys  # Для доступа к интерпретатору и путям
+import tempfile  # Для временных каталогов
+import time  # Для ожидания запуска заглушки
+from http.server import HTTPServer, BaseHTTPRequestHandler  # Для заглушки image_processing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from bench_streaming_upload import BOUNDARY, make_body, proc_value  # noqa: E402
+
+# После импорта: bench_streaming_upload добавляет в путь каталог image_processing со своим main
+sys.path.insert(0, os.path.join(ROOT, 'web_ui'))
+
+STUB_PORT = 5901
+MODES = ('legacy', 'relay')
+
+
+class StubUpload(BaseHTTPRequestHandler):
+    """Заглушка image_processing/upload: читает тело и отвечает пустым списком файлов."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        remaining = int(self.headers.get('Content-Length', 0))
+        while remaining:
+            remaining -= len(self.rfile.read(min(remaining, 1 << 20)))
+        body = json.dumps({'filenames': []}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def legacy_upload():
+    """Прежний обработчик web_ui/upload: request.files и requests.post(files=...)."""
+    from flask import request, jsonify
+    from upstream import upstream
+
+    files = request.files.getlist('files')
+    files_data = [('files', (file.filename, file.stream, file.mimetype)) for file in files]
+    response = upstream.post('/upload', files=files_data, headers={'X-Session-ID': 'bench'})
+    return jsonify(success=True, filenames=response.json()['filenames'])
+
+
+def run_child(mode, body_path):
+    """Выполняет один запрос загрузки и печатает процессорное время, пиковый RSS и объём записи."""
+    import logging
+    import main
+
+    logging.disable(logging.INFO)
+    main.app.add_url_rule('/upload_legacy', 'upload_legacy', legacy_upload, methods=['POST'])
+    client = main.app.test_client()
+    with client.session_transaction() as session:
+        session['session_id'] = 'bench'
+    url = '/upload' if mode == 'relay' else '/upload_legacy'
+    written_before = proc_value('io', 'wchar:')
+    cpu_before = resource.getrusage(resource.RUSAGE_SELF)
+    with open(body_path, 'rb') as body:
+        response = client.post(url, input_stream=body, content_length=os.path.getsize(body_path),
+                               content_type=f'multipart/form-data; boundary={BOUNDARY}')
+    cpu_after = resource.getrusage(resource.RUSAGE_SELF)
+    assert response.status_code == 200, response.data
+    cpu = (cpu_after.ru_utime - cpu_before.ru_utime) + (cpu_after.ru_stime - cpu_before.ru_stime)
+    print(cpu, proc_value('status', 'VmHWM:'), proc_value('io', 'wchar:') - written_before)
+
+
+def main():
+    total_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    stub = subprocess.Popen([sys.executable, __file__, '--stub'])
+    try:
+        time.sleep(0.5)
+        with tempfile.TemporaryDirectory() as folder:
+            body_path = os.path.join(folder, 'body.bin')
+            make_body(body_path, total_mb)
+            size_mb = os.path.getsize(body_path) / 1024 / 1024
+            print(f'Тело запроса: {size_mb:.0f} МиБ')
+            for mode in MODES:
+                output = subprocess.check_output(
+                    [sys.executable, __file__, '--child', mode, body_path],
+                    env=dict(os.environ, TMPDIR=folder, UPSTREAM_URL=f'http://127.0.0.1:{STUB_PORT}'))
+                cpu, peak_kib, written = output.decode().split()
+                print(f'{mode:>7}: процессорное время web_ui {float(cpu) / size_mb * 1000:6.2f} мс/МиБ, '
+                      f'пиковый RSS {int(peak_kib) / 1024:6.1f} МиБ, записано {int(written) / 1024 / 1024:7.1f} МиБ')
+    finally:
+        stub.terminate()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 2 and sys.argv[1] == '--stub':
+        HTTPServer(('127.0.0.1', STUB_PORT), StubUpload).serve_forever()
+    elif len(sys.argv) == 4 and sys.argv[1] == '--child':
+        run_child(sys.argv[2], sys.argv[3])
+    else:
+        main()
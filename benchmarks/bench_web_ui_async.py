@@ -0,0 +1,183 @@
+# benchmarks/bench_web_ui_async.py
+"""
+Нагрузочный тест web_ui: текущий многопоточный сервер (Werkzeug, поток на
+соединение) против асинхронного режима (asgi_app под uvicorn).
+
+Запросы идут на /jobs/<id> — маршрут, который только ждёт ответа API.
+API заменён заглушкой на asyncio, отвечающей с задержкой --delay мс.
+Генератор нагрузки держит --concurrency соединений keep-alive и в течение
+--duration секунд отправляет запросы; выводятся запросы в секунду, p50, p99
+и число ошибок.
+
+Генератор, заглушка и сервер работают на одной машине, поэтому абсолютные
+значения зависят от числа ядер; сравнивать стоит режимы между собой.
+
+Запуск:
+    python benchmarks/bench_web_ui_async.py [--modes threaded,asgi] [--concurrency 200]
+        [--duration 10] [--delay 50]
+"""
+
+import argparse  # Для разбора аргументов
+import asyncio  # Для заглушки API и генератора нагрузки
+import json  # Для ответов заглушки
+import os  # Для работы с путями и окружением
+import subprocess  # Для запуска сервера и заглушки в отдельных процессах
+import sys  # Для доступа к интерпретатору и путям
+import time  # Для измерения времени
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'web_ui'))
+
+STUB_PORT = 5902
+SERVER_PORT = 5903
+MODES = ('threaded', 'asgi')
+
+
+async def stub_connection(reader, writer, delay):
+    """Обслуживает одно keep-alive соединение заглушки API."""
+    body = json.dumps({'status': 'running', 'frames_done': 1, 'frames_total': 2}).encode()
+    response = (b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body)
+    try:
+        while True:
+            head = await reader.readuntil(b'\r\n\r\n')
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    await reader.readexactly(int(line.split(b':')[1]))
+            await asyncio.sleep(delay)
+            writer.write(response)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        writer.close()
+
+
+async def run_stub(delay):
+    server = await asyncio.start_server(lambda r, w: stub_connection(r, w, delay), '127.0.0.1', STUB_PORT,
+                                        backlog=4096)
+    async with server:
+        await server.serve_forever()
+
+
+def run_server(mode):
+    """Запускает web_ui в выбранном режиме (в дочернем процессе)."""
+    import logging
+
+    logging.disable(logging.INFO)
+    if mode == 'threaded':
+        from werkzeug.serving import make_server
+        import main
+
+        make_server('127.0.0.1', SERVER_PORT, main.app, threaded=True).serve_forever()
+    else:
+        import uvicorn
+        import asgi_app
+
+        uvicorn.run(asgi_app.application, host='127.0.0.1', port=SERVER_PORT, log_level='warning',
+                    backlog=4096)
+
+
+def session_cookie():
+    """Возвращает подписанную cookie сессии web_ui."""
+    import main
+
+    serializer = main.app.session_interface.get_signing_serializer(main.app)
+    return f'{main.app.config["SESSION_COOKIE_NAME"]}={serializer.dumps({"session_id": "bench"})}'
+
+
+async def client_loop(deadline, cookie, latencies, errors):
+    """Одно соединение генератора нагрузки: запросы подряд до deadline."""
+    request = (f'GET /jobs/bench HTTP/1.1\r\nHost: web_ui\r\nCookie: {cookie}\r\n\r\n').encode()
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', SERVER_PORT)
+            writer.write(request)
+            head = await reader.readuntil(b'\r\n\r\n')
+            lines = head.split(b'\r\n')
+            length, close = 0, False
+            for line in lines[1:]:
+                name, _, value = line.partition(b':')
+                if name.lower() == b'content-length':
+                    length = int(value)
+                elif name.lower() == b'connection' and value.strip().lower() == b'close':
+                    close = True
+            await reader.readexactly(length)
+            if b' 200 ' not in lines[0]:
+                errors.append(lines[0])
+            else:
+                latencies.append(time.perf_counter() - started)
+            if close:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError) as e:
+            errors.append(e)
+            if writer is not None:
+                writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def load(concurrency, duration, cookie):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(client_loop(deadline, cookie, latencies, errors) for _ in range(concurrency)))
+    return sorted(latencies), errors
+
+
+async def wait_port(port, timeout=15):
+    """Ждёт, пока на порту начнут принимать соединения."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f'порт {port} не открылся за {timeout} с')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--delay', type=float, default=50, help='задержка ответа API, мс')
+    args = parser.parse_args()
+
+    env = dict(os.environ, UPSTREAM_URL=f'http://127.0.0.1:{STUB_PORT}',
+               UPSTREAM_POOL_SIZE=str(args.concurrency), PYTHONPATH=ROOT)
+    stub = subprocess.Popen([sys.executable, __file__, '--stub', str(args.delay / 1000)])
+    cookie = session_cookie()
+    print(f'{args.concurrency} соединений, {args.duration:.0f} с, задержка API {args.delay:.0f} мс')
+    try:
+        for mode in args.modes.split(','):
+            server = subprocess.Popen([sys.executable, __file__, '--server', mode], env=env)
+            try:
+                asyncio.run(wait_port(SERVER_PORT))
+                latencies, errors = asyncio.run(load(args.concurrency, args.duration, cookie))
+            finally:
+                server.terminate()
+                server.wait()
+            if latencies:
+                p50 = latencies[len(latencies) // 2] * 1000
+                p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+                print(f'{mode:>9}: {len(latencies) / args.duration:8.1f} запросов/с, p50 {p50:7.1f} мс, '
+                      f'p99 {p99:7.1f} мс, ошибок {len(errors)}')
+            else:
+                print(f'{mode:>9}: нет успешных ответов, ошибок {len(errors)}')
+    finally:
+        stub.terminate()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--stub':
+        asyncio.run(run_stub(float(sys.argv[2])))
+    elif len(sys.argv) == 3 and sys.argv[1] == '--server':
+        run_server(sys.argv[2])
+    else:
+        main()
@@ -0,0 +1,87 @@
+# benchmarks/corpus.py
+
+import os  # Для работы с файловой системой
+import numpy as np  # Для генерации синтетических изображений
+from PIL import Image, ExifTags  # Для сохранения изображений и тегов EXIF
+
+
+def make_image(width, height, seed):
+    """
+    Создаёт синтетическое изображение: плавный градиент с шумом,
+    похожий на фотографию по сложности сжатия.
+
+    Параметры:
+    - width, height: Размер изображения.
+    - seed: Зерно генератора случайных чисел.
+
+    Возвращает:
+    - Изображение Pillow в режиме RGB.
+    """
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    noise = rng.normal(0, 12, size=(height, width, 3))
+    shift = rng.integers(0, 255)
+    pixels = np.clip((base + shift) % 256 + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels, 'RGB')
+
+
+def make_corpus(folder, count, width=1600, height=1200, fmt='JPEG', orientations=False):
+    """
+    Создаёт набор синтетических изображений для бенчмарков.
+
+    Параметры:
+    - folder: Папка, в которую сохраняются изображения.
+    - count: Количество изображений.
+    - width, height: Размер изображений.
+    - fmt: Формат файлов Pillow (JPEG, PNG, BMP, TIFF).
+    - orientations: Записывать ли тег EXIF Orientation (по кругу значения 1–8,
+      как у снимков с телефона в разных положениях). BMP не хранит EXIF,
+      для него параметр ничего не меняет.
+
+    Возвращает:
+    - Список имён созданных файлов в порядке создания.
+    """
+    os.makedirs(folder, exist_ok=True)
+    extension = {'JPEG': 'jpg', 'PNG': 'png', 'BMP': 'bmp', 'TIFF': 'tiff'}[fmt]
+    names = []
+    # Генерируем небольшое число уникальных кадров и повторяем их,
+    # чтобы подготовка корпуса не занимала больше времени, чем сам замер
+    unique = [make_image(width, height, seed) for seed in range(min(count, 8))]
+    for idx in range(count):
+        name = f'frame_{idx:04d}.{extension}'
+        options = {}
+        if orientations and fmt != 'BMP':
+            exif = Image.Exif()
+            exif[ExifTags.Base.Orientation] = idx % 8 + 1
+            options['exif'] = exif
+        unique[idx % len(unique)].save(os.path.join(folder, name), fmt, **options)
+        names.append(name)
+    return names
+
+
+def make_slideshow(count, width=640, height=480, seed=0):
+    """
+    Создаёт последовательность кадров в стиле слайд-шоу: общий фон,
+    на котором от кадра к кадру меняется только небольшая область.
+
+    Параметры:
+    - count: Количество кадров.
+    - width, height: Размер кадров.
+    - seed: Зерно генератора случайных чисел.
+
+    Возвращает:
+    - Список кадров (массивов numpy RGB).
+    """
+    rng = np.random.default_rng(seed)
+    background = np.array(make_image(width, height, seed))
+    frames = []
+    for idx in range(count):
+        frame = background.copy()
+        # Движущийся объект и меняющаяся подпись занимают малую часть кадра
+        x = (idx * width // max(count, 1)) % (width - width // 5)
+        frame[height // 3:height // 3 + height // 5, x:x + width // 5] = rng.integers(0, 255, 3)
+        frame[-height // 10:, :width // 3] = rng.integers(0, 255, (height // 10, width // 3, 3))
+        frames.append(frame)
+    return frames
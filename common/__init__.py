@@ -0,0 +1,2 @@
+# common/__init__.py
+# Код, общий для всех сервисов (копируется в образ каждого сервиса)
@@ -0,0 +1,108 @@
+# common/blobs.py
+"""
+Общее хранилище содержимого загрузок, адресуемое по SHA-256.
+
+Хранилище — каталог uploads/.blobs (на том же томе, что и папки сессий):
+- <sha[:2]>/<sha> — исходный файл;
+- <sha[:2]>/<sha><суффикс> — производные этого содержимого (миниатюра,
+  превью, подготовленные кадры).
+
+Файлы сессий остаются на своих местах (uploads/<session_id>/<имя>,
+.thumbs, .previews, .frames), но являются жёсткими ссылками на записи
+хранилища. Поэтому одинаковые файлы — повторная загрузка в той же или
+другой сессии — занимают место на диске один раз, а производные
+создаются один раз на содержимое.
+
+Счётчик ссылок — число жёстких ссылок файла (st_nlink): удаление файла
+из сессии (remove_image, удаление сессии очисткой) уменьшает его. Запись
+хранилища с единственной ссылкой больше не нужна ни одной сессии, её
+удаляет очистка загрузок (web_ui/janitor.py).
+
+Если файловая система не поддерживает жёсткие ссылки, файлы сессий
+просто не разделяются.
+"""
+
+import logging  # Для логирования событий
+import os  # Для работы с файловой системой
+import uuid  # Для имён временных файлов
+
+logger = logging.getLogger(__name__)
+
+BLOBS_DIR = '.blobs'
+
+
+def blob_path(upload_folder, sha256, suffix=''):
+    """
+    Возвращает путь к записи хранилища.
+
+    Параметры:
+    - upload_folder: Папка загрузок сессии (хранилище находится рядом с ней).
+    - sha256: SHA-256 исходного файла.
+    - suffix: Суффикс производной записи (например, '.thumb.webp') или ''.
+    """
+    uploads_root = os.path.dirname(os.path.normpath(upload_folder))
+    return os.path.join(uploads_root, BLOBS_DIR, sha256[:2], f'{sha256}{suffix}')
+
+
+def link_from_store(blob, path):
+    """
+    Атомарно заменяет path жёсткой ссылкой на запись хранилища.
+
+    Возвращает:
+    - True, если path теперь ссылается на blob; False, если записи нет
+      или ссылку создать нельзя.
+    """
+    temp_path = f'{path}.tmp-{uuid.uuid4().hex[:8]}'
+    try:
+        os.link(blob, temp_path)
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        logger.debug('Не удалось создать ссылку на %s: %s', blob, e)
+        return False
+    os.replace(temp_path, path)
+    # rename() ничего не делает, если оба имени уже ссылаются на один файл
+    if os.path.lexists(temp_path):
+        os.remove(temp_path)
+    return True
+
+
+def add_to_store(path, blob):
+    """
+    Добавляет файл в хранилище (жёсткой ссылкой), если такой записи ещё нет.
+
+    Возвращает:
+    - True, если запись добавлена.
+    """
+    try:
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        os.link(path, blob)
+        return True
+    except FileExistsError:
+        return False
+    except OSError as e:
+        logger.debug('Не удалось добавить %s в хранилище: %s', path, e)
+        return False
+
+
+def share_file(path, blob):
+    """
+    Разделяет содержимое файла с хранилищем.
+
+    Если такое содержимое уже есть в хранилище, path заменяется ссылкой
+    на него (только что записанная копия освобождается), иначе файл
+    становится записью хранилища.
+
+    Параметры:
+    - path: Файл сессии.
+    - blob: Путь к записи хранилища (blob_path).
+
+    Возвращает:
+    - True, если содержимое уже было в хранилище (дубликат).
+    """
+    if link_from_store(blob, path):
+        return True
+    if add_to_store(path, blob):
+        return False
+    # Такое же содержимое одновременно добавил другой запрос
+    return link_from_store(blob, path)
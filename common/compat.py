@@ -0,0 +1,15 @@
+# common/compat.py
+
+
+def as_coroutine(func):
+    """
+    Оборачивает синхронную функцию в корутину с тем же именем.
+
+    Нужна для регистрации хуков before_request/after_request в асинхронном
+    приложении (Quart), которое ожидает корутины.
+    """
+    async def wrapper(*args):
+        return func(*args)
+
+    wrapper.__name__ = func.__name__
+    return wrapper
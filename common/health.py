@@ -0,0 +1,47 @@
+# common/health.py
+
+import logging  # Для логирования событий
+import tempfile  # Для проверки записи в каталог
+from flask import jsonify  # Для ответов проверок
+
+logger = logging.getLogger(__name__)
+
+
+def check_writable(path):
+    """Проверяет, что в каталог можно записать файл (например, том uploads смонтирован)."""
+    with tempfile.TemporaryFile(dir=path):
+        pass
+
+
+def register_health_routes(app, checks=None):
+    """
+    Добавляет в приложение эндпоинты проверки состояния.
+
+    - /healthz (liveness): процесс отвечает на запросы, всегда 200.
+    - /readyz (readiness): все проверки из checks прошли — 200, иначе 503
+      со списком неудачных проверок. Проверки должны быть быстрыми:
+      их вызывают оркестратор и балансировщик.
+
+    Параметры:
+    - app: Flask-приложение.
+    - checks: Словарь {имя: функция без аргументов}; функция сообщает о
+      неготовности исключением.
+    """
+    checks = checks or {}
+
+    @app.route('/healthz', methods=['GET'])
+    def healthz():
+        return jsonify(status='ok')
+
+    @app.route('/readyz', methods=['GET'])
+    def readyz():
+        failed = {}
+        for name, check in checks.items():
+            try:
+                check()
+            except Exception as e:
+                failed[name] = str(e) or type(e).__name__
+        if failed:
+            logger.warning('Сервис не готов: %s', failed)
+            return jsonify(status='unavailable', failed=failed), 503
+        return jsonify(status='ok')
@@ -0,0 +1,26 @@
+# common/imaging.py
+
+# Режимы кадров, с которыми работают палитра, кодировщики и канонические кадры
+RGB_MODES = ('RGB', 'RGBA')
+
+
+def to_rgb(img):
+    """
+    Приводит изображение к 8-битному RGB или RGBA (RGBA — если есть прозрачность).
+
+    Целочисленные оттенки серого (I;16, I — например, 16-битные TIFF и PNG)
+    сначала масштабируются в 8 бит: Image.convert() обрезал бы значения
+    больше 255.
+
+    Параметры:
+    - img: Изображение Pillow в любом режиме.
+
+    Возвращает:
+    - Изображение Pillow в режиме RGB или RGBA.
+    """
+    if img.mode in RGB_MODES:
+        return img
+    has_alpha = 'A' in img.getbands() or 'transparency' in img.info
+    if img.mode.startswith('I'):
+        img = img.convert('I').point(lambda value: value / 256)
+    return img.convert('RGBA' if has_alpha else 'RGB')
@@ -0,0 +1,229 @@
+# common/logging_setup.py
+
+import atexit  # Для сброса очереди логов при завершении процесса
+import contextvars  # Для идентификатора запроса в потоке или задаче asyncio
+import itertools  # Для счётчиков выборочного логирования
+import json  # Для структурированного вывода
+import logging  # Для настройки логирования
+import logging.handlers  # Для QueueHandler и QueueListener
+import os  # Для чтения настроек из окружения
+import queue  # Для очереди записей
+import sys  # Для вывода в stderr
+import time  # Для отметок времени и длительности запросов
+import uuid  # Для идентификаторов запросов
+from collections import defaultdict  # Для счётчиков по месту вызова
+from contextlib import contextmanager  # Для контекста идентификатора запроса
+from common.compat import as_coroutine  # Хуки запросов для асинхронного приложения
+
+# Уровень логирования (DEBUG, INFO, WARNING, ...) и формат вывода:
+# json — одна JSON-строка на запись, text — строка для чтения человеком
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+# Выборочное логирование частых сообщений (например, по кадру): пишется каждое N-е
+LOG_SAMPLE_EVERY = int(os.environ.get('LOG_SAMPLE_EVERY', 100))
+# Заголовок, в котором идентификатор запроса передаётся между сервисами
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Дополнительные поля записи (logger.info(..., extra={...})), которые попадают в JSON
+EXTRA_FIELDS = ('method', 'path', 'status', 'duration_ms', 'bytes', 'job_id', 'sample_every')
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+_service = None
+_listener = None
+_sample_counters = defaultdict(itertools.count)
+
+
+class ContextFilter(logging.Filter):
+    """Добавляет к записи имя сервиса и идентификатор текущего запроса."""
+
+    def filter(self, record):
+        record.service = _service
+        record.request_id = _request_id.get()
+        return True
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    Передаёт записи в очередь; форматирование и запись в stderr выполняет
+    поток QueueListener, поэтому обработчик запроса не ждёт вывода.
+
+    В потоке вызова подставляются только аргументы сообщения (чтобы
+    изменяемые аргументы не успели измениться до вывода).
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись как одну JSON-строку."""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'service': getattr(record, 'service', None),
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        for field in EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _make_formatter():
+    if LOG_FORMAT == 'text':
+        return logging.Formatter('%(asctime)s %(levelname)s [%(service)s %(request_id)s] %(name)s: %(message)s')
+    return JsonFormatter()
+
+
+def _start_listener():
+    """Создаёт очередь записей, поток вывода и обработчик корневого логгера."""
+    global _listener
+    records = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(_make_formatter())
+    _listener = logging.handlers.QueueListener(records, stream_handler)
+    _listener.start()
+    queue_handler = AsyncQueueHandler(records)
+    queue_handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+
+def _restart_after_fork():
+    """
+    Поток вывода не переживает fork: в дочернем процессе (рабочий процесс
+    gunicorn, процесс пула декодирования) запускается свой.
+    """
+    if _listener is not None:
+        _start_listener()
+
+
+def _stop_listener():
+    """Выводит оставшиеся в очереди записи и останавливает поток вывода."""
+    if _listener is not None:
+        _listener.stop()
+
+
+def setup_logging(service):
+    """
+    Настраивает логирование сервиса.
+
+    Уровень задаётся LOG_LEVEL, формат — LOG_FORMAT. Записи передаются
+    в поток вывода через очередь. Повторные вызовы ничего не делают.
+
+    Параметры:
+    - service: Имя сервиса (поле service в каждой записи).
+    """
+    global _service
+    if _service is not None:
+        return
+    _service = service
+    logging.getLogger().setLevel(LOG_LEVEL)
+    _start_listener()
+    atexit.register(_stop_listener)
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def current_request_id():
+    """Возвращает идентификатор текущего запроса или None."""
+    return _request_id.get()
+
+
+def with_request_id(headers=None):
+    """
+    Возвращает заголовки исходящего запроса к другому сервису с добавленным
+    идентификатором текущего запроса (если он есть), чтобы записи всех
+    сервисов по одному запросу пользователя можно было связать.
+    """
+    request_id = _request_id.get()
+    if not request_id:
+        return headers
+    return {**(headers or {}), REQUEST_ID_HEADER: request_id}
+
+
+@contextmanager
+def request_context(request_id):
+    """Устанавливает идентификатор запроса для записей внутри блока (например, в потоке задачи)."""
+    token = _request_id.set(request_id)
+    try:
+        yield
+    finally:
+        _request_id.reset(token)
+
+
+def log_sampled(logger, level, msg, *args, every=None):
+    """
+    Пишет сообщение выборочно: первое и затем каждое every-е для данного
+    места вызова (логгер и шаблон сообщения). Для частых сообщений,
+    например по одному на кадр.
+
+    Параметры:
+    - logger: Логгер.
+    - level: Уровень записи.
+    - msg, args: Шаблон сообщения и аргументы (в стиле %).
+    - every: Частота выборки (по умолчанию LOG_SAMPLE_EVERY).
+    """
+    if not logger.isEnabledFor(level):
+        return
+    every = every or LOG_SAMPLE_EVERY
+    if next(_sample_counters[(logger.name, msg)]) % every == 0:
+        logger.log(level, msg, *args, extra={'sample_every': every})
+
+
+def init_request_logging(app, request, asynchronous=False):
+    """
+    Добавляет в приложение идентификатор запроса и журнал запросов.
+
+    Идентификатор берётся из заголовка X-Request-ID (его ставит шлюз или
+    вызывающий сервис) или создаётся, возвращается в ответе и попадает во
+    все записи, сделанные при обработке запроса. По завершении запроса
+    пишется запись с методом, путём, статусом и длительностью.
+
+    Параметры:
+    - app: Flask-приложение (или Quart-приложение с тем же API хуков).
+    - request: Прокси запроса того же фреймворка (flask.request, quart.request).
+    - asynchronous: Регистрировать хуки как корутины. Нужно для Quart: синхронные
+      хуки он выполняет в пуле потоков с копией контекста, и установленный там
+      идентификатор запроса не дошёл бы до обработчика.
+    """
+    request_logger = logging.getLogger(f'{app.name}.requests')
+    started = contextvars.ContextVar('request_started', default=None)
+
+    def start_request():
+        _request_id.set(request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex)
+        started.set(time.perf_counter())
+
+    def finish_request(response):
+        request_id = _request_id.get()
+        if request_id:
+            response.headers[REQUEST_ID_HEADER] = request_id
+        if started.get() is not None:
+            duration_ms = round((time.perf_counter() - started.get()) * 1000, 2)
+            request_logger.info('%s %s %s %.1f ms', request.method, request.path, response.status_code, duration_ms,
+                                extra={'method': request.method, 'path': request.path,
+                                       'status': response.status_code, 'duration_ms': duration_ms})
+        return response
+
+    def end_request(exc=None):
+        # Поток (или задача) обслуживает следующие запросы: идентификатор не должен переходить к ним
+        _request_id.set(None)
+        started.set(None)
+
+    for register, hook in ((app.before_request, start_request), (app.after_request, finish_request),
+                           (app.teardown_request, end_request)):
+        if asynchronous:
+            register(as_coroutine(hook))
+        else:
+            register(hook)
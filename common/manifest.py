@@ -0,0 +1,190 @@
+# common/manifest.py
+
+import fcntl  # Для межпроцессной блокировки манифеста
+import json  # Для хранения манифеста
+import logging  # Для логирования событий
+import os  # Для работы с файловой системой
+import uuid  # Для имён временных файлов
+from contextlib import contextmanager  # Для блокировки в виде контекстного менеджера
+
+logger = logging.getLogger(__name__)
+
+# Манифест сессии — единственный источник порядка и метаданных изображений.
+# Его читают и изменяют все сервисы (папка сессии общая через том uploads):
+# {
+#   "version": <номер изменения состава или порядка изображений>,
+#   "images": [<запись изображения>, ...]   # в порядке кадров
+# }
+MANIFEST_NAME = 'manifest.json'
+# Файл блокировки: манифест заменяется атомарно, поэтому блокировать сам файл нельзя
+LOCK_NAME = '.manifest.lock'
+# Расширения изображений (для переноса старых сессий без манифеста)
+IMAGE_EXTENSIONS = ('png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff')
+# Файлы папки сессии, которые не являются кадрами (результаты генерации)
+RESERVED_NAMES = ('animation.gif', 'animation.webp', 'animation.png', 'animation.mp4')
+
+
+class ManifestConflict(Exception):
+    """Манифест изменился после того, как клиент прочитал его версию."""
+
+    def __init__(self, manifest):
+        super().__init__(f'manifest version is {manifest["version"]}')
+        self.manifest = manifest
+
+
+def manifest_path(upload_folder):
+    """Возвращает путь к манифесту сессии."""
+    return os.path.join(upload_folder, MANIFEST_NAME)
+
+
+def make_entry(name, original_name=None, size=None, sha256=None, width=None, height=None):
+    """
+    Создаёт запись изображения для манифеста.
+
+    Параметры:
+    - name: Имя файла в папке сессии (идентификатор кадра).
+    - original_name: Имя файла у пользователя.
+    - size: Размер файла в байтах.
+    - sha256: SHA-256 содержимого.
+    - width, height: Размеры изображения в пикселях.
+
+    Возвращает:
+    - Словарь записи; пути производных изображений (thumbnail, preview)
+      и канонический кадр (canonical: path, width, height, mode)
+      заполняются после их создания.
+    """
+    return {
+        'name': name,
+        'original_name': original_name or name,
+        'size': size,
+        'sha256': sha256,
+        'width': width,
+        'height': height,
+        'thumbnail': None,
+        'preview': None,
+        'canonical': None,
+    }
+
+
+def _empty():
+    return {'version': 0, 'images': []}
+
+
+def _load(upload_folder):
+    """Читает манифест; возвращает None, если его нет."""
+    try:
+        with open(manifest_path(upload_folder), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write(upload_folder, manifest):
+    """Записывает манифест атомарно: через временный файл и os.replace."""
+    path = manifest_path(upload_folder)
+    temp_path = f'{path}.tmp-{uuid.uuid4().hex[:8]}'
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _scan(upload_folder):
+    """Собирает записи из содержимого папки (для сессий, созданных до появления манифеста)."""
+    entries = []
+    for entry in sorted(os.scandir(upload_folder), key=lambda e: e.name):
+        if (entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS)
+                and entry.name not in RESERVED_NAMES):
+            entries.append(make_entry(entry.name, size=entry.stat().st_size))
+    return entries
+
+
+@contextmanager
+def _locked(upload_folder):
+    """Эксклюзивная блокировка манифеста сессии (между потоками и процессами всех сервисов)."""
+    with open(os.path.join(upload_folder, LOCK_NAME), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_manifest(upload_folder):
+    """
+    Возвращает манифест сессии.
+
+    Чтение не требует блокировки: манифест всегда заменяется целиком.
+    Если папка сессии существует, а манифеста нет (сессия создана до его
+    появления), манифест один раз строится по содержимому папки.
+
+    Параметры:
+    - upload_folder: Папка загрузок сессии.
+
+    Возвращает:
+    - Словарь манифеста (version, images).
+    """
+    manifest = _load(upload_folder)
+    if manifest is not None:
+        return manifest
+    try:
+        return update_manifest(upload_folder, lambda manifest: None)
+    except FileNotFoundError:
+        # Папки сессии нет: изображений нет
+        return _empty()
+
+
+def update_manifest(upload_folder, mutate, expected_version=None, bump_version=True):
+    """
+    Изменяет манифест под блокировкой: чтение, изменение, атомарная запись.
+
+    С expected_version изменение выполняется как compare-and-swap: если
+    текущая версия манифеста другая, возникает ManifestConflict и манифест
+    не меняется. Так из нескольких одновременных изменений, сделанных по
+    одной версии, применяется только первое.
+
+    Параметры:
+    - upload_folder: Папка загрузок сессии. Она не создаётся: если папку
+      удалили (новая сессия), возникает FileNotFoundError.
+    - mutate: Функция mutate(manifest), изменяющая манифест на месте.
+      Если она возвращает False, манифест не записывается.
+    - expected_version: Версия, которую видел клиент, или None.
+    - bump_version: Увеличивать версию. False — для изменений, не влияющих
+      на состав и порядок изображений (например, пути производных), чтобы
+      они не вызывали конфликтов у клиентов.
+
+    Возвращает:
+    - Манифест после изменения.
+    """
+    with _locked(upload_folder):
+        manifest = _load(upload_folder)
+        if manifest is None:
+            manifest = _empty()
+            manifest['images'] = _scan(upload_folder)
+            if manifest['images']:
+                logger.info('Манифест построен по содержимому папки %s: %s изображений', upload_folder,
+                            len(manifest["images"]))
+        if expected_version is not None and manifest['version'] != expected_version:
+            raise ManifestConflict(manifest)
+        if mutate(manifest) is False and os.path.exists(manifest_path(upload_folder)):
+            return manifest
+        if bump_version:
+            manifest['version'] += 1
+        _write(upload_folder, manifest)
+        return manifest
+
+
+def image_names(manifest):
+    """Возвращает имена изображений в порядке кадров."""
+    return [entry['name'] for entry in manifest['images']]
+
+
+def find_image(manifest, name):
+    """Возвращает запись изображения по имени или None."""
+    for entry in manifest['images']:
+        if entry['name'] == name:
+            return entry
+    return None
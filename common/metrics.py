@@ -0,0 +1,314 @@
+# common/metrics.py
+"""
+Метрики сервисов в текстовом формате Prometheus.
+
+Счётчики, значения и гистограммы хранятся в памяти процесса и отдаются на
+/metrics. Запись метрики — несколько операций со словарём под блокировкой
+(около микросекунды, см. benchmarks/bench_metrics_overhead.py), поэтому её
+можно вызывать на каждом запросе и на каждом кадре.
+
+Значения относятся к одному процессу: при нескольких рабочих процессах
+gunicorn каждый ответ /metrics содержит метрики того процесса, который его
+обслужил. Точные суммы по сервису дают GUNICORN_WORKERS=1 (как у
+gif_generator) или опрос каждого процесса отдельно.
+"""
+
+import bisect  # Для поиска интервала гистограммы
+import contextvars  # Для времени начала запроса в потоке или задаче asyncio
+import threading  # Для защиты значений от одновременного изменения
+import time  # Для измерения длительности
+from common.compat import as_coroutine  # Хуки запросов для асинхронного приложения
+
+# Границы интервалов гистограмм длительности по умолчанию, в секундах
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    Общая часть метрик: имя, описание, метки и значения по наборам меток.
+
+    labels(*values) возвращает значение для набора меток (создаёт его при
+    первом обращении); у метрики без меток методы значения вызываются
+    напрямую.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f'{self.name}: ожидаются метки {self.labelnames}, получено {values}')
+            with self._lock:
+                child = self._children.setdefault(tuple(str(value) for value in values), self._new_child())
+                self._children.setdefault(values, child)
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _items(self):
+        """Значения по наборам меток (без повторов из-за нестроковых ключей)."""
+        with self._lock:
+            items = list(self._children.items())
+        seen = set()
+        for values, child in items:
+            if id(child) not in seen:
+                seen.add(id(child))
+                yield tuple(str(value) for value in values), child
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, child in sorted(self._items(), key=lambda item: item[0]):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child):
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}']
+
+
+class _Value:
+    def __init__(self):
+        self._value = 0
+        self._function = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def get(self):
+        if self._function is not None:
+            return self._function()
+        return self._value
+
+
+class _GaugeValue(_Value):
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value):
+        self._value = value
+
+    def set_function(self, function):
+        """Значение вычисляется при каждом чтении /metrics (например, длина очереди)."""
+        self._function = function
+
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик (запросы, кадры, байты)."""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    """Текущее значение, которое может уменьшаться (длина очереди, размер кэша)."""
+
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def set_function(self, function):
+        self._default.set_function(function)
+
+
+class _Timer:
+    """Контекстный менеджер: записывает длительность блока в гистограмму."""
+
+    __slots__ = ('_child', '_started')
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._started)
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class Histogram(_Metric):
+    """
+    Гистограмма (обычно длительностей в секундах): количество наблюдений по
+    интервалам, их сумма и число. Квантили считает Prometheus
+    (histogram_quantile), поэтому значения процессов можно складывать.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def _render_child(self, values, child):
+        counts, total = child.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, f'le="{_format_value(float(bound))}"')
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    """Набор метрик процесса."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """
+        Добавляет метрику. Повторная регистрация того же имени (например,
+        при повторном импорте модуля) возвращает уже созданную метрику.
+        """
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        """Возвращает все метрики в текстовом формате Prometheus."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    """Создаёт счётчик в реестре процесса."""
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    """Создаёт значение в реестре процесса."""
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """Создаёт гистограмму в реестре процесса."""
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+HTTP_REQUEST_SECONDS = histogram('http_request_duration_seconds', 'Длительность обработки HTTP-запросов',
+                                 ['method', 'route', 'status'])
+
+
+def init_metrics(app, request, asynchronous=False):
+    """
+    Добавляет в приложение /metrics и гистограмму длительности запросов
+    по маршрутам.
+
+    Метка route — шаблон маршрута (например, /jobs/<job_id>), а не путь
+    запроса, чтобы число наборов меток не росло с числом задач и сессий.
+
+    Параметры:
+    - app: Flask-приложение (или Quart-приложение с тем же API хуков).
+    - request: Прокси запроса того же фреймворка.
+    - asynchronous: Регистрировать хуки как корутины (для Quart, см.
+      common.logging_setup.init_request_logging).
+    """
+    started = contextvars.ContextVar('metrics_request_started', default=None)
+
+    def start_timer():
+        started.set(time.perf_counter())
+
+    def observe(response):
+        if started.get() is not None:
+            rule = request.url_rule
+            route = rule.rule if rule is not None else 'unmatched'
+            HTTP_REQUEST_SECONDS.labels(request.method, route, response.status_code).observe(
+                time.perf_counter() - started.get())
+            started.set(None)
+        return response
+
+    if asynchronous:
+        app.before_request(as_coroutine(start_timer))
+        app.after_request(as_coroutine(observe))
+    else:
+        app.before_request(start_timer)
+        app.after_request(observe)
+
+    if 'metrics' not in app.view_functions:
+        def metrics():
+            return REGISTRY.render(), 200, {'Content-Type': CONTENT_TYPE}
+
+        app.add_url_rule('/metrics', 'metrics', metrics, methods=['GET'])
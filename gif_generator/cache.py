@@ -0,0 +1,190 @@
+# gif_generator/cache.py
+
+import hashlib  # Для вычисления ключей кэша
+import json  # Для сериализации параметров в ключ
+import logging  # Для логирования событий
+import os  # Для работы с файловой системой
+import shutil  # Для копирования, если жёсткая ссылка невозможна
+import threading  # Для синхронизации счётчиков и вытеснения
+import uuid  # Для имён временных файлов
+from collections import OrderedDict  # Для ограниченного кэша хэшей файлов
+
+logger = logging.getLogger(__name__)
+
+# Размер блока при чтении файлов для хэширования
+HASH_CHUNK_SIZE = 1024 * 1024
+# Сколько хэшей исходных файлов держать в памяти
+DIGEST_MEMO_SIZE = 10000
+
+
+def link_or_copy(src, dst):
+    """
+    Атомарно делает dst указателем на src.
+
+    Сначала пытается создать жёсткую ссылку (без копирования данных), если
+    файловая система этого не позволяет — копирует файл. Читатели dst никогда
+    не видят частично записанный файл.
+    """
+    try:
+        if os.path.samefile(src, dst):
+            return
+    except FileNotFoundError:
+        pass
+    temp_path = f'{dst}.tmp-{uuid.uuid4().hex[:8]}'
+    try:
+        os.link(src, temp_path)
+    except OSError:
+        shutil.copyfile(src, temp_path)
+    os.replace(temp_path, dst)
+    # rename() ничего не делает, если оба имени ссылаются на один файл
+    if os.path.lexists(temp_path):
+        os.remove(temp_path)
+
+
+class ResultCache:
+    """
+    Дисковый кэш готовых результатов, адресуемый по содержимому.
+
+    Ключ вычисляется из хэшей содержимого кадров (в порядке следования)
+    и параметров генерации. Размер кэша ограничен max_bytes: при превышении
+    удаляются записи, к которым дольше всего не обращались (LRU по mtime).
+    Запись выполняется через временный файл и os.replace, поэтому кэш можно
+    безопасно использовать из нескольких потоков и процессов.
+
+    Параметры:
+    - root: Каталог кэша.
+    - max_bytes: Максимальный суммарный размер записей в байтах.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._digests = OrderedDict()
+
+    def file_digest(self, path):
+        """
+        Возвращает SHA-256 содержимого файла.
+
+        Результат запоминается по (путь, размер, mtime), поэтому повторная
+        генерация из тех же файлов не перечитывает их с диска.
+        """
+        stat = os.stat(path)
+        memo_key = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(memo_key)
+            if digest is not None:
+                self._digests.move_to_end(memo_key)
+                return digest
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        with self._lock:
+            self._digests[memo_key] = digest
+            if len(self._digests) > DIGEST_MEMO_SIZE:
+                self._digests.popitem(last=False)
+        return digest
+
+    def key(self, paths, params):
+        """
+        Вычисляет ключ кэша.
+
+        Параметры:
+        - paths: Пути к исходным кадрам в порядке следования.
+        - params: Словарь параметров генерации, влияющих на результат.
+
+        Возвращает:
+        - Шестнадцатеричную строку ключа.
+        """
+        sha = hashlib.sha256()
+        sha.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+        for path in paths:
+            try:
+                sha.update(self.file_digest(path).encode('ascii'))
+            except OSError:
+                # Отсутствующий файл тоже часть ключа: такой кадр будет пропущен
+                sha.update(b'missing')
+        return sha.hexdigest()
+
+    def path(self, key, extension='gif'):
+        """Возвращает путь к записи кэша."""
+        return os.path.join(self.root, key[:2], f'{key}.{extension}')
+
+    def get(self, key, extension='gif'):
+        """
+        Возвращает путь к готовому результату или None при промахе.
+
+        При попадании обновляет время последнего обращения записи.
+        """
+        path = self.path(key, extension)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def put(self, key, src_path, extension='gif'):
+        """
+        Помещает файл src_path в кэш (файл перемещается) и вытесняет старые записи.
+
+        Возвращает:
+        - Путь к записи кэша.
+        """
+        path = self.path(key, extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(src_path, path)
+        self.evict()
+        return path
+
+    def entries(self):
+        """Возвращает список (mtime, размер, путь) всех записей кэша."""
+        result = []
+        if not os.path.isdir(self.root):
+            return result
+        for bucket in os.scandir(self.root):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                result.append((stat.st_mtime, stat.st_size, entry.path))
+        return result
+
+    def evict(self):
+        """Удаляет давно не использованные записи, пока размер кэша превышает лимит."""
+        with self._lock:
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            if total <= self.max_bytes:
+                return
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                logger.info('Запись кэша вытеснена: %s', path)
+                if total <= self.max_bytes:
+                    break
+
+    def stats(self):
+        """Возвращает счётчики попаданий и промахов и текущий размер кэша."""
+        entries = self.entries()
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(entries),
+                'bytes': sum(size for _, size, _ in entries),
+                'max_bytes': self.max_bytes,
+            }
@@ -0,0 +1,302 @@
+# gif_generator/encoder.py
+
+import logging  # Для логирования событий
+import struct  # Для упаковки полей заголовка GIF
+import time  # Для измерения времени кодирования
+import numpy as np  # Для векторного сравнения кадров
+from PIL import Image, ImageOps, GifImagePlugin  # Для квантования, выравнивания и LZW-кодирования кадров
+from palette import PaletteBuilder  # Для общей палитры с таблицей поиска
+
+logger = logging.getLogger(__name__)
+
+# Индекс палитры, зарезервированный под прозрачность: пиксели, не изменившиеся
+# с предыдущего кадра, записываются этим индексом и не перерисовываются
+TRANSPARENT_INDEX = 255
+# Количество цветов палитры, доступных для изображения
+PALETTE_COLORS = 255
+
+# Режимы палитры: одна общая палитра для всех кадров или своя палитра у каждого кадра
+GLOBAL_PALETTE = 'global'
+LOCAL_PALETTE = 'local'
+
+# Способ обработки кадра декодером: оставить кадр на месте (поверх него
+# рисуется следующий кадр с прозрачными неизменёнными пикселями)
+DISPOSAL_KEEP = 1
+# Стереть область кадра после показа (восстановить прозрачный фон): нужен,
+# когда в следующем кадре становятся прозрачными видимые сейчас пиксели
+DISPOSAL_RESTORE = 2
+# Пиксели с альфа-каналом меньше порога записываются прозрачными
+ALPHA_THRESHOLD = 128
+
+# Если внутри прямоугольника изменилась такая доля пикселей, прозрачность не
+# используется: разрозненные прозрачные пиксели только ухудшают сжатие LZW
+OPAQUE_REGION_RATIO = 0.9
+
+
+class GifEncoder:
+    """
+    Потоковый кодировщик GIF с оптимизацией без внешних утилит.
+
+    Кадры записываются в файл по мере поступления. Оптимизация выполняется
+    при кодировании:
+    - палитра общая для всех кадров (передаётся готовой, например построенной
+      по гистограмме всех кадров, или строится по первому кадру) или своя
+      для каждого кадра; кадры отображаются в общую палитру по таблице поиска;
+    - маска изменений каждого кадра относительно уже показанного изображения
+      вычисляется векторно в NumPy; записывается только ограничивающий её
+      прямоугольник, а неизменившиеся пиксели внутри него — прозрачным
+      индексом (кадры оставляются на месте, disposal = 1);
+    - кадры, не отличающиеся от предыдущего, не записываются: их длительность
+      добавляется к предыдущему кадру.
+
+    Прозрачность кадров RGBA сохраняется: пиксели с альфа-каналом меньше
+    ALPHA_THRESHOLD записываются прозрачным индексом. Если видимые пиксели
+    становятся прозрачными, предыдущий кадр записывается целиком и стирается
+    после показа (disposal = 2).
+
+    Параметры:
+    - fp: Файл, открытый на запись в двоичном режиме.
+    - duration: Длительность кадра в миллисекундах.
+    - loop: Количество циклов (0 — бесконечно, 1 — без повтора).
+    - palette: GLOBAL_PALETTE или LOCAL_PALETTE.
+    - delta: Записывать только изменившиеся области (False — полные кадры).
+    - tolerance: Допустимое отличие канала (0..255), при котором пиксель
+      считается неизменившимся. 0 — точное сравнение.
+    - global_palette: Готовая общая палитра (palette.Palette) или None.
+    - dither: Упорядоченный дизеринг при отображении в общую палитру.
+    """
+
+    def __init__(self, fp, duration, loop=0, palette=GLOBAL_PALETTE, delta=True, tolerance=0,
+                 global_palette=None, dither=False):
+        self.fp = fp
+        self.duration = duration
+        self.loop = loop
+        self.palette = palette
+        self.delta = delta
+        self.tolerance = tolerance
+        self.global_palette = global_palette
+        self.dither = dither
+        self.size = None
+        self.frames = 0
+        # Статистика кодирования: записанные байты, доля перерисованных пикселей, время
+        self.bytes_written = 0
+        self.changed_pixels = 0
+        self.total_pixels = 0
+        self.encode_seconds = 0.0
+        # Изображение, которое видит зритель после последнего записанного кадра,
+        # и маска его прозрачных пикселей (None — прозрачных нет)
+        self._canvas = None
+        self._canvas_clear = None
+        # Последний кадр ещё не записан: к нему может добавиться длительность повторов
+        self._pending = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add_frame(self, frame):
+        """
+        Кодирует очередной кадр.
+
+        Параметры:
+        - frame: Кадр в виде массива numpy (оттенки серого, RGB или RGBA).
+        """
+        started = time.perf_counter()
+        image = self._to_canvas(Image.fromarray(frame))
+        clear = None
+        if image.mode == 'RGBA':
+            clear = np.asarray(image.getchannel('A')) < ALPHA_THRESHOLD
+            if not clear.any():
+                clear = None
+            image = image.convert('RGB')
+        indexed = self._quantize(image)
+        if self.frames == 0:
+            self._write(self._header())
+        indices = np.asarray(indexed)
+        displayed = _palette_array(indexed)[indices]
+        self.total_pixels += indices.size
+        if clear is not None:
+            indices = indices.copy()
+            indices[clear] = TRANSPARENT_INDEX
+            indexed = _with_indices(indexed, indices)
+        transparency = TRANSPARENT_INDEX if clear is not None else None
+
+        if self._canvas is not None and clear is not None and \
+                (self._canvas_clear is None or (clear & ~self._canvas_clear).any()):
+            # Видимые пиксели становятся прозрачными: при disposal = 1 под ними остался бы
+            # предыдущий кадр, поэтому он записывается целиком и стирается после показа
+            self._restore_pending()
+            self._canvas = None
+        if self._canvas is None or not self.delta:
+            self.changed_pixels += indices.size
+            self._queue_frame(indexed, (0, 0), transparency, indexed)
+            self._canvas = displayed
+            self._canvas_clear = clear
+        else:
+            self._queue_delta(indexed, indices, displayed, clear)
+        self.frames += 1
+        self.encode_seconds += time.perf_counter() - started
+
+    def close(self):
+        """Записывает последний кадр и завершающий байт GIF."""
+        if not self.frames:
+            return
+        self._flush()
+        self._write(b';')
+        logger.info('GIF закодирован: кадров %s, %s байт, перерисовано %.1f%% пикселей, %.2f с', self.frames,
+                    self.bytes_written, self.changed_ratio() * 100, self.encode_seconds)
+        if self.global_palette is not None:
+            logger.info('Отображение в палитру: %.1f Мп/с', self.global_palette.throughput())
+
+    def changed_ratio(self):
+        """Возвращает долю перерисованных пикселей по всем кадрам."""
+        return self.changed_pixels / self.total_pixels if self.total_pixels else 0.0
+
+    def _to_canvas(self, image):
+        """
+        Приводит кадр к RGB (RGBA, если у кадра есть альфа-канал) и к размеру
+        первого кадра: кадр другого размера вписывается по центру с сохранением
+        пропорций, как в FfmpegEncoder (поля чёрные или прозрачные).
+        """
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        if self.size is None:
+            self.size = image.size
+        elif image.size != self.size:
+            image = ImageOps.pad(image, self.size, Image.LANCZOS)
+        return image
+
+    def _quantize(self, image):
+        """Переводит кадр в палитру, оставляя TRANSPARENT_INDEX свободным."""
+        if self.palette == GLOBAL_PALETTE:
+            pixels = np.asarray(image)
+            if self.global_palette is None:
+                # Палитра не передана: строим её по первому кадру
+                builder = PaletteBuilder()
+                builder.add(pixels)
+                self.global_palette = builder.build(PALETTE_COLORS)
+            indexed = Image.fromarray(self.global_palette.map(pixels, self.dither), 'P')
+            indexed.putpalette(self.global_palette.palette_bytes())
+            return indexed
+        return image.quantize(PALETTE_COLORS, method=Image.Quantize.MEDIANCUT)
+
+    def _header(self):
+        """Возвращает заголовок, глобальную палитру и расширение с числом циклов."""
+        width, height = self.size
+        if self.palette == GLOBAL_PALETTE:
+            # Глобальная таблица цветов на 256 записей
+            flags = 0x80 | 0x70 | 0x07
+            palette = self.global_palette.palette_bytes()
+        else:
+            flags = 0x70
+            palette = b''
+        header = b'GIF89a' + struct.pack('<HHBBB', width, height, flags, 0, 0) + palette
+        # Совместимо с imageio: loop=1 — проиграть один раз, без расширения NETSCAPE
+        if self.loop != 1:
+            header += b'!\xff\x0bNETSCAPE2.0\x03\x01' + struct.pack('<H', self.loop) + b'\x00'
+        return header
+
+    def _queue_delta(self, indexed, indices, displayed, clear=None):
+        """
+        Ставит в очередь на запись только изменившуюся часть кадра.
+
+        Прозрачные пиксели кадра (clear) уже прозрачны на экране и не
+        перерисовываются; прозрачные на экране и непрозрачные в кадре
+        перерисовываются всегда.
+        """
+        difference = np.abs(displayed - self._canvas)
+        changed = (difference > self.tolerance).any(axis=2)
+        if self._canvas_clear is not None:
+            changed |= self._canvas_clear
+        if clear is not None:
+            changed &= ~clear
+        rows = np.flatnonzero(changed.any(axis=1))
+        if rows.size == 0:
+            # Кадр не изменился: продлеваем показ предыдущего кадра
+            self._pending['duration'] += self.duration
+            return
+        cols = np.flatnonzero(changed.any(axis=0))
+        top, bottom = rows[0], rows[-1] + 1
+        left, right = cols[0], cols[-1] + 1
+        region = changed[top:bottom, left:right]
+        changed_count = int(np.count_nonzero(region))
+        self.changed_pixels += changed_count
+
+        cropped = indices[top:bottom, left:right].copy()
+        transparency = None
+        if changed_count < OPAQUE_REGION_RATIO * region.size or clear is not None:
+            cropped[~region] = TRANSPARENT_INDEX
+            transparency = TRANSPARENT_INDEX
+        sub_image = Image.fromarray(cropped, 'P')
+        sub_image.putpalette(indexed.getpalette())
+        self._queue_frame(sub_image, (int(left), int(top)), transparency, indexed)
+        if transparency is None:
+            self._canvas[top:bottom, left:right] = displayed[top:bottom, left:right]
+        else:
+            # Зритель видит новые значения только в изменившихся пикселях
+            self._canvas[top:bottom, left:right][region] = displayed[top:bottom, left:right][region]
+        if self._canvas_clear is not None:
+            # Перерисованные пиксели непрозрачны
+            self._canvas_clear[top:bottom, left:right][region] = False
+
+    def _queue_frame(self, indexed, offset, transparency, full):
+        """
+        Записывает предыдущий отложенный кадр и откладывает новый.
+
+        full — кадр целиком (с прозрачным индексом в прозрачных пикселях):
+        им заменяется записываемая часть, если кадр нужно стереть после показа.
+        """
+        self._flush()
+        self._pending = {'image': indexed, 'offset': offset, 'transparency': transparency,
+                         'duration': self.duration, 'disposal': DISPOSAL_KEEP, 'full': full}
+
+    def _restore_pending(self):
+        """Заменяет отложенный кадр полным кадром, который стирается после показа."""
+        if self._pending is None:
+            return
+        full = self._pending['full']
+        has_clear = bool((np.asarray(full) == TRANSPARENT_INDEX).any())
+        self._pending.update(image=full, offset=(0, 0), disposal=DISPOSAL_RESTORE,
+                             transparency=TRANSPARENT_INDEX if has_clear else None)
+
+    def _flush(self):
+        """Записывает отложенный кадр: расширение управления графикой, дескриптор и данные LZW."""
+        if self._pending is None:
+            return
+        pending, self._pending = self._pending, None
+        indexed = pending['image']
+        if self.palette == LOCAL_PALETTE:
+            indexed.putpalette(_palette_bytes(indexed))
+        params = {
+            'duration': pending['duration'],
+            'disposal': pending['disposal'],
+            'include_color_table': self.palette == LOCAL_PALETTE,
+        }
+        if pending['transparency'] is not None:
+            params['transparency'] = pending['transparency']
+        for chunk in GifImagePlugin.getdata(indexed, pending['offset'], **params):
+            self._write(chunk)
+
+    def _write(self, data):
+        self.fp.write(data)
+        self.bytes_written += len(data)
+
+
+def _palette_bytes(indexed):
+    """Возвращает палитру изображения, дополненную до 256 цветов."""
+    palette = indexed.getpalette()[:256 * 3]
+    return bytes(palette) + b'\x00' * (256 * 3 - len(palette))
+
+
+def _with_indices(indexed, indices):
+    """Возвращает палитровое изображение с индексами indices и палитрой indexed."""
+    image = Image.fromarray(indices, 'P')
+    image.putpalette(indexed.getpalette())
+    return image
+
+
+def _palette_array(indexed):
+    """Возвращает палитру изображения в виде массива 256x3 (int16) для поиска цветов по индексам."""
+    return np.frombuffer(_palette_bytes(indexed), dtype=np.uint8).reshape(256, 3).astype(np.int16)
@@ -0,0 +1,113 @@
+# gif_generator/ffmpeg_encoder.py
+
+import logging  # Для логирования событий
+import os  # Для переменных окружения
+import shutil  # Для поиска исполняемого файла ffmpeg
+import subprocess  # Для запуска ffmpeg
+import numpy as np  # Для подготовки кадров
+from PIL import Image, ImageOps  # Для приведения кадров к общему размеру и режиму
+
+logger = logging.getLogger(__name__)
+
+# Исполняемый файл ffmpeg (путь или имя в PATH)
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+# Качество кодирования: CRF для H.264 (меньше — лучше) и качество WebP (0..100)
+MP4_CRF = int(os.environ.get('MP4_CRF', 23))
+WEBP_QUALITY = int(os.environ.get('WEBP_QUALITY', 80))
+
+# Параметры ffmpeg по форматам: режим пикселей входных кадров и параметры
+# кодека и контейнера. {loop} — число повторов (0 — бесконечно)
+FORMAT_ARGS = {
+    # Анимированный WebP: сжатие с потерями, прозрачность сохраняется
+    'webp': ('rgba', ['-c:v', 'libwebp_anim', '-lossless', '0', '-quality', str(WEBP_QUALITY),
+                      '-loop', '{loop}', '-f', 'webp']),
+    # APNG: без потерь, кадры предсказываются по соседним пикселям
+    'apng': ('rgba', ['-c:v', 'apng', '-pred', 'mixed', '-plays', '{loop}', '-f', 'apng']),
+    # H.264 в MP4: размеры кадра должны быть чётными, moov в начале файла для просмотра во время загрузки.
+    # Повторы задаёт проигрыватель (атрибут loop у <video>)
+    'mp4': ('rgb24', ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-c:v', 'libx264', '-preset', 'medium',
+                      '-crf', str(MP4_CRF), '-pix_fmt', 'yuv420p', '-movflags', '+faststart', '-f', 'mp4']),
+}
+
+
+def ffmpeg_available():
+    """Проверяет, что исполняемый файл ffmpeg найден."""
+    return shutil.which(FFMPEG_BINARY) is not None
+
+
+class FfmpegEncoder:
+    """
+    Потоковый кодировщик анимации через ffmpeg (WebP, APNG, MP4).
+
+    Кадры передаются в стандартный ввод ffmpeg в несжатом виде по мере
+    поступления, поэтому в памяти находится только текущий кадр, а
+    декодирование и изменение размера — общие с GIF (pipeline.iter_frames).
+    Размер анимации задаёт первый кадр: кадры другого размера вписываются в
+    него с сохранением пропорций (поля прозрачные или чёрные).
+
+    Параметры:
+    - path: Путь к итоговому файлу.
+    - output_format: Ключ FORMAT_ARGS ('webp', 'apng', 'mp4').
+    - duration: Длительность кадра в миллисекундах.
+    - loop: Количество циклов (0 — бесконечно).
+    """
+
+    def __init__(self, path, output_format, duration, loop=0):
+        self.path = path
+        self.output_format = output_format
+        self.duration = duration
+        self.loop = loop
+        self.pixel_format, self._codec_args = FORMAT_ARGS[output_format]
+        self.mode = 'RGBA' if self.pixel_format == 'rgba' else 'RGB'
+        self.size = None
+        self.frames = 0
+        self._process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._process is not None:
+            self._process.kill()
+            self._process.wait()
+
+    def _start(self, size):
+        width, height = size
+        codec_args = [arg.format(loop=self.loop) for arg in self._codec_args]
+        command = [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-nostdin', '-y',
+                   '-f', 'rawvideo', '-pix_fmt', self.pixel_format, '-s', f'{width}x{height}',
+                   '-framerate', f'1000/{self.duration}', '-i', 'pipe:0', *codec_args, self.path]
+        logger.debug('Запуск ffmpeg: %s', ' '.join(command))
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.size = size
+
+    def add_frame(self, frame):
+        """Передаёт кадр (массив numpy) кодировщику."""
+        image = Image.fromarray(np.asarray(frame))
+        if image.mode != self.mode:
+            image = image.convert(self.mode)
+        if self.size is None:
+            self._start(image.size)
+        elif image.size != self.size:
+            image = ImageOps.pad(image, self.size, Image.LANCZOS)
+        try:
+            self._process.stdin.write(image.tobytes())
+        except BrokenPipeError:
+            # ffmpeg завершился с ошибкой: её текст выводит close()
+            self.close()
+        self.frames += 1
+
+    def close(self):
+        """Завершает кодирование и дожидается ffmpeg."""
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        error = process.stderr.read().decode('utf-8', 'replace').strip()
+        if process.wait() != 0:
+            raise RuntimeError(f'ffmpeg failed ({self.output_format}): {error or process.returncode}')
@@ -0,0 +1,132 @@
+# gif_generator/frame_cache.py
+
+import hashlib  # Для вычисления ключей кэша
+import logging  # Для логирования событий
+import os  # Для работы с файловой системой
+import uuid  # Для имён временных файлов
+import numpy as np  # Для хранения кадров в формате .npy
+from common.blobs import blob_path, link_from_store, share_file  # Общие кадры одинакового содержимого
+
+logger = logging.getLogger(__name__)
+
+# Каталог кэша подготовленных кадров внутри папки сессии. Он удаляется вместе
+# с папкой сессии, а записи одного изображения удаляет image_processing/remove_image
+# (формат имени: <имя исходного файла>.<тег>.npy). Для изображений с известным
+# SHA-256 записи — ссылки на общее хранилище (<sha256>.<тег>.npy, см.
+# common/blobs.py), поэтому одинаковые изображения декодируются один раз.
+FRAMES_DIR = '.frames'
+# Версия подготовки кадров (поворот по EXIF, приведение к RGB/RGBA, алгоритм
+# изменения размера): меняется, когда один и тот же исходный файл даёт другой кадр
+FRAME_PIPELINE_VERSION = 2
+
+
+def _tag(source_key, size):
+    key = f'{source_key}:{size}:exif_transpose:{FRAME_PIPELINE_VERSION}'
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def source_key(sha256, canonical=None):
+    """
+    Возвращает ключ источника кадра: SHA-256 исходного файла и, если кадр
+    готовится из канонического кадра image_processing, его размеры.
+    """
+    if sha256 and canonical:
+        return f'{sha256}:canonical:{canonical["width"]}x{canonical["height"]}'
+    return sha256
+
+
+def frame_cache_path(upload_folder, image_name, size, key=None):
+    """
+    Возвращает путь к записи кэша для подготовленного кадра.
+
+    Ключ строится из содержимого исходного файла (source_key, а если он
+    неизвестен — mtime и размер), целевого размера кадра и версии
+    подготовки, поэтому изменение файла или параметров автоматически
+    даёт новую запись.
+
+    Параметры:
+    - upload_folder: Папка загрузок сессии.
+    - image_name: Имя исходного файла.
+    - size: Кортеж (ширина, высота) или None.
+    - key: Ключ источника (source_key) или None.
+
+    Возвращает:
+    - Путь к файлу .npy или None, если исходный файл недоступен.
+    """
+    try:
+        stat = os.stat(os.path.join(upload_folder, image_name))
+    except OSError:
+        return None
+    tag = _tag(key or f'{stat.st_mtime_ns}:{stat.st_size}', size)
+    return os.path.join(upload_folder, FRAMES_DIR, f'{image_name}.{tag}.npy')
+
+
+def shared_frame_path(upload_folder, sha256, size, key=None):
+    """
+    Возвращает путь к записи общего хранилища для подготовленного кадра
+    или None, если SHA-256 изображения неизвестен.
+    """
+    if not sha256:
+        return None
+    return blob_path(upload_folder, sha256, f'.{_tag(key or sha256, size)}.npy')
+
+
+def load_cached_frame(path, shared_path=None):
+    """
+    Загружает кадр из кэша без копирования в память (memory-mapped).
+
+    Если в кэше сессии кадра нет, но он есть в общем хранилище (подготовлен
+    для такого же изображения), запись сессии становится ссылкой на него.
+
+    Возвращает:
+    - Кадр (массив numpy только для чтения) или None при промахе.
+    """
+    if path is None:
+        return None
+    if shared_path is not None and not os.path.exists(path):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            link_from_store(shared_path, path)
+        except OSError as e:
+            logger.error('Не удалось связать кадр %s с хранилищем: %s', path, e)
+    try:
+        return np.load(path, mmap_mode='r')
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # Повреждённая запись: удаляем её, кадр будет подготовлен заново
+        logger.error('Повреждённая запись кэша кадров %s: %s', path, e)
+        for broken_path in (path, shared_path):
+            try:
+                if broken_path is not None:
+                    os.remove(broken_path)
+            except OSError:
+                pass
+        return None
+
+
+def store_frame(path, frame, shared_path=None):
+    """
+    Сохраняет подготовленный кадр в кэш (и в общее хранилище, если указан
+    shared_path).
+
+    Запись выполняется через временный файл и os.replace, поэтому параллельные
+    читатели никогда не видят частично записанный кадр. Ошибки записи только
+    логируются: кэш не должен ломать генерацию.
+    """
+    if path is None:
+        return
+    temp_path = f'{path}.tmp-{uuid.uuid4().hex[:8]}'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, 'wb') as f:
+            np.save(f, frame)
+        os.replace(temp_path, path)
+        if shared_path is not None:
+            share_file(path, shared_path)
+    except OSError as e:
+        logger.error('Не удалось сохранить кадр в кэш %s: %s', path, e)
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
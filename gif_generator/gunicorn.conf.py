@@ -0,0 +1,37 @@
+# gif_generator/gunicorn.conf.py
+# Конфигурация gunicorn для gif_generator (запуск: gunicorn -c gunicorn.conf.py)
+
+import os  # Для чтения настроек из окружения
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5002')
+wsgi_app = 'main:app'
+
+# Генерация GIF нагружает процессор, но выполняется не в обработчиках запросов,
+# а в потоках очереди задач (GIF_JOB_WORKERS) и пуле процессов декодирования
+# кадров (GIF_FRAME_WORKERS). Очередь живёт в процессе и при запуске
+# восстанавливает прерванные задачи из SQLite, поэтому рабочий процесс один:
+# несколько процессов выполняли бы одни и те же задачи. HTTP-запросы
+# (постановка задачи, статус) короткие, им хватает нескольких потоков.
+workers = int(os.environ.get('GUNICORN_WORKERS', 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+# Время на завершение текущих запросов при остановке
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Модуль приложения загружается в мастер-процессе до fork: рабочий процесс
+# стартует без повторного импорта numpy, Pillow и imageio
+preload_app = True
+
+# Журнал запросов пишет само приложение (common/logging_setup.py): структурированные
+# записи с идентификатором запроса и длительностью, поэтому журнал доступа gunicorn отключён
+accesslog = None
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+
+def post_fork(server, worker):
+    """Запускает очередь задач в рабочем процессе: потоки не переживают fork."""
+    import main
+
+    main.job_queue.start()
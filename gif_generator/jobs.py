@@ -0,0 +1,240 @@
+# gif_generator/jobs.py
+
+import json  # Для сериализации параметров задачи
+import logging  # Для логирования событий
+import os  # Для работы с файловой системой
+import sqlite3  # Для хранения задач между перезапусками
+import threading  # Для синхронизации доступа к очереди
+import time  # Для отметок времени
+import uuid  # Для идентификаторов задач
+from contextlib import contextmanager  # Для управления соединениями с базой
+from concurrent.futures import ThreadPoolExecutor  # Пул исполнителей задач
+from common.logging_setup import current_request_id, request_context  # Идентификатор запроса в записях задачи
+from stage_metrics import JOBS, JOB_SECONDS  # Метрики задач
+
+logger = logging.getLogger(__name__)
+
+# Статусы задачи
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Как часто (в секундах) сохранять прогресс задачи в базу
+PROGRESS_INTERVAL = 0.5
+# Сколько хранить завершённые задачи (в секундах)
+FINISHED_JOB_TTL = 24 * 60 * 60
+
+
+class QueueFull(Exception):
+    """Очередь задач заполнена, новую задачу принять нельзя."""
+
+
+class JobStore:
+    """
+    Хранилище задач в SQLite.
+
+    Для каждой операции открывается отдельное соединение, поэтому хранилище
+    можно использовать из нескольких потоков.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                ' id TEXT PRIMARY KEY,'
+                ' session_id TEXT NOT NULL,'
+                ' status TEXT NOT NULL,'
+                ' params TEXT NOT NULL,'
+                ' frames_done INTEGER NOT NULL DEFAULT 0,'
+                ' frames_total INTEGER NOT NULL DEFAULT 0,'
+                ' result_url TEXT,'
+                ' error TEXT,'
+                ' created_at REAL NOT NULL,'
+                ' updated_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)')
+
+    @contextmanager
+    def _connect(self):
+        """Открывает соединение, фиксирует транзакцию и закрывает соединение."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self, session_id, params, frames_total):
+        """Создаёт задачу в статусе queued и возвращает её идентификатор."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, session_id, status, params, frames_total, created_at, updated_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, session_id, QUEUED, json.dumps(params), frames_total, now, now))
+        return job_id
+
+    def get(self, job_id):
+        """Возвращает задачу в виде словаря или None, если задача не найдена."""
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        return job
+
+    def claim(self, job_id):
+        """Переводит задачу из queued в running. Возвращает False, если её уже взяли."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?',
+                (RUNNING, time.time(), job_id, QUEUED))
+        return cursor.rowcount == 1
+
+    def update(self, job_id, **fields):
+        """Обновляет поля задачи."""
+        fields['updated_at'] = time.time()
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        with self._connect() as conn:
+            conn.execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+
+    def count_active(self):
+        """Возвращает количество задач в статусах queued и running."""
+        with self._connect() as conn:
+            row = conn.execute('SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)', (QUEUED, RUNNING)).fetchone()
+        return row[0]
+
+    def requeue_unfinished(self):
+        """
+        Возвращает в очередь задачи, прерванные перезапуском сервиса.
+
+        Возвращает:
+        - Список идентификаторов задач в статусе queued в порядке создания.
+        """
+        with self._connect() as conn:
+            conn.execute('UPDATE jobs SET status = ? WHERE status = ?', (QUEUED, RUNNING))
+            rows = conn.execute('SELECT id FROM jobs WHERE status = ? ORDER BY created_at', (QUEUED,)).fetchall()
+        return [row['id'] for row in rows]
+
+    def prune(self, older_than):
+        """Удаляет завершённые задачи, которые не обновлялись с момента older_than."""
+        with self._connect() as conn:
+            cursor = conn.execute('DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?',
+                                  (DONE, FAILED, older_than))
+        return cursor.rowcount
+
+
+class JobQueue:
+    """
+    Очередь задач генерации с ограниченным пулом исполнителей.
+
+    Параметры:
+    - store: Хранилище задач (JobStore).
+    - handler: Функция handler(job, progress), выполняющая задачу и возвращающая
+      URL результата. progress(done, total) сообщает о ходе выполнения.
+    - workers: Количество одновременно выполняемых задач.
+    - max_pending: Максимальное количество задач в очереди и в работе.
+    """
+
+    def __init__(self, store, handler, workers, max_pending):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Запускает пул исполнителей и возвращает в очередь незавершённые задачи.
+
+        Повторные вызовы ничего не делают.
+        """
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='gif-job')
+            pruned = self.store.prune(time.time() - FINISHED_JOB_TTL)
+            job_ids = self.store.requeue_unfinished()
+        logger.info('Очередь задач запущена: %s исполнителей, удалено старых задач: %s, восстановлено задач: %s',
+                    self.workers, pruned, len(job_ids))
+        for job_id in job_ids:
+            self._executor.submit(self._run, job_id)
+
+    @property
+    def running(self):
+        """Запущен ли пул исполнителей (для проверки готовности сервиса)."""
+        return self._executor is not None
+
+    def submit(self, session_id, params, frames_total):
+        """
+        Ставит задачу в очередь.
+
+        Возвращает:
+        - Идентификатор задачи.
+
+        Исключения:
+        - QueueFull, если в очереди и в работе уже max_pending задач.
+        """
+        self.start()
+        with self._lock:
+            if self.store.count_active() >= self.max_pending:
+                raise QueueFull()
+            job_id = self.store.create(session_id, params, frames_total)
+        # Записи задачи получают идентификатор запроса, который её поставил
+        self._executor.submit(self._run, job_id, current_request_id())
+        return job_id
+
+    def get(self, job_id):
+        """Возвращает задачу по идентификатору или None."""
+        return self.store.get(job_id)
+
+    def _run(self, job_id, request_id=None):
+        """
+        Выполняет задачу в потоке пула.
+
+        Записи задачи помечаются идентификатором запроса, поставившего её
+        в очередь; у задач, восстановленных после перезапуска, — job-<id>.
+        """
+        with request_context(request_id or f'job-{job_id}'):
+            self._execute(job_id)
+
+    def _execute(self, job_id):
+        if not self.store.claim(job_id):
+            return
+        job = self.store.get(job_id)
+        logger.info('Запуск задачи %s для сессии %s', job_id, job["session_id"], extra={'job_id': job_id})
+        started = time.perf_counter()
+        last_saved = 0.0
+        frames_done = 0
+
+        def progress(done, total):
+            nonlocal last_saved, frames_done
+            frames_done = done
+            now = time.monotonic()
+            if now - last_saved >= PROGRESS_INTERVAL:
+                self.store.update(job_id, frames_done=done, frames_total=total)
+                last_saved = now
+
+        try:
+            result_url = self.handler(job, progress)
+        except Exception as e:
+            logger.error('Ошибка при выполнении задачи %s: %s', job_id, e, extra={'job_id': job_id})
+            JOBS.labels(FAILED).inc()
+            JOB_SECONDS.labels(FAILED).observe(time.perf_counter() - started)
+            self.store.update(job_id, status=FAILED, error=str(e), frames_done=frames_done)
+            return
+        self.store.update(job_id, status=DONE, result_url=result_url, frames_done=frames_done)
+        elapsed = time.perf_counter() - started
+        JOBS.labels(DONE).inc()
+        JOB_SECONDS.labels(DONE).observe(elapsed)
+        duration_ms = round(elapsed * 1000, 2)
+        logger.info('Задача %s выполнена за %.0f мс: %s', job_id, duration_ms, result_url,
+                    extra={'job_id': job_id, 'duration_ms': duration_ms})
@@ -2,23 +2,69 @@
 from flask import Flask, request, jsonify  # Flask для создания веб-приложения
 import logging  # Для логирования событий
 import os  # Для работы с файловой системой
-import numpy as np  # Для работы с массивами изображений
 import imageio as imageio  # Для создания GIF
-from PIL import Image, ImageOps  # Для обработки изображений
 import json  # Для работы с JSON
 import subprocess  # Для вызова внешних команд (gifsicle)
+import time  # Для измерения времени построения палитры
+from itertools import chain  # Для возврата первого кадра в поток кадров
+from pipeline import iter_frames, parse_resize  # Потоковая загрузка кадров
+from jobs import JobQueue, JobStore, QueueFull  # Очередь задач генерации
+from cache import ResultCache, link_or_copy  # Кэш готовых GIF
+from encoder import GifEncoder, PALETTE_COLORS  # Кодирование GIF с оптимизацией в процессе
+from ffmpeg_encoder import FfmpegEncoder, ffmpeg_available  # Кодирование WebP, APNG и MP4 через ffmpeg
+from palette import PaletteBuilder  # Общая палитра по гистограмме всех кадров
+from common.manifest import read_manifest, image_names as manifest_image_names  # Порядок кадров сессии
+from common.health import register_health_routes, check_writable  # Проверки состояния сервиса
+from common.logging_setup import setup_logging, init_request_logging  # Общая настройка логирования
+from common.metrics import init_metrics  # /metrics и длительность запросов
+from stage_metrics import STAGE_SECONDS, OUTPUT_BYTES, RESULT_CACHE, QUEUE_DEPTH  # Метрики генерации
 
 # Настраиваем логирование
-logging.basicConfig(level=logging.INFO)  # Устанавливаем уровень логирования на INFO
+setup_logging('gif_generator')  # Уровень и формат задаются LOG_LEVEL и LOG_FORMAT
 logger = logging.getLogger(__name__)  # Создаем логгер для текущего модуля
 
 # Создаем Flask-приложение
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'  # Секретный ключ для подписи сессий
+init_request_logging(app, request)  # Идентификатор запроса и журнал запросов
+init_metrics(app, request)  # /metrics: длительность запросов и этапов генерации
 
 # Путь к корневой директории для загрузок
 uploads_root = os.path.join(app.root_path, 'uploads')
 
+# Настройки очереди задач генерации
+JOB_WORKERS = int(os.environ.get('GIF_JOB_WORKERS', 2))  # Одновременно выполняемые задачи
+JOB_QUEUE_SIZE = int(os.environ.get('GIF_JOB_QUEUE_SIZE', 32))  # Максимум задач в очереди и в работе
+JOBS_DB = os.environ.get('GIF_JOBS_DB', os.path.join(app.root_path, 'data', 'jobs.sqlite3'))
+
+# Кэш готовых GIF лежит на том же томе, что и загрузки, чтобы animation.gif
+# сессии мог быть жёсткой ссылкой на запись кэша
+RESULT_CACHE_DIR = os.environ.get('GIF_CACHE_DIR', os.path.join(uploads_root, '.cache', 'results'))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('GIF_CACHE_MAX_BYTES', 1024 ** 3))
+# Версия алгоритма генерации: меняется, когда один и тот же вход даёт другой результат
+RESULT_VERSION = 3
+
+# Способы оптимизации GIF:
+# - inprocess: общая палитра, обрезка и прозрачность неизменившихся пикселей при кодировании;
+# - gifsicle: кодирование imageio и последующая оптимизация внешней утилитой gifsicle;
+# - none: кодирование imageio без оптимизации.
+OPTIMIZER_INPROCESS = 'inprocess'
+OPTIMIZER_GIFSICLE = 'gifsicle'
+OPTIMIZER_NONE = 'none'
+OPTIMIZERS = (OPTIMIZER_INPROCESS, OPTIMIZER_GIFSICLE, OPTIMIZER_NONE)
+GIF_OPTIMIZER = os.environ.get('GIF_OPTIMIZER', OPTIMIZER_INPROCESS)  # Способ по умолчанию
+# Упорядоченный дизеринг при отображении кадров в общую палитру (только inprocess)
+GIF_DITHER = os.environ.get('GIF_DITHER', '0') == '1'
+
+# Форматы результата и расширения файлов. GIF кодируется в процессе (см. optimizer),
+# остальные форматы — через ffmpeg (ffmpeg_encoder.py)
+FORMAT_GIF = 'gif'
+OUTPUT_EXTENSIONS = {FORMAT_GIF: 'gif', 'webp': 'webp', 'apng': 'png', 'mp4': 'mp4'}
+# Имена результатов в папке сессии: новый результат заменяет результат любого формата
+OUTPUT_NAMES = tuple(f'animation.{extension}' for extension in OUTPUT_EXTENSIONS.values())
+
+result_cache = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES)
+
 
 def optimize_gif(input_path, output_path):
     """
@@ -27,125 +73,384 @@ def optimize_gif(input_path, output_path):
     Параметры:
     - input_path: Путь к исходному GIF-файлу.
     - output_path: Путь для сохранения оптимизированного GIF-файла.
+
+    Возвращает:
+    - True, если оптимизация выполнена, иначе False.
     """
     try:
         # Выполняем команду gifsicle для оптимизации GIF
-        subprocess.run(['gifsicle', '--optimize=3', '--colors', '256', input_path, '-o', output_path], check=True)
-        logger.info(f"GIF успешно оптимизирован: {output_path}")
-    except subprocess.CalledProcessError as e:
+        with STAGE_SECONDS.labels('optimize').time():
+            subprocess.run(['gifsicle', '--optimize=3', '--colors', '256', input_path, '-o', output_path],
+                           check=True)
+        logger.info('GIF успешно оптимизирован: %s', output_path)
+        return True
+    except (subprocess.CalledProcessError, OSError) as e:
         # Логируем ошибку, если оптимизация не удалась
-        logger.error(f"Ошибка при оптимизации GIF: {e}")
+        logger.error('Ошибка при оптимизации GIF: %s', e)
+        return False
 
 
-@app.route('/generate_gif', methods=['POST'])
-def generate_gif():
+def write_frames(add_frame, frames, progress, total):
     """
-    Генерирует GIF из загруженных изображений.
+    Передаёт кадры кодировщику по мере их загрузки и сообщает о прогрессе.
+
+    Параметры:
+    - add_frame: Функция, записывающая один кадр.
+    - frames: Итератор кадров.
+    - progress: Функция progress(done, total).
+    - total: Общее количество кадров.
 
     Возвращает:
-    - JSON с результатом операции (успех/ошибка) и URL сгенерированного GIF.
+    - Время в секундах, проведённое в add_frame. Остальное время прохода
+      (ожидание кадров от пула декодирования) записывается в метрику этапа
+      frame_wait.
     """
-    logger.info("@@@ Запуск генерации GIF")
+    done = 0
+    busy = 0.0
+    started = time.perf_counter()
+    for frame in frames:
+        frame_started = time.perf_counter()
+        add_frame(frame)
+        busy += time.perf_counter() - frame_started
+        done += 1
+        progress(done, total)
+    STAGE_SECONDS.labels('frame_wait').observe(time.perf_counter() - started - busy)
+    return busy
+
+
+def parse_flag(value, default):
+    """Преобразует значение поля формы ('1', 'true', 'on' и т. п.) в bool."""
+    if value is None or value == '':
+        return default
+    return value.lower() in ('1', 'true', 'on', 'yes')
+
+
+def build_palette(frames, progress, total):
+    """
+    Строит общую палитру по выборочной гистограмме всех кадров.
 
-    # Получаем session_id из заголовков запроса
-    session_id = request.headers.get('X-Session-ID')
-    logger.info(f'Session ID из заголовков запроса: {session_id}')
+    Параметры:
+    - frames: Итератор кадров.
+    - progress: Функция progress(done, total).
+    - total: Общее количество кадров.
 
-    # Проверяем, что session_id передан
-    if not session_id:
-        logger.error("Session ID не найден в запросе")
-        return jsonify(error='Session ID not found'), 400
+    Возвращает:
+    - Палитру (palette.Palette) или None, если нет ни одного кадра.
+    """
+    builder = PaletteBuilder()
+    busy = write_frames(builder.add, frames, progress, total)
+    if not builder.histogram.any():
+        return None
+    started = time.perf_counter()
+    palette = builder.build(PALETTE_COLORS)
+    elapsed = time.perf_counter() - started
+    STAGE_SECONDS.labels('palette').observe(busy + elapsed)
+    logger.info('Общая палитра построена: %s цветов, %.2f с', len(palette.colors), elapsed)
+    return palette
+
+
+def store_result(upload_folder, cached_file, output_name):
+    """
+    Делает output_name в папке сессии ссылкой на запись кэша и удаляет
+    результаты других форматов.
+    """
+    link_or_copy(cached_file, os.path.join(upload_folder, output_name))
+    remove_other_results(upload_folder, output_name)
 
-    logger.info(f'Используемый Session ID: {session_id}')
 
-    # Путь к папке загрузок для текущей сессии
-    upload_folder = os.path.join(uploads_root, session_id)
-    # Путь к итоговому GIF-файлу
-    gif_file = os.path.join(upload_folder, 'animation.gif')
+def remove_other_results(upload_folder, output_name):
+    """Удаляет из папки сессии результаты, кроме output_name."""
+    for name in OUTPUT_NAMES:
+        if name != output_name:
+            try:
+                os.remove(os.path.join(upload_folder, name))
+            except FileNotFoundError:
+                pass
 
-    # Получаем параметры для генерации GIF из формы запроса
-    duration = int(request.form.get('duration', 200))  # Длительность кадра в миллисекундах
-    logger.info(f'Длительность кадра: {duration} мс')
 
-    loop = int(request.form.get('loop', 0))  # Количество циклов (0 для бесконечного цикла)
-    logger.info(f'Количество циклов: {loop}')
+def canonical_size(entry):
+    """Возвращает размеры канонического кадра изображения ("ШxВ") или None, если его ещё нет."""
+    canonical = entry.get('canonical') if entry else None
+    return f'{canonical["width"]}x{canonical["height"]}' if canonical else None
 
-    resize = request.form.get('resize')  # Размер изображения (например, "320x240")
-    logger.info(f'Размер изображения: {resize}')
 
-    # Получаем порядок изображений из данных запроса
-    image_order_json = request.form.get('image_order')
-    if not image_order_json:
-        logger.error("Порядок изображений не найден в запросе")
-        return jsonify(error='No image order found in request'), 400
+def render_gif(job, progress):
+    """
+    Выполняет задачу генерации GIF.
 
-    # Преобразуем JSON с порядком изображений в словарь
-    image_order = json.loads(image_order_json)
-    logger.info(f'Полученный порядок изображений: {image_order}')
+    Параметры:
+    - job: Задача из очереди (session_id и параметры генерации).
+    - progress: Функция progress(done, total) для отчёта о ходе генерации.
 
-    # Список для хранения обработанных изображений
-    images = []
+    Возвращает:
+    - URL результата (web_ui отдаёт его из папки сессии текущего пользователя).
+    """
+    session_id = job['session_id']
+    params = job['params']
+    image_names = params['image_names']
+    # Задачи, поставленные до появления параметра format, создают GIF
+    output_format = params.get('format') or FORMAT_GIF
+    extension = OUTPUT_EXTENSIONS[output_format]
 
-    # Обрабатываем каждое изображение в соответствии с порядком
-    for idx in sorted(image_order.keys(), key=int):
-        image_name = image_order[idx]
+    # Путь к папке загрузок для текущей сессии
+    upload_folder = os.path.join(uploads_root, session_id)
+    # Путь к итоговому файлу
+    output_name = f'animation.{extension}'
+    result_file = os.path.join(upload_folder, output_name)
+
+    total = len(image_names)
+    # Записи манифеста: SHA-256 (кадры разделяются между одинаковыми изображениями)
+    # и канонические кадры, созданные image_processing при загрузке
+    entries = {entry['name']: entry for entry in read_manifest(upload_folder)['images']}
+
+    # Если результат с теми же кадрами и параметрами уже генерировался, отдаём его из кэша.
+    # Оптимизация и дизеринг относятся только к GIF
+    is_gif = output_format == FORMAT_GIF
+    optimizer = (params.get('optimizer') or GIF_OPTIMIZER) if is_gif else None
+    dither = params.get('dither', GIF_DITHER) if is_gif else None
+    with STAGE_SECONDS.labels('result_cache_lookup').time():
+        cache_key = result_cache.key(
+            [os.path.join(upload_folder, image_name) for image_name in image_names],
+            {'duration': params['duration'], 'loop': params['loop'], 'resize': params['resize'],
+             'optimizer': optimizer, 'dither': dither, 'format': output_format, 'version': RESULT_VERSION,
+             # Кадры из канонических и из исходных файлов могут отличаться размером
+             'sources': [canonical_size(entries.get(image_name)) for image_name in image_names]})
+        cached_file = result_cache.get(cache_key, extension)
+    RESULT_CACHE.labels('hit' if cached_file else 'miss').inc()
+    if cached_file:
+        logger.info('Результат найден в кэше: %s', cached_file)
+        store_result(upload_folder, cached_file, output_name)
+        progress(total, total)
+        return f'/uploads/{output_name}'
+
+    size = parse_resize(params['resize'])
+    if size:
+        logger.info('Изменение размера изображений на %sx%s', size[0], size[1])
+
+    # Создаем временный файл для результата (отдельный для каждой задачи)
+    temp_gif_file = os.path.join(upload_folder, f'temp_animation_{job["id"]}.{extension}')
+
+    cacheable = True
+    if not is_gif:
+        # WebP, APNG и MP4: кадры из того же конвейера передаются ffmpeg по мере загрузки
+        logger.info('Создание временного файла %s: %s', output_format, temp_gif_file)
+        frames = iter_frames(upload_folder, image_names, size, entries=entries)
         try:
-            # Полный путь к изображению
-            image_path = os.path.join(upload_folder, image_name)
-            logger.info(f'Обработка изображения: {image_path}')
-
-            # Открываем изображение с помощью Pillow
-            img = Image.open(image_path)
-            # Корректируем ориентацию изображения (если необходимо)
-            img = ImageOps.exif_transpose(img)
-
-            # Если указан размер, изменяем размер изображения
-            if resize:
-                width, height = map(int, resize.split('x'))
-                logger.info(f'Изменение размера изображения на {width}x{height}')
-                img = img.resize((width, height), Image.LANCZOS)
-
-            # Преобразуем изображение в массив numpy и добавляем в список
-            images.append(np.array(img))
-        except Exception as e:
-            # Логируем ошибку, если изображение не удалось обработать
-            logger.error(f"Ошибка при обработке изображения {image_name}: {e}")
-            continue
-
-    # Проверяем, что есть хотя бы одно изображение для генерации GIF
-    if not images:
-        logger.error("Нет допустимых изображений для генерации GIF")
-        return jsonify(error='No valid images uploaded'), 400
+            with FfmpegEncoder(temp_gif_file, output_format, params['duration'], params['loop']) as encoder:
+                encode_seconds = write_frames(encoder.add_frame, frames, progress, total)
+        except Exception:
+            if os.path.exists(temp_gif_file):
+                os.remove(temp_gif_file)
+            raise
+        if encoder.frames == 0:
+            logger.error("Нет допустимых изображений для генерации анимации")
+            raise ValueError('No valid images uploaded')
+        output_file = temp_gif_file
+        STAGE_SECONDS.labels('encode').observe(encode_seconds)
+    elif optimizer == OPTIMIZER_INPROCESS:
+        # Два прохода по кадрам: каждый даёт половину прогресса, поэтому frames_done
+        # растёт на кадр за два шага и не превышает frames_total (число кадров).
+        # Первый проход декодирует кадры (заполняя кэш подготовленных кадров)
+        # и собирает гистограмму цветов для общей палитры
+        palette = build_palette(iter_frames(upload_folder, image_names, size, entries=entries),
+                                lambda done, _: progress(done // 2, total), total)
+        if palette is None:
+            logger.error("Нет допустимых изображений для генерации GIF")
+            raise ValueError('No valid images uploaded')
+
+        # Второй проход читает кадры из кэша и кодирует их в общую палитру
+        logger.info('Создание временного GIF-файла: %s, оптимизация: %s, дизеринг: %s', temp_gif_file, optimizer,
+                    dither)
+        frames = iter_frames(upload_folder, image_names, size, entries=entries)
+        with open(temp_gif_file, 'wb') as fp, \
+                GifEncoder(fp, params['duration'], params['loop'],
+                           global_palette=palette, dither=dither) as encoder:
+            encode_seconds = write_frames(encoder.add_frame, frames,
+                                          lambda done, _: progress((total + done) // 2, total), total)
+        output_file = temp_gif_file
+        STAGE_SECONDS.labels('encode').observe(encode_seconds)
+    else:
+        # Кадры загружаются лениво: в памяти находится только текущий кадр
+        frames = iter_frames(upload_folder, image_names, size, entries=entries)
+        first_frame = next(frames, None)
+
+        # Проверяем, что есть хотя бы одно изображение для генерации GIF
+        if first_frame is None:
+            logger.error("Нет допустимых изображений для генерации GIF")
+            raise ValueError('No valid images uploaded')
+
+        frames = chain((first_frame,), frames)
+        del first_frame
+        logger.info('Создание временного GIF-файла: %s, оптимизация: %s', temp_gif_file, optimizer)
+
+        # Генерируем GIF с помощью imageio, записывая кадры по мере их загрузки
+        with imageio.get_writer(temp_gif_file, mode='I', duration=params['duration'] / 1000.0,
+                                loop=params['loop']) as writer:
+            encode_seconds = write_frames(writer.append_data, frames, progress, total)
+        output_file = temp_gif_file
+        STAGE_SECONDS.labels('encode').observe(encode_seconds)
+
+        if optimizer == OPTIMIZER_GIFSICLE:
+            # Оптимизируем GIF с помощью gifsicle
+            optimized_gif_file = os.path.join(upload_folder, f'temp_optimized_{job["id"]}.gif')
+            logger.info('Оптимизация GIF: %s -> %s', temp_gif_file, optimized_gif_file)
+            if optimize_gif(temp_gif_file, optimized_gif_file):
+                # Удаляем временный файл
+                os.remove(temp_gif_file)
+                logger.info('Временный файл %s удален', temp_gif_file)
+                output_file = optimized_gif_file
+            else:
+                # Без оптимизации GIF больше, но пользователь всё равно получает результат.
+                # В кэш такой результат не попадает, чтобы следующий запрос повторил оптимизацию
+                logger.warning('Используется неоптимизированный GIF: %s', temp_gif_file)
+                cacheable = False
+
+    OUTPUT_BYTES.labels(output_format).inc(os.path.getsize(output_file))
+    with STAGE_SECONDS.labels('result_store').time():
+        if cacheable:
+            # Сохраняем результат в кэш; animation.<расширение> сессии указывает на запись кэша
+            cached_file = result_cache.put(cache_key, output_file, extension)
+            store_result(upload_folder, cached_file, output_name)
+        else:
+            os.replace(output_file, result_file)
+            remove_other_results(upload_folder, output_name)
+
+    logger.info('Анимация успешно сгенерирована: %s', result_file)
+    return f'/uploads/{output_name}'
+
+
+# Очередь задач генерации: задачи хранятся в SQLite и переживают перезапуск сервиса
+job_queue = JobQueue(JobStore(JOBS_DB), render_gif, JOB_WORKERS, JOB_QUEUE_SIZE)
+QUEUE_DEPTH.set_function(job_queue.store.count_active)
+
+
+def check_job_queue():
+    """Проверяет, что очередь задач запущена и хранилище задач доступно."""
+    if not job_queue.running:
+        raise RuntimeError('job queue is not started')
+    job_queue.store.count_active()
+
+
+register_health_routes(app, {
+    'uploads': lambda: check_writable(uploads_root),
+    'jobs': check_job_queue,
+})
+
+
+@app.route('/generate_gif', methods=['POST'])
+def generate_gif():
+    """
+    Ставит в очередь задачу генерации GIF из загруженных изображений.
+
+    Возвращает:
+    - JSON с идентификатором задачи и URL для опроса её статуса (202),
+      ошибку 400 при неверных параметрах или 429, если очередь заполнена.
+    """
+    # Получаем session_id из заголовков запроса
+    session_id = request.headers.get('X-Session-ID')
 
+    # Проверяем, что session_id передан
+    if not session_id:
+        logger.error("Session ID не найден в запросе")
+        return jsonify(error='Session ID not found'), 400
+
+    # Получаем параметры для генерации GIF из формы запроса
     try:
-        # Создаем временный файл для GIF
-        temp_gif_file = os.path.join(upload_folder, 'temp_animation.gif')
-        logger.info(f'Создание временного GIF-файла: {temp_gif_file}')
+        duration = int(request.form.get('duration', 200))  # Длительность кадра в миллисекундах
+        if duration <= 0:
+            raise ValueError(f'duration must be positive, got {duration}')
+        loop = int(request.form.get('loop', 0))  # Количество циклов (0 для бесконечного цикла)
+        resize = request.form.get('resize') or None  # Размер изображения (например, "320x240")
+        parse_resize(resize)
+        optimizer = request.form.get('optimizer') or GIF_OPTIMIZER  # Способ оптимизации GIF
+        if optimizer not in OPTIMIZERS:
+            raise ValueError(f'unknown optimizer {optimizer}')
+        dither = parse_flag(request.form.get('dither'), GIF_DITHER)  # Дизеринг общей палитры
+        output_format = (request.form.get('format') or FORMAT_GIF).lower()  # Формат результата
+        if output_format not in OUTPUT_EXTENSIONS:
+            raise ValueError(f'unknown format {output_format}')
+        # Порядок кадров берём из манифеста сессии; явный image_order в запросе
+        # (прежний формат API, {"<позиция>": "<имя файла>"}) имеет приоритет
+        image_order_json = request.form.get('image_order')
+        image_names = None
+        if image_order_json:
+            image_order = json.loads(image_order_json)
+            if not isinstance(image_order, dict):
+                raise ValueError('image_order must be an object')
+            logger.debug('Полученный порядок изображений: %s', image_order)
+            image_names = [image_order[idx] for idx in sorted(image_order.keys(), key=int)]
+            if not all(isinstance(name, str) for name in image_names):
+                raise ValueError('image_order values must be file names')
+    except (TypeError, ValueError) as e:
+        logger.error('Неверные параметры генерации GIF: %s', e)
+        return jsonify(error='Invalid GIF parameters'), 400
+    logger.debug('Длительность кадра: %s мс, циклов: %s, размер: %s', duration, loop, resize)
+
+    if image_names is None:
+        image_names = manifest_image_names(read_manifest(os.path.join(uploads_root, session_id)))
+        logger.debug('Порядок изображений из манифеста: %s', image_names)
+    if not image_names:
+        logger.error("Нет изображений для генерации GIF")
+        return jsonify(error='No images uploaded'), 400
+
+    if output_format != FORMAT_GIF and not ffmpeg_available():
+        logger.error('Формат %s недоступен: ffmpeg не найден', output_format)
+        return jsonify(error=f'Output format {output_format} is not available'), 400
+
+    params = {'duration': duration, 'loop': loop, 'resize': resize, 'optimizer': optimizer,
+              'dither': dither, 'format': output_format, 'image_names': image_names}
 
-        # Генерируем GIF с помощью imageio
-        with imageio.get_writer(temp_gif_file, mode='I', duration=duration / 1000.0, loop=loop) as writer:
-            for img in images:
-                writer.append_data(img)
+    try:
+        job_id = job_queue.submit(session_id, params, len(image_names))
+    except QueueFull:
+        logger.error("Очередь задач генерации GIF заполнена")
+        response = jsonify(error='Too many GIF jobs in progress, try again later')
+        response.headers['Retry-After'] = '5'
+        return response, 429
 
-        # Оптимизируем GIF с помощью gifsicle
-        logger.info(f'Оптимизация GIF: {temp_gif_file} -> {gif_file}')
-        optimize_gif(temp_gif_file, gif_file)
+    logger.info('Задача генерации GIF поставлена в очередь: %s, сессия %s, кадров %s', job_id, session_id,
+                len(image_names), extra={'job_id': job_id})
+    return jsonify(success=True, job_id=job_id, status_url=f'/jobs/{job_id}'), 202
 
-        # Удаляем временный файл
-        os.remove(temp_gif_file)
-        logger.info(f'Временный файл {temp_gif_file} удален')
 
-    except Exception as e:
-        # Логируем ошибку, если генерация GIF не удалась
-        logger.error(f"Ошибка при генерации GIF: {e}")
-        return jsonify(error='Ошибка при генерации GIF'), 500
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    Возвращает статус задачи генерации GIF.
+
+    Входные параметры:
+    - job_id: Идентификатор задачи
+    - X-Session-ID: Идентификатор сессии (передается в заголовках)
 
-    # Возвращаем успешный результат и URL сгенерированного GIF
-    logger.info(f'GIF успешно сгенерирован: {gif_file}')
-    return jsonify(success=True, gif_url=f'/uploads/{session_id}/animation.gif')
+    Возвращает:
+    - JSON со статусом (queued/running/done/failed), прогрессом
+      (frames_done/frames_total) и URL результата или ошибкой.
+    """
+    session_id = request.headers.get('X-Session-ID')
+    job = job_queue.get(job_id)
+    # Задачи чужих сессий не раскрываем
+    if job is None or job['session_id'] != session_id:
+        logger.error('Задача %s не найдена для сессии %s', job_id, session_id)
+        return jsonify(error='Job not found'), 404
+    return jsonify(job_id=job['id'], status=job['status'],
+                   frames_done=job['frames_done'], frames_total=job['frames_total'],
+                   gif_url=job['result_url'], error=job['error'])
+
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """
+    Возвращает статистику кэша готовых GIF.
+
+    Возвращает:
+    - JSON со счётчиками попаданий и промахов, количеством и размером записей
+    """
+    return jsonify(result_cache.stats())
 
 
 if __name__ == '__main__':
-    # Запускаем Flask-приложение
+    # Сервер разработки. В контейнере сервис запускается через gunicorn (gunicorn.conf.py),
+    # там очередь задач запускается в рабочем процессе после fork
+    job_queue.start()
     logger.info("Запуск Flask-приложения на порту 5002")
-    app.run(debug=True, host='0.0.0.0', port=5002)
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=5002)
@@ -0,0 +1,211 @@
+# gif_generator/palette.py
+
+import logging  # Для логирования событий
+import time  # Для измерения пропускной способности
+import numpy as np  # Для векторного построения палитры и отображения кадров
+
+logger = logging.getLogger(__name__)
+
+# Гистограмма и таблица поиска строятся по 5 битам на канал (32x32x32 ячеек)
+BITS = 5
+SHIFT = 8 - BITS
+LEVELS = 1 << BITS
+# Сколько пикселей каждого кадра учитывать в гистограмме
+SAMPLE_PIXELS = 16384
+# Итерации k-means, уточняющие палитру после медианного сечения
+KMEANS_ITERATIONS = 3
+# Матрица Байера 4x4 для упорядоченного дизеринга, значения в диапазоне [-0.5, 0.5)
+BAYER_4X4 = (np.array([[0, 8, 2, 10],
+                       [12, 4, 14, 6],
+                       [3, 11, 1, 9],
+                       [15, 7, 13, 5]], dtype=np.float32) / 16.0) - 0.5
+# Амплитуда дизеринга в уровнях яркости: примерно шаг одной ячейки гистограммы
+DITHER_AMPLITUDE = 1 << SHIFT
+
+
+def _bin_index(rgb):
+    """Возвращает номер ячейки 32x32x32 для каждого пикселя массива (..., 3) uint8."""
+    index = (rgb[..., 0] >> SHIFT).astype(np.uint16)
+    index <<= BITS
+    index |= rgb[..., 1] >> SHIFT
+    index <<= BITS
+    index |= rgb[..., 2] >> SHIFT
+    return index
+
+
+def as_rgb(frame):
+    """Приводит кадр (оттенки серого, RGB или RGBA) к массиву (H, W, 3); альфа-канал отбрасывается."""
+    if frame.ndim == 2:
+        return np.repeat(frame[..., None], 3, axis=2)
+    if frame.shape[2] < 3:
+        return np.repeat(frame[..., :1], 3, axis=2)
+    return frame[..., :3]
+
+
+def _bin_centers():
+    """Возвращает цвета центров всех ячеек гистограммы (LEVELS ** 3, 3)."""
+    levels = (np.arange(LEVELS, dtype=np.float32) * (1 << SHIFT)) + (1 << SHIFT) / 2
+    r, g, b = np.meshgrid(levels, levels, levels, indexing='ij')
+    return np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+
+
+class PaletteBuilder:
+    """
+    Накапливает выборочную гистограмму цветов по всем кадрам
+    и строит по ней общую палитру.
+    """
+
+    def __init__(self, sample_pixels=SAMPLE_PIXELS):
+        self.sample_pixels = sample_pixels
+        self.histogram = np.zeros(LEVELS ** 3, dtype=np.int64)
+
+    def add(self, frame):
+        """
+        Добавляет в гистограмму равномерную выборку пикселей кадра.
+
+        Параметры:
+        - frame: Кадр в виде массива numpy uint8 (оттенки серого, RGB или RGBA).
+        """
+        pixels = as_rgb(frame).reshape(-1, 3)
+        step = max(1, pixels.shape[0] // self.sample_pixels)
+        self.histogram += np.bincount(_bin_index(pixels[::step]), minlength=LEVELS ** 3)
+
+    def build(self, colors):
+        """
+        Строит палитру: медианное сечение взвешенной гистограммы и уточнение k-means.
+
+        Параметры:
+        - colors: Максимальное количество цветов палитры.
+
+        Возвращает:
+        - Экземпляр Palette.
+        """
+        occupied = np.flatnonzero(self.histogram)
+        if occupied.size == 0:
+            return Palette(np.zeros((1, 3), dtype=np.uint8))
+        points = _bin_centers()[occupied]
+        weights = self.histogram[occupied].astype(np.float64)
+        centers = _median_cut(points, weights, colors)
+        centers = _kmeans(points, weights, centers, KMEANS_ITERATIONS)
+        return Palette(np.clip(np.rint(centers), 0, 255).astype(np.uint8))
+
+
+def _median_cut(points, weights, colors):
+    """
+    Медианное сечение: делит множество цветов на colors групп,
+    каждый раз разрезая группу с наибольшим взвешенным разбросом
+    по самой длинной оси в точке взвешенной медианы.
+
+    Возвращает:
+    - Центры групп (взвешенные средние) в виде массива (k, 3).
+    """
+    def split_score(box):
+        # Оценка группы для разреза: наибольший диапазон, умноженный на вес
+        if box.size < 2:
+            return 0.0, 0
+        extent = points[box].max(axis=0) - points[box].min(axis=0)
+        axis = int(extent.argmax())
+        return extent[axis] * weights[box].sum(), axis
+
+    boxes = [np.arange(points.shape[0])]
+    scores = [split_score(boxes[0])]
+    while len(boxes) < colors:
+        best = max(range(len(boxes)), key=lambda idx: scores[idx][0])
+        score, axis = scores[best]
+        if score <= 0:
+            break
+        box = boxes.pop(best)
+        scores.pop(best)
+        order = box[np.argsort(points[box, axis], kind='stable')]
+        cumulative = np.cumsum(weights[order])
+        split = int(np.searchsorted(cumulative, cumulative[-1] / 2))
+        split = min(max(split, 1), order.size - 1)
+        for part in (order[:split], order[split:]):
+            boxes.append(part)
+            scores.append(split_score(part))
+    return np.array([np.average(points[box], axis=0, weights=weights[box]) for box in boxes])
+
+
+def _kmeans(points, weights, centers, iterations):
+    """Уточняет центры палитры взвешенным алгоритмом Ллойда."""
+    for _ in range(iterations):
+        labels = _nearest(points, centers)
+        totals = np.bincount(labels, weights=weights, minlength=len(centers))
+        used = totals > 0
+        for channel in range(3):
+            sums = np.bincount(labels, weights=weights * points[:, channel], minlength=len(centers))
+            centers[used, channel] = sums[used] / totals[used]
+    return centers
+
+
+def _nearest(points, centers, chunk=4096):
+    """Возвращает индекс ближайшего центра для каждой точки (по частям, чтобы ограничить память)."""
+    centers = centers.astype(np.float32)
+    center_norms = (centers ** 2).sum(axis=1)
+    labels = np.empty(points.shape[0], dtype=np.int64)
+    for start in range(0, points.shape[0], chunk):
+        block = points[start:start + chunk].astype(np.float32)
+        # |p - c|^2 = |p|^2 - 2 p·c + |c|^2; |p|^2 не влияет на выбор ближайшего
+        distances = center_norms[None, :] - 2.0 * block @ centers.T
+        labels[start:start + chunk] = distances.argmin(axis=1)
+    return labels
+
+
+class Palette:
+    """
+    Палитра с предвычисленной таблицей поиска RGB -> индекс на 32x32x32 ячеек.
+
+    Отображение кадра в палитру — один векторный поиск по таблице,
+    без поиска ближайшего цвета для каждого пикселя.
+
+    Параметры:
+    - colors: Цвета палитры в виде массива (k, 3) uint8, k <= 256.
+    """
+
+    def __init__(self, colors):
+        self.colors = colors
+        self.lut = _nearest(_bin_centers(), colors.astype(np.float32)).astype(np.uint8)
+        self.pixels = 0
+        self.seconds = 0.0
+        self._dither_offsets = {}
+
+    def palette_bytes(self):
+        """Возвращает палитру в формате GIF, дополненную до 256 цветов."""
+        data = self.colors.tobytes()
+        return data + b'\x00' * (256 * 3 - len(data))
+
+    def map(self, frame, dither=False):
+        """
+        Отображает кадр в индексы палитры.
+
+        Параметры:
+        - frame: Кадр RGB в виде массива numpy (H, W, 3) uint8.
+        - dither: Применить упорядоченный дизеринг (матрица Байера 4x4).
+          Узор зависит только от положения пикселя, поэтому неподвижные
+          области соседних кадров остаются одинаковыми.
+
+        Возвращает:
+        - Массив индексов (H, W) uint8.
+        """
+        started = time.perf_counter()
+        if dither:
+            offset = self._dither_offset(frame.shape[:2])
+            frame = np.clip(frame.astype(np.int16) + offset, 0, 255).astype(np.uint8)
+        indices = np.take(self.lut, _bin_index(frame))
+        self.pixels += indices.size
+        self.seconds += time.perf_counter() - started
+        return indices
+
+    def _dither_offset(self, shape):
+        """Возвращает смещения дизеринга для кадра заданного размера (кэшируются по размеру)."""
+        offset = self._dither_offsets.get(shape)
+        if offset is None:
+            height, width = shape
+            pattern = np.tile(BAYER_4X4, ((height + 3) // 4, (width + 3) // 4))[:height, :width]
+            offset = np.rint(pattern * DITHER_AMPLITUDE).astype(np.int16)[..., None]
+            self._dither_offsets[shape] = offset
+        return offset
+
+    def throughput(self):
+        """Возвращает пропускную способность отображения в мегапикселях в секунду."""
+        return self.pixels / self.seconds / 1e6 if self.seconds else 0.0
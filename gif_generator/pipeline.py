@@ -0,0 +1,281 @@
+# gif_generator/pipeline.py
+
+import logging  # Для логирования событий
+import os  # Для работы с файловой системой
+import threading  # Для потокобезопасного создания пула
+import time  # Для измерения длительности этапов
+from collections import deque  # Очередь кадров, находящихся в обработке
+from concurrent.futures import Future, ProcessPoolExecutor  # Пул процессов для декодирования
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np  # Для работы с массивами изображений
+from PIL import Image, ImageOps, ExifTags  # Для обработки изображений
+from frame_cache import source_key, frame_cache_path, shared_frame_path, load_cached_frame, store_frame  # Кэш кадров
+from common.imaging import to_rgb  # Приведение кадров к 8-битному RGB/RGBA
+from common.logging_setup import log_sampled  # Выборочное логирование сообщений по кадрам
+from stage_metrics import STAGE_SECONDS, FRAMES, FRAME_CACHE, INPUT_BYTES  # Метрики этапов и кадров
+
+logger = logging.getLogger(__name__)
+
+# Количество процессов для параллельного декодирования кадров (1 — без пула)
+FRAME_WORKERS = int(os.environ.get('GIF_FRAME_WORKERS', os.cpu_count() or 1))
+
+# Во сколько раз промежуточное изображение должно быть больше итогового размера
+# перед финальной передискретизацией LANCZOS. Декодер JPEG уменьшает изображение
+# в 2, 4 или 8 раз прямо при декодировании (draft), остальные форматы уменьшаются
+# быстрым усреднением блоков (reduce). При запасе в 2 раза результат отличается
+# от полной передискретизации в среднем менее чем на 1 уровень яркости из 255
+# (см. benchmarks/bench_draft_decode.py).
+REDUCING_GAP = 2.0
+
+# Значения тега EXIF Orientation, при которых изображение поворачивается на 90°
+_ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def parse_resize(resize):
+    """
+    Разбирает строку размера вида "ШxВ".
+
+    Параметры:
+    - resize: Строка размера (например, "320x240") или None.
+
+    Возвращает:
+    - Кортеж (ширина, высота) или None, если размер не указан.
+    """
+    if not resize:
+        return None
+    width, height = map(int, resize.lower().split('x'))
+    return width, height
+
+
+def draft_for_size(img, size):
+    """
+    Включает декодирование JPEG в уменьшенном разрешении.
+
+    Размер запроса учитывает поворот по EXIF: ширина итогового кадра
+    может соответствовать высоте исходного изображения. Для форматов,
+    не поддерживающих draft, вызов ничего не делает.
+
+    Параметры:
+    - img: Открытое, но ещё не загруженное изображение.
+    - size: Кортеж (ширина, высота) итогового кадра.
+    """
+    width, height = size
+    if img.getexif().get(ExifTags.Base.Orientation) in _ROTATED_ORIENTATIONS:
+        width, height = height, width
+    img.draft(None, (int(width * REDUCING_GAP), int(height * REDUCING_GAP)))
+
+
+def load_frame(image_path, size=None, timings=None):
+    """
+    Загружает один кадр: открывает изображение, корректирует ориентацию
+    и при необходимости изменяет размер.
+
+    Если размер указан, JPEG декодируется сразу в уменьшенном разрешении,
+    а остальные форматы предварительно уменьшаются в целое число раз,
+    после чего выполняется финальная передискретизация LANCZOS.
+
+    Параметры:
+    - image_path: Путь к изображению.
+    - size: Кортеж (ширина, высота) или None.
+    - timings: Словарь, в который записывается длительность этапов decode
+      и resize в секундах (необязательно).
+
+    Возвращает:
+    - Кадр в виде массива numpy uint8 (H, W, 3) или, с прозрачностью, (H, W, 4).
+    """
+    started = time.perf_counter()
+    with Image.open(image_path) as img:
+        if size:
+            draft_for_size(img, size)
+        # Корректируем ориентацию изображения (если необходимо)
+        img = ImageOps.exif_transpose(img)
+        # Палитра и кодировщики работают с 8-битными RGB/RGBA (16-битные, 1-битные и палитровые файлы приводятся)
+        img = to_rgb(img)
+        decoded = time.perf_counter()
+        # Если указан размер, изменяем размер изображения
+        if size:
+            img = img.resize(size, Image.LANCZOS, reducing_gap=REDUCING_GAP)
+        frame = np.array(img)
+    if timings is not None:
+        timings['decode'] = decoded - started
+        timings['resize'] = time.perf_counter() - decoded
+    return frame
+
+
+def _load_frame_safe(image_path, size, cache_path=None, shared_path=None):
+    """
+    Загружает кадр в процессе пула и сохраняет его в кэш подготовленных кадров.
+
+    Исключения не пробрасываются через границу процесса, а возвращаются
+    текстом, чтобы ошибка одного изображения не прерывала всю генерацию.
+    Метрики в процессе пула не видны /metrics, поэтому длительность этапов
+    и размер исходного файла возвращаются вместе с кадром.
+
+    Возвращает:
+    - Кортеж (кадр, None, статистика) или (None, текст ошибки, None).
+      Статистика — словарь {этап: секунды} и размер файла в 'bytes'.
+    """
+    stats = {}
+    try:
+        stats['bytes'] = os.path.getsize(image_path)
+        frame = load_frame(image_path, size, stats)
+    except Exception as e:
+        return None, str(e), None
+    started = time.perf_counter()
+    store_frame(cache_path, frame, shared_path)
+    if cache_path is not None:
+        stats['frame_cache_write'] = time.perf_counter() - started
+    return frame, None, stats
+
+
+def get_pool(workers):
+    """
+    Возвращает общий пул процессов для декодирования кадров.
+
+    Пул создаётся при первом обращении и переиспользуется между запросами,
+    так как запуск процессов дороже декодирования одного кадра.
+
+    Параметры:
+    - workers: Количество процессов в пуле.
+
+    Возвращает:
+    - Экземпляр ProcessPoolExecutor.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            logger.info('Запуск пула декодирования кадров: %s процессов', workers)
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_workers = workers
+        return _pool
+
+
+def _reset_pool():
+    """Сбрасывает пул после аварийного завершения одного из процессов."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = None
+
+
+def iter_frames(upload_folder, image_names, size=None, workers=None, use_cache=True, entries=None):
+    """
+    Лениво загружает кадры в заданном порядке.
+
+    Кадры отдаются по одному, поэтому в памяти одновременно находится
+    только ограниченное число кадров, а не вся последовательность.
+    Если workers больше 1, кадры декодируются параллельно в пуле процессов;
+    в обработке одновременно находится не более 2 * workers кадров,
+    а порядок выдачи совпадает с порядком image_names.
+    Подготовленные кадры берутся из кэша (см. frame_cache), поэтому при
+    изменении только длительности, числа циклов или порядка кадров исходные
+    изображения повторно не декодируются. Для изображений с известным SHA-256
+    кадры берутся и из общего хранилища, поэтому изображение, уже
+    подготовленное в другой сессии (или под другим именем), тоже не декодируется.
+    Если image_processing уже создал канонический кадр изображения (поворот
+    применён, размер ограничен), декодируется он, а не исходный файл.
+    Изображения, которые не удалось обработать, пропускаются.
+
+    Параметры:
+    - upload_folder: Папка загрузок сессии.
+    - image_names: Имена файлов в порядке следования кадров.
+    - size: Кортеж (ширина, высота) или None.
+    - workers: Количество процессов (по умолчанию FRAME_WORKERS).
+    - use_cache: Использовать ли кэш подготовленных кадров.
+    - entries: Словарь {имя файла: запись манифеста сессии} (необязательно):
+      SHA-256 и канонический кадр изображения.
+
+    Возвращает:
+    - Генератор кадров (массивов numpy).
+    """
+    workers = FRAME_WORKERS if workers is None else workers
+    pool = get_pool(workers) if workers > 1 else None
+    pending = deque()
+    try:
+        # Держим в обработке ограниченное окно кадров и выдаём их по порядку
+        for image_name in image_names:
+            entry = entries.get(image_name) if entries else None
+            pending.append((image_name, _submit_frame(pool, upload_folder, image_name, size, use_cache, entry)))
+            if len(pending) < 2 * workers:
+                continue
+            frame = _take_frame(pending)
+            if frame is not None:
+                yield frame
+        while pending:
+            frame = _take_frame(pending)
+            if frame is not None:
+                yield frame
+    except BrokenProcessPool:
+        _reset_pool()
+        raise
+    finally:
+        # Если генерацию прервали, не декодируем оставшиеся кадры впустую
+        for _, future in pending:
+            future.cancel()
+
+
+def _submit_frame(pool, upload_folder, image_name, size, use_cache, entry=None):
+    """
+    Начинает подготовку одного кадра.
+
+    Попадание в кэш обрабатывается сразу, промах отправляется в пул процессов
+    (или выполняется на месте, если пула нет).
+
+    Возвращает:
+    - Future с результатом (кадр, ошибка).
+    """
+    sha256 = entry.get('sha256') if entry else None
+    canonical = entry.get('canonical') if entry else None
+    if canonical and not os.path.exists(os.path.join(upload_folder, canonical['path'])):
+        canonical = None
+    image_path = os.path.join(upload_folder, canonical['path'] if canonical else image_name)
+    key = source_key(sha256, canonical)
+    cache_path = frame_cache_path(upload_folder, image_name, size, key) if use_cache else None
+    shared_path = shared_frame_path(upload_folder, sha256, size, key) if cache_path is not None else None
+    started = time.perf_counter()
+    frame = load_cached_frame(cache_path, shared_path)
+    if frame is not None:
+        STAGE_SECONDS.labels('frame_cache_read').observe(time.perf_counter() - started)
+        FRAME_CACHE.labels('hit').inc()
+        log_sampled(logger, logging.DEBUG, 'Кадр из кэша: %s', image_path)
+        future = Future()
+        future.set_result((frame, None, None))
+        return future
+    if cache_path is not None:
+        FRAME_CACHE.labels('miss').inc()
+    log_sampled(logger, logging.DEBUG, 'Обработка изображения: %s', image_path)
+    if pool is not None:
+        return pool.submit(_load_frame_safe, image_path, size, cache_path, shared_path)
+    future = Future()
+    future.set_result(_load_frame_safe(image_path, size, cache_path, shared_path))
+    return future
+
+
+def _take_frame(pending):
+    """
+    Дожидается самого старого кадра в окне обработки.
+
+    Возвращает:
+    - Кадр или None, если изображение не удалось обработать.
+    """
+    image_name, future = pending.popleft()
+    frame, error, stats = future.result()
+    if error is not None:
+        # Логируем ошибку, если изображение не удалось обработать
+        logger.error('Ошибка при обработке изображения %s: %s', image_name, error)
+        FRAMES.labels('error').inc()
+    elif stats is None:
+        FRAMES.labels('cache').inc()
+    else:
+        FRAMES.labels('decode').inc()
+        INPUT_BYTES.inc(stats.pop('bytes'))
+        for stage, seconds in stats.items():
+            STAGE_SECONDS.labels(stage).observe(seconds)
+    return frame
@@ -0,0 +1,37 @@
+# gif_generator/stage_metrics.py
+"""
+Метрики генерации GIF (отдаются на /metrics вместе с метриками запросов).
+
+gif_stage_seconds{stage} — сколько времени задача провела на каждом этапе:
+- result_cache_lookup: хэширование исходных файлов и поиск готового GIF;
+- frame_cache_read: чтение подготовленного кадра из кэша кадров;
+- decode, resize, frame_cache_write: декодирование изображения, изменение
+  размера и запись в кэш кадров (в процессе пула, время передаётся вместе
+  с кадром);
+- frame_wait: ожидание следующего кадра от пула декодирования (простой
+  кодировщика);
+- palette: сбор гистограммы цветов и построение общей палитры;
+- encode: кодирование кадров и запись GIF;
+- optimize: оптимизация gifsicle;
+- result_store: перенос результата в кэш и ссылка в папке сессии.
+
+Этапы декодирования наблюдаются по кадру, остальные — по задаче.
+"""
+
+from common.metrics import counter, gauge, histogram
+
+# Этапы по кадру короче этапов по задаче: интервалы начинаются с миллисекунды
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_SECONDS = histogram('gif_stage_seconds', 'Длительность этапов генерации GIF', ['stage'], STAGE_BUCKETS)
+FRAMES = counter('gif_frames_total', 'Подготовленные кадры по источнику (decode, cache) и ошибки (error)',
+                 ['source'])
+INPUT_BYTES = counter('gif_input_bytes_total', 'Объём декодированных исходных изображений, байт')
+OUTPUT_BYTES = counter('gif_output_bytes_total', 'Объём сгенерированных результатов по формату, байт', ['format'])
+RESULT_CACHE = counter('gif_result_cache_requests_total', 'Обращения к кэшу готовых GIF (hit, miss)',
+                       ['result'])
+FRAME_CACHE = counter('gif_frame_cache_requests_total', 'Обращения к кэшу подготовленных кадров (hit, miss)',
+                      ['result'])
+JOBS = counter('gif_jobs_total', 'Завершённые задачи генерации по статусу (done, failed)', ['status'])
+JOB_SECONDS = histogram('gif_job_seconds', 'Длительность выполнения задач генерации', ['status'])
+QUEUE_DEPTH = gauge('gif_jobs_active', 'Задачи в очереди и в работе')
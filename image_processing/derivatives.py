@@ -0,0 +1,232 @@
+# image_processing/derivatives.py
+
+import logging  # Для логирования событий
+import os  # Для работы с файловой системой
+import threading  # Для ленивого создания пула
+import uuid  # Для имён временных файлов
+from concurrent.futures import ThreadPoolExecutor  # Для фоновой генерации производных
+from PIL import Image, ImageOps, ExifTags  # Для уменьшения и нормализации изображений
+from common.manifest import read_manifest, update_manifest, find_image  # Для записи путей производных в манифест
+from common.imaging import to_rgb  # Приведение к 8-битному RGB/RGBA
+from common.blobs import blob_path, link_from_store, share_file  # Общие производные одинакового содержимого
+
+logger = logging.getLogger(__name__)
+
+# Каталоги производных изображений внутри папки сессии (удаляются вместе с ней).
+# Имя производного файла: <имя исходного файла>.webp. Файлы — ссылки на записи
+# общего хранилища <sha256><суффикс>, поэтому производные одинакового
+# содержимого создаются один раз
+THUMBNAILS_DIR = '.thumbs'
+PREVIEWS_DIR = '.previews'
+SHARED_SUFFIXES = {THUMBNAILS_DIR: '.thumb.webp', PREVIEWS_DIR: '.preview.webp'}
+# Ограничивающие размеры: миниатюра для плитки галереи (с запасом для экранов
+# высокой плотности), превью — для просмотра кадра в полный экран
+THUMBNAIL_SIZE = (320, 320)
+PREVIEW_SIZE = (1280, 1280)
+DERIVATIVE_FORMAT = 'WEBP'
+DERIVATIVE_EXTENSION = 'webp'
+DERIVATIVE_QUALITY = 80
+# Канонические кадры для генерации GIF: <имя исходного файла> в CANONICAL_DIR
+# (запись хранилища <sha256>.canonical). Наибольшая сторона кадра ограничена
+# CANONICAL_MAX_SIZE пикселей
+CANONICAL_DIR = '.canonical'
+CANONICAL_SUFFIX = '.canonical'
+CANONICAL_MAX_SIZE = int(os.environ.get('CANONICAL_MAX_SIZE', 2048))
+CANONICAL_JPEG_QUALITY = 95
+CANONICAL_PNG_COMPRESS_LEVEL = 1
+# Форматы и режимы, в которых исходный файл можно использовать как канонический кадр
+CANONICAL_FORMATS = {'JPEG': ('RGB',), 'PNG': ('RGB', 'RGBA')}
+# Количество потоков фоновой генерации
+DERIVATIVE_WORKERS = int(os.environ.get('DERIVATIVE_WORKERS', 2))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def derivative_path(upload_folder, kind_dir, image_name):
+    """
+    Возвращает путь к производному изображению.
+
+    Параметры:
+    - upload_folder: Папка загрузок сессии.
+    - kind_dir: THUMBNAILS_DIR или PREVIEWS_DIR.
+    - image_name: Имя исходного файла.
+    """
+    return os.path.join(upload_folder, kind_dir, f'{image_name}.{DERIVATIVE_EXTENSION}')
+
+
+def canonical_path(upload_folder, image_name):
+    """
+    Возвращает путь к каноническому кадру изображения (формат файла
+    определяется по содержимому, поэтому расширения у имени нет).
+    """
+    return os.path.join(upload_folder, CANONICAL_DIR, image_name)
+
+
+def _save(image, path, image_format=DERIVATIVE_FORMAT, **options):
+    """Сохраняет изображение через временный файл: читатели не видят частичную запись."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.tmp-{uuid.uuid4().hex[:8]}'
+    try:
+        image.save(temp_path, image_format, **(options or {'quality': DERIVATIVE_QUALITY}))
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _is_canonical(img):
+    """
+    Проверяет, может ли исходный файл сам служить каноническим кадром:
+    быстро декодируемый формат, RGB/RGBA, без поворота по EXIF и не больше
+    CANONICAL_MAX_SIZE. Читается только заголовок файла.
+    """
+    return (img.mode in CANONICAL_FORMATS.get(img.format, ())
+            and max(img.size) <= CANONICAL_MAX_SIZE
+            and img.getexif().get(ExifTags.Base.Orientation, 1) == 1)
+
+
+def _normalize(img, max_size):
+    """
+    Декодирует изображение в каноническом виде: с учётом ориентации из
+    EXIF, в режиме RGB или RGBA и не больше max_size по каждой стороне
+    (JPEG декодируется сразу в уменьшенном разрешении).
+    """
+    img.draft('RGB', (max_size, max_size))
+    image = ImageOps.exif_transpose(img)
+    image = to_rgb(image)
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+    return image
+
+
+def _save_canonical(image, path):
+    """Сохраняет канонический кадр: RGB — в JPEG, RGBA — в PNG с быстрым сжатием."""
+    if image.mode == 'RGBA':
+        _save(image, path, 'PNG', compress_level=CANONICAL_PNG_COMPRESS_LEVEL)
+    else:
+        _save(image, path, 'JPEG', quality=CANONICAL_JPEG_QUALITY, subsampling=0)
+
+
+def _shared_paths(upload_folder, image_name, with_canonical):
+    """Возвращает словарь {файл сессии: суффикс записи хранилища} производных изображения."""
+    paths = {derivative_path(upload_folder, kind_dir, image_name): suffix
+             for kind_dir, suffix in SHARED_SUFFIXES.items()}
+    if with_canonical:
+        paths[canonical_path(upload_folder, image_name)] = CANONICAL_SUFFIX
+    return paths
+
+
+def _link_shared(upload_folder, image_name, sha256, with_canonical):
+    """
+    Связывает производные изображения с уже созданными для того же содержимого.
+
+    Возвращает:
+    - True, если в хранилище нашлись все производные (превью, миниатюра
+      и, если with_canonical, канонический кадр).
+    """
+    for path, suffix in _shared_paths(upload_folder, image_name, with_canonical).items():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not link_from_store(blob_path(upload_folder, sha256, suffix), path):
+            return False
+    return True
+
+
+def make_derivatives(upload_folder, image_name):
+    """
+    Создаёт канонический кадр, превью и миниатюру изображения.
+
+    Канонический кадр — исходное изображение, приведённое к виду, который
+    gif_generator декодирует быстро и одинаково для любых камер: поворот по
+    EXIF применён, режим RGB или RGBA, размер не больше CANONICAL_MAX_SIZE.
+    Если исходный файл уже такой (см. _is_canonical), кадром служит он сам.
+    Путь, размеры и режим кадра записываются в манифест (поле canonical).
+
+    Если производные того же содержимого (по SHA-256 из манифеста) уже
+    есть в общем хранилище, файлы сессии становятся ссылками на них и
+    изображение не декодируется. Иначе исходный файл декодируется один раз,
+    превью и миниатюра получаются из канонического кадра, и все производные
+    добавляются в хранилище.
+
+    Параметры:
+    - upload_folder: Папка загрузок сессии.
+    - image_name: Имя исходного файла.
+    """
+    source_path = os.path.join(upload_folder, image_name)
+    try:
+        entry = find_image(read_manifest(upload_folder), image_name)
+        sha256 = entry.get('sha256') if entry else None
+        with Image.open(source_path) as img:
+            own_canonical = _is_canonical(img)
+            if sha256 and _link_shared(upload_folder, image_name, sha256, not own_canonical):
+                logger.debug('Производные %s взяты из хранилища', source_path)
+            else:
+                # Для превью достаточно декодирования в разрешении превью
+                image = _normalize(img, max(PREVIEW_SIZE) if own_canonical else CANONICAL_MAX_SIZE)
+                if not own_canonical:
+                    _save_canonical(image, canonical_path(upload_folder, image_name))
+                image.thumbnail(PREVIEW_SIZE, Image.LANCZOS)
+                _save(image, derivative_path(upload_folder, PREVIEWS_DIR, image_name))
+                image.thumbnail(THUMBNAIL_SIZE, Image.LANCZOS)
+                _save(image, derivative_path(upload_folder, THUMBNAILS_DIR, image_name))
+                if sha256:
+                    for path, suffix in _shared_paths(upload_folder, image_name, not own_canonical).items():
+                        share_file(path, blob_path(upload_folder, sha256, suffix))
+        canonical_file = image_name if own_canonical else canonical_path(upload_folder, image_name)
+        with Image.open(os.path.join(upload_folder, canonical_file)) as canonical_img:
+            canonical = {'path': os.path.relpath(os.path.join(upload_folder, canonical_file), upload_folder),
+                         'width': canonical_img.width, 'height': canonical_img.height, 'mode': canonical_img.mode}
+
+        def record(manifest):
+            entry = find_image(manifest, image_name)
+            if entry is None:
+                return False
+            entry['thumbnail'] = os.path.relpath(derivative_path(upload_folder, THUMBNAILS_DIR, image_name),
+                                                 upload_folder)
+            entry['preview'] = os.path.relpath(derivative_path(upload_folder, PREVIEWS_DIR, image_name),
+                                               upload_folder)
+            entry['canonical'] = canonical
+
+        manifest = update_manifest(upload_folder, record, bump_version=False)
+        if find_image(manifest, image_name) is None:
+            # Изображение удалили, пока создавались производные
+            remove_derivatives(upload_folder, image_name)
+            return
+        logger.debug('Созданы канонический кадр, миниатюра и превью для %s', source_path)
+    except FileNotFoundError:
+        # Файл удалён до того, как до него дошла очередь
+        logger.debug('Исходный файл %s удалён, производные не созданы', source_path)
+    except Exception as e:
+        # Без производных галерея показывает оригинал, а генерация декодирует его сама, поэтому ошибка не критична
+        logger.error('Ошибка при создании производных %s: %s', source_path, e)
+
+
+def schedule_derivatives(upload_folder, image_names):
+    """
+    Ставит создание производных изображений в очередь фонового пула.
+
+    Параметры:
+    - upload_folder: Папка загрузок сессии.
+    - image_names: Имена исходных файлов.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(DERIVATIVE_WORKERS, thread_name_prefix='derivatives')
+    for image_name in image_names:
+        _executor.submit(make_derivatives, upload_folder, image_name)
+
+
+def remove_derivatives(upload_folder, image_name):
+    """
+    Удаляет миниатюру, превью и канонический кадр изображения.
+
+    Параметры:
+    - upload_folder: Папка загрузок сессии.
+    - image_name: Имя исходного файла.
+    """
+    paths = [derivative_path(upload_folder, kind_dir, image_name) for kind_dir in (THUMBNAILS_DIR, PREVIEWS_DIR)]
+    for path in paths + [canonical_path(upload_folder, image_name)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
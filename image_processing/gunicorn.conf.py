@@ -0,0 +1,30 @@
+# image_processing/gunicorn.conf.py
+# Конфигурация gunicorn для image_processing (запуск: gunicorn -c gunicorn.conf.py)
+
+import os  # Для чтения настроек из окружения
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5001')
+wsgi_app = 'main:app'
+
+# Приём загрузок в основном ждёт сеть и диск, но SHA-256 и чтение размеров
+# изображений занимают процессор, поэтому процессов — по числу ядер, а потоки
+# покрывают ожидание ввода-вывода. Манифест сессии защищён flock, поэтому
+# процессы могут изменять его одновременно.
+workers = int(os.environ.get('GUNICORN_WORKERS', os.cpu_count() or 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Большая загрузка по медленной сети может длиться долго
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 300))
+# Время на завершение текущих запросов при остановке
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Модуль приложения загружается в мастер-процессе до fork: рабочий процесс
+# стартует без повторного импорта. Пул создания миниатюр создаётся лениво,
+# уже в рабочем процессе
+preload_app = True
+
+# Журнал запросов пишет само приложение (common/logging_setup.py): структурированные
+# записи с идентификатором запроса и длительностью, поэтому журнал доступа gunicorn отключён
+accesslog = None
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
@@ -8,15 +8,44 @@ import uuid
 from werkzeug.utils import secure_filename
 import logging
 import json
+import glob
+from streaming_upload import StreamingUpload, UploadError, multipart_boundary
+from derivatives import schedule_derivatives, remove_derivatives
+from PIL import Image  # Для чтения размеров изображения из заголовка файла
+from common.blobs import blob_path, share_file  # Общее хранилище одинакового содержимого
+from common.manifest import make_entry, read_manifest, update_manifest, image_names, ManifestConflict
+from common.health import register_health_routes, check_writable  # Проверки состояния сервиса
+from common.logging_setup import setup_logging, init_request_logging  # Общая настройка логирования
+from common.metrics import init_metrics, counter, histogram  # /metrics и метрики загрузок
 
 # Настройка логирования
-logging.basicConfig(level=logging.DEBUG)  # Устанавливаем уровень логирования в DEBUG для более подробного логирования
+setup_logging('image_processing')  # Уровень и формат задаются LOG_LEVEL и LOG_FORMAT
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'  # Секретный ключ для подписи сессии
+init_request_logging(app, request)  # Идентификатор запроса и журнал запросов
+init_metrics(app, request)  # /metrics: длительность запросов и скорость загрузок
 uploads_root = os.path.join(app.root_path, 'uploads')  # Путь к директории загрузок
 
+# /healthz и /readyz: сервис готов, если том загрузок доступен для записи
+register_health_routes(app, {'uploads': lambda: check_writable(uploads_root)})
+
+# Лимиты загрузки (проверяются при потоковом приёме); лимит запроса совпадает с client_max_body_size в nginx
+UPLOAD_MAX_FILE_SIZE = int(os.environ.get('UPLOAD_MAX_FILE_SIZE', 50 * 1024 * 1024))
+UPLOAD_MAX_REQUEST_SIZE = int(os.environ.get('UPLOAD_MAX_REQUEST_SIZE', 400 * 1024 * 1024))
+# Квота одной сессии (совпадает с SESSION_QUOTA_BYTES очистки в web_ui/janitor.py)
+SESSION_QUOTA_BYTES = int(os.environ.get('SESSION_QUOTA_BYTES', 2 * 1024 ** 3))
+
+UPLOAD_BYTES = counter('image_processing_upload_bytes_total', 'Объём принятых загрузок, байт')
+UPLOAD_FILES = counter('image_processing_upload_files_total', 'Количество принятых файлов')
+UPLOAD_SECONDS_PER_MIB = histogram('image_processing_upload_seconds_per_mib', 'Время приёма загрузки на МиБ',
+                                   buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+UPLOAD_DUPLICATES = counter('image_processing_upload_duplicate_files_total',
+                            'Загруженные файлы, содержимое которых уже было в хранилище')
+UPLOAD_DEDUPLICATED_BYTES = counter('image_processing_upload_deduplicated_bytes_total',
+                                    'Объём загрузок, не занявший места благодаря хранилищу, байт')
+
 
 def allowed_file(filename):
     """
@@ -28,10 +57,42 @@ def allowed_file(filename):
     Возвращает:
     - True, если файл допустимого типа, иначе False
     """
-    logger.debug(f"Проверка допустимости файла: {filename}")
+    logger.debug('Проверка допустимости файла: %s', filename)
     return filename.lower().endswith(('png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff'))
 
 
+def image_size(path):
+    """
+    Возвращает размеры изображения, читая только заголовок файла.
+
+    Возвращает:
+    - Кортеж (ширина, высота) или (None, None), если файл не распознан
+    """
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except Exception as e:
+        logger.warning('Не удалось определить размеры изображения %s: %s', path, e)
+        return None, None
+
+
+def remove_cached_frames(upload_folder, image_name):
+    """
+    Удаляет подготовленные кадры изображения из кэша gif_generator.
+
+    Входные параметры:
+    - upload_folder: Папка загрузок сессии
+    - image_name: Имя исходного файла
+    """
+    pattern = os.path.join(upload_folder, '.frames', f'{glob.escape(image_name)}.*.npy')
+    for cached_frame in glob.glob(pattern):
+        try:
+            os.remove(cached_frame)
+            logger.debug('Удалён подготовленный кадр %s', cached_frame)
+        except OSError as e:
+            logger.warning('Не удалось удалить подготовленный кадр %s: %s', cached_frame, e)
+
+
 # Загрузка изображений
 @app.route('/upload', methods=['POST'])
 def upload():
@@ -48,94 +109,168 @@ def upload():
     if not session_id:
         logger.error("Session ID не найден в заголовках")
         return jsonify(error='Session ID not in headers. not found'), 400
-    logger.info(f'Полученный Session ID: {session_id}')
+    logger.debug('Полученный Session ID: %s', session_id)
     upload_folder = os.path.join(uploads_root, session_id)
-    logger.info(f'Каталог загрузки: {upload_folder}')
+    logger.debug('Каталог загрузки: %s', upload_folder)
     if not os.path.exists(upload_folder):
-        logger.info(f'Каталог загрузки не найден. Создаю каталог: {upload_folder}')
+        logger.info('Каталог загрузки не найден. Создаю каталог: %s', upload_folder)
         try:
             os.makedirs(upload_folder)
-            logger.debug(f'Каталог успешно создан: {upload_folder}')
+            logger.debug('Каталог успешно создан: %s', upload_folder)
         except Exception as e:
-            logger.error(f'Ошибка при создании каталога: {e}')
+            logger.error('Ошибка при создании каталога: %s', e)
             return jsonify(error=f'Failed to create upload directory: {str(e)}'), 500
-    files = request.files.getlist('files')
-    if not files:
+    # Тело запроса разбирается потоково: файлы пишутся сразу в каталог сессии,
+    # без промежуточных временных файлов Werkzeug и повторного копирования
+    boundary = multipart_boundary(request.content_type)
+    if boundary is None:
+        logger.error("Запрос не является multipart/form-data")
+        return jsonify(error='Expected multipart/form-data'), 400
+    if request.content_length and request.content_length > UPLOAD_MAX_REQUEST_SIZE:
+        logger.error('Размер запроса %s превышает лимит %s', request.content_length, UPLOAD_MAX_REQUEST_SIZE)
+        return jsonify(error='Request too large'), 413
+    # Объём изображений сессии берётся из манифеста, без обхода папки
+    used = sum(entry.get('size') or 0 for entry in read_manifest(upload_folder)['images'])
+    if used + (request.content_length or 0) > SESSION_QUOTA_BYTES:
+        logger.error('Квота сессии %s превышена: занято %s байт, запрос %s байт, квота %s', session_id, used,
+                     request.content_length, SESSION_QUOTA_BYTES)
+        return jsonify(error='Session quota exceeded'), 413
+
+    def target_path(name):
+        logger.debug('Файл: %s', name)
+        if not allowed_file(name):
+            return None
+        unix_time = int(time.time())
+        original_filename = secure_filename(name)
+        unique_id = str(uuid.uuid4())[:8]
+        filename = f"IMG_{unix_time}_{unique_id}_{original_filename}"
+        logger.debug('Новое имя файла %s для %s', filename, original_filename)
+        return os.path.join(upload_folder, filename)
+
+    started = time.perf_counter()
+    upload = StreamingUpload(target_path, UPLOAD_MAX_FILE_SIZE, UPLOAD_MAX_REQUEST_SIZE)
+    try:
+        saved = upload.receive(request.stream, boundary)
+    except UploadError as e:
+        logger.error('Ошибка при загрузке файлов: %s', e)
+        return jsonify(error=str(e)), e.status
+    except Exception as e:
+        logger.error('Ошибка при сохранении файла: %s', e)
+        return jsonify(error=f'Failed to save file: {str(e)}'), 500
+    if not upload.files_seen:
         logger.error("Нет выбранных файлов")
         return jsonify(error='!!! No selected files'), 400
-    new_filenames = []
-    for file in files:
-        logger.debug(f'Файл: {file.filename}')
-        if file and allowed_file(file.filename):
-            unix_time = int(time.time())
-            original_filename = secure_filename(file.filename)
-            unique_id = str(uuid.uuid4())[:8]
-            filename = f"IMG_{unix_time}_{unique_id}_{original_filename}"
-            logger.info(f"Старое имя файла: {original_filename}")
-            logger.info(f"Новое имя файла: {filename}")
-            file_path = os.path.join(upload_folder, filename)
-            logger.info(f"Путь к файлу: {file_path}")
-            try:
-                file.save(file_path)
-                logger.debug(f"Файл {filename} сохранён в {file_path}")
-                new_filenames.append(filename)
-            except Exception as e:
-                logger.error(f'Ошибка при сохранении файла: {str(e)}')
-                return jsonify(error=f'Failed to save file: {str(e)}'), 500
-    logger.info(f'Новые имена файлов: {new_filenames}')
+    elapsed = time.perf_counter() - started
+    UPLOAD_BYTES.inc(upload.bytes_received)
+    UPLOAD_FILES.inc(len(saved))
+    if upload.bytes_received:
+        UPLOAD_SECONDS_PER_MIB.observe(elapsed / (upload.bytes_received / 1024 / 1024))
+    logger.info('Принято %s байт за %.2f с (%.1f МиБ/с)', upload.bytes_received, elapsed,
+                upload.bytes_received / 1024 / 1024 / max(elapsed, 1e-6),
+                extra={'bytes': upload.bytes_received, 'duration_ms': round(elapsed * 1000, 2)})
+    # SHA-256 вычислен при приёме: повторно загруженное содержимое становится
+    # ссылкой на запись общего хранилища (см. common/blobs.py)
+    duplicates = 0
+    for saved_file in saved:
+        if share_file(saved_file['path'], blob_path(upload_folder, saved_file['sha256'])):
+            duplicates += 1
+            UPLOAD_DEDUPLICATED_BYTES.inc(saved_file['size'])
+    if duplicates:
+        UPLOAD_DUPLICATES.inc(duplicates)
+        logger.info('Файлов с уже загруженным содержимым: %s', duplicates)
+    # Добавляем новые изображения в конец порядка кадров в манифесте сессии
+    entries = []
+    for saved_file in saved:
+        width, height = image_size(saved_file['path'])
+        entries.append(make_entry(os.path.basename(saved_file['path']), saved_file['filename'],
+                                  saved_file['size'], saved_file['sha256'], width, height))
+    new_filenames = [entry['name'] for entry in entries]
+
+    def add_images(manifest):
+        # Записи старой сессии, построенные по содержимому папки, могут уже включать новые файлы
+        manifest['images'] = [entry for entry in manifest['images']
+                              if entry['name'] not in new_filenames] + entries
+
+    update_manifest(upload_folder, add_images)
+    # Миниатюры и превью создаются в фоне, ответ не ждёт их готовности
+    schedule_derivatives(upload_folder, new_filenames)
+    logger.info('Загружено файлов: %s', len(new_filenames))
+    logger.debug('Новые имена файлов: %s', new_filenames)
     return jsonify(success=True, filenames=new_filenames)
 
 
+def apply_order(manifest, image_order):
+    """
+    Переставляет изображения манифеста в указанном порядке.
+
+    Изображения, отсутствующие в image_order, сохраняются в конце
+    в прежнем порядке; неизвестные имена игнорируются.
+
+    Входные параметры:
+    - manifest: Манифест сессии
+    - image_order: Словарь {позиция: имя файла}
+    """
+    entries = {entry['name']: entry for entry in manifest['images']}
+    ordered = []
+    for _, image_name in sorted(image_order.items(), key=lambda x: int(x[0])):
+        entry = entries.pop(image_name, None)
+        if entry is not None:
+            ordered.append(entry)
+    ordered.extend(entry for entry in manifest['images'] if entry['name'] in entries)
+    manifest['images'] = ordered
+
+
 # Перестановка изображений
 @app.route('/reorder_images', methods=['POST'])
 def reorder_images():
     """
     Изменяет порядок изображений.
 
+    Порядок хранится только в манифесте сессии: файлы на диске не
+    переименовываются, перестановка — одна атомарная запись манифеста.
+
     Входные параметры:
     - image_order: JSON с порядком изображений
+    - version: Версия манифеста, по которой клиент построил новый порядок
+      (необязательно). Если манифест с тех пор изменился (например,
+      перестановка из другой вкладки), возвращается 409 с текущим порядком.
 
     Возвращает:
-    - JSON с успешным статусом или сообщением об ошибке
+    - JSON с успешным статусом и новой версией манифеста или сообщением об ошибке
     """
-    logger.info("Мы внутри image_processing/reorder_images")
-    logger.info("Выполняю перестановку изображений")
     session_id = request.headers.get('X-Session-ID')
-    logger.info(f'Полученный Session ID: {session_id}')
+    logger.debug('Полученный Session ID: %s', session_id)
+    if not session_id:
+        logger.error("Session ID не найден в заголовках")
+        return jsonify(error='Session ID not provided'), 400
     image_order_json = request.form.get('image_order')
     if not image_order_json:
         logger.error("Порядок изображений не предоставлен")
         return jsonify(error='Image order not provided'), 400
-    image_order = json.loads(image_order_json)
-    logger.debug(f'Полученный порядок изображений: {image_order}')
+    try:
+        image_order = json.loads(image_order_json)
+        version = request.form.get('version')
+        expected_version = int(version) if version not in (None, '') else None
+    except ValueError as e:
+        logger.error('Неверные параметры перестановки: %s', e)
+        return jsonify(error='Invalid image order or version'), 400
+    logger.debug('Полученный порядок изображений: %s', image_order)
     upload_folder = os.path.join(uploads_root, session_id)
-    logger.debug(f'Каталог загрузки: {upload_folder}')
-    temp_renames = {}
+    logger.debug('Каталог загрузки: %s', upload_folder)
     try:
-        for idx, image_name in sorted(image_order.items(), key=lambda x: int(x[0])):
-            old_path = os.path.join(upload_folder, image_name)
-            new_path = os.path.join(upload_folder, f'temp_{int(idx):04d}_{image_name}')  # Преобразуем idx в целое число
-            if os.path.isfile(old_path):
-                os.rename(old_path, new_path)
-                temp_renames[new_path] = old_path
-                logger.debug(f"Переименован {old_path} в {new_path}")
-            else:
-                logger.warning(f"Файл {old_path} не существует или не является обычным файлом")
-        for new_path, old_path in temp_renames.items():
-            final_path = os.path.join(upload_folder, os.path.basename(old_path))
-            os.rename(new_path, final_path)
-            logger.debug(f"Переименован {new_path} в {final_path}")
-        logger.info(f'Новый порядок изображений: {image_order}')
+        manifest = update_manifest(upload_folder, lambda manifest: apply_order(manifest, image_order),
+                                   expected_version)
+    except ManifestConflict as e:
+        logger.warning('Конфликт версий при перестановке: ожидалась %s, текущая %s', expected_version,
+                       e.manifest["version"])
+        return jsonify(error='Порядок изображений уже изменён другим запросом', version=e.manifest['version'],
+                       images=image_names(e.manifest)), 409
     except Exception as e:
-        logger.error(f"Ошибка при перестановке изображений: {e}")
-        # Если возникла ошибка, попытаться вернуть файлы в исходное состояние
-        for new_path, old_path in temp_renames.items():
-            if os.path.isfile(new_path):
-                os.rename(new_path, old_path)
-                logger.debug(f"Восстановлен {new_path} в {old_path}")
+        logger.error('Ошибка при перестановке изображений: %s', e)
         return jsonify(error='Не удалось переставить изображения'), 500
-    logger.info('Перестановка изображений завершена успешно')
-    return jsonify(success=True)
+    # Сам порядок (сотни имён) пишется выше только на уровне DEBUG
+    logger.info('Порядок изображений изменён: %s кадров, версия манифеста %s', len(image_order), manifest["version"])
+    return jsonify(success=True, version=manifest['version'])
 
 
 # Удаление изображения
@@ -151,11 +286,9 @@ def remove_image():
     Возвращает:
     - JSON с успешным статусом или сообщением об ошибке
     """
-    logger.info("Мы внутри image_processing/remove_image\nВыполняю удаление изображения")
     session_id = request.headers.get('X-Session-ID')  # Получаем session_id из заголовков
     image_name = request.form.get('image_name')
-    logger.info(f'Session ID: {session_id}')
-    logger.info(f'File name: {image_name}')
+    logger.debug('Session ID: %s, имя файла: %s', session_id, image_name)
     if not session_id or not image_name:
         logger.error("Session ID или имя файла не предоставлены")
         return jsonify(error='Session ID or Image name not provided'), 400
@@ -163,16 +296,23 @@ def remove_image():
     image_path = os.path.join(upload_folder, image_name)
     if os.path.exists(image_path):
         try:
+            # Сначала убираем изображение из манифеста, чтобы его больше не видели другие сервисы
+            update_manifest(upload_folder, lambda manifest: manifest.update(
+                images=[entry for entry in manifest['images'] if entry['name'] != image_name]))
+            # Файл — одна из ссылок на запись хранилища: запись без других ссылок удалит очистка загрузок
             os.remove(image_path)
-            logger.info(f"Удалено изображение {image_name} из {image_path}")
+            logger.info('Удалено изображение %s из %s', image_name, image_path)
+            remove_cached_frames(upload_folder, image_name)
+            remove_derivatives(upload_folder, image_name)
             return jsonify(success=True)
         except Exception as e:
-            logger.error(f"Ошибка при удалении изображения {image_name}: {e}")
+            logger.error('Ошибка при удалении изображения %s: %s', image_name, e)
             return jsonify(error=f'Failed to delete image: {str(e)}'), 500
     else:
-        logger.error(f"Изображение {image_name} не найдено по пути {image_path}")
+        logger.error('Изображение %s не найдено по пути %s', image_name, image_path)
         return jsonify(error='Image not found'), 404
 
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5001)  # Запускаем Flask-приложение
\ No newline at end of file
+    # Сервер разработки; в контейнере сервис запускается через gunicorn (gunicorn.conf.py)
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=5001)  # Запускаем Flask-приложение
\ No newline at end of file
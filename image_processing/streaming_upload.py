@@ -0,0 +1,172 @@
+# image_processing/streaming_upload.py
+
+import hashlib  # Для хэша содержимого, вычисляемого при приёме
+import logging  # Для логирования событий
+import os  # Для работы с файловой системой
+import uuid  # Для имён временных файлов
+from werkzeug.sansio.multipart import MultipartDecoder, NeedData, Field, File, Data, Epilogue  # Потоковый разбор multipart
+from werkzeug.exceptions import RequestEntityTooLarge  # Переполнение буфера разборщика
+from werkzeug.http import parse_options_header  # Для извлечения boundary из Content-Type
+
+logger = logging.getLogger(__name__)
+
+# Размер блока чтения тела запроса
+CHUNK_SIZE = 256 * 1024
+# Максимальный размер обычного (не файлового) поля формы
+MAX_FIELD_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Ошибка потоковой загрузки: неверный запрос (400) или превышен лимит (413)."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def multipart_boundary(content_type):
+    """
+    Возвращает boundary из заголовка Content-Type multipart/form-data.
+
+    Возвращает:
+    - boundary в виде bytes или None, если запрос не multipart/form-data.
+    """
+    mimetype, options = parse_options_header(content_type or '')
+    boundary = options.get('boundary')
+    if mimetype != 'multipart/form-data' or not boundary:
+        return None
+    return boundary.encode('latin-1')
+
+
+class StreamingUpload:
+    """
+    Потоковый приём multipart/form-data без промежуточного сохранения.
+
+    Тело запроса читается блоками по CHUNK_SIZE и разбирается инкрементально.
+    Данные каждого файла сразу пишутся в его итоговый каталог (во временный
+    файл, который переименовывается в итоговое имя после получения части
+    целиком), поэтому каждый байт записывается на диск один раз, а в памяти
+    находится не больше одного блока. Лимиты размера файла и запроса
+    проверяются по мере чтения, там же вычисляется SHA-256 каждого файла.
+    При ошибке все файлы запроса удаляются.
+
+    Параметры:
+    - target_path: Функция target_path(filename) -> путь для сохранения
+      или None, если файл нужно пропустить.
+    - max_file_size: Максимальный размер одного файла в байтах.
+    - max_request_size: Максимальный размер тела запроса в байтах.
+    """
+
+    def __init__(self, target_path, max_file_size, max_request_size):
+        self.target_path = target_path
+        self.max_file_size = max_file_size
+        self.max_request_size = max_request_size
+        self.saved = []  # Сохранённые файлы: path, filename, size, sha256
+        self.files_seen = 0  # Количество файловых частей, включая пропущенные
+        self.fields = {}  # Обычные поля формы
+        self.bytes_received = 0
+        self._part = None  # Текущая часть multipart
+
+    def receive(self, stream, boundary):
+        """
+        Читает и сохраняет все файлы из потока тела запроса.
+
+        Параметры:
+        - stream: Поток тела запроса (request.stream).
+        - boundary: boundary multipart в виде bytes.
+
+        Возвращает:
+        - Список сохранённых файлов (словари path, filename, size, sha256).
+        """
+        decoder = MultipartDecoder(boundary, max_form_memory_size=CHUNK_SIZE + MAX_FIELD_SIZE)
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                self.bytes_received += len(chunk)
+                if self.bytes_received > self.max_request_size:
+                    raise UploadError('Request too large', 413)
+                try:
+                    decoder.receive_data(chunk or None)
+                except RequestEntityTooLarge:
+                    # Заголовки части не помещаются в буфер разборщика
+                    raise UploadError('Multipart part headers too large', 413)
+                if self._handle_events(decoder) or not chunk:
+                    break
+            if self._part is not None:
+                raise UploadError('Unexpected end of multipart body')
+        except Exception:
+            self._discard()
+            raise
+        return self.saved
+
+    def _handle_events(self, decoder):
+        """Обрабатывает события разборщика; возвращает True после конца тела."""
+        while True:
+            try:
+                event = decoder.next_event()
+            except ValueError as e:
+                raise UploadError(f'Invalid multipart body: {e}')
+            if isinstance(event, NeedData):
+                return False
+            if isinstance(event, Epilogue):
+                return True
+            if isinstance(event, File):
+                self._open_file(event.filename)
+            elif isinstance(event, Field):
+                self._part = {'field': event.name, 'data': bytearray()}
+            elif isinstance(event, Data):
+                self._write(event.data)
+                if not event.more_data:
+                    self._close_part()
+
+    def _open_file(self, filename):
+        """Начинает приём файловой части."""
+        self.files_seen += 1
+        path = self.target_path(filename or '')
+        if path is None:
+            logger.debug('Файл %s пропущен', filename)
+            self._part = {'skip': True}
+            return
+        temp_path = os.path.join(os.path.dirname(path), f'.upload-{uuid.uuid4().hex}.part')
+        self._part = {'path': path, 'filename': filename, 'temp_path': temp_path,
+                      'file': open(temp_path, 'wb'), 'size': 0, 'sha256': hashlib.sha256()}
+
+    def _write(self, data):
+        """Записывает очередной блок данных текущей части."""
+        part = self._part
+        if 'file' in part:
+            part['size'] += len(data)
+            if part['size'] > self.max_file_size:
+                raise UploadError('File too large', 413)
+            part['file'].write(data)
+            part['sha256'].update(data)
+        elif 'field' in part:
+            part['data'] += data
+            if len(part['data']) > MAX_FIELD_SIZE:
+                raise UploadError('Form field too large', 413)
+
+    def _close_part(self):
+        """Завершает текущую часть: файл переименовывается в итоговое имя."""
+        part, self._part = self._part, None
+        if 'file' in part:
+            part['file'].close()
+            os.replace(part['temp_path'], part['path'])
+            self.saved.append({'path': part['path'], 'filename': part['filename'],
+                               'size': part['size'], 'sha256': part['sha256'].hexdigest()})
+            logger.debug('Файл сохранён: %s (%s байт)', part['path'], part['size'])
+        elif 'field' in part:
+            self.fields[part['field']] = part['data'].decode('utf-8', 'replace')
+
+    def _discard(self):
+        """Удаляет недописанный файл и все файлы, сохранённые в этом запросе."""
+        part, self._part = self._part, None
+        paths = [saved['path'] for saved in self.saved]
+        if part is not None and 'file' in part:
+            part['file'].close()
+            paths.append(part['temp_path'])
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.saved = []
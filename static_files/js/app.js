@@ -1,9 +1,14 @@
 $(function () {
     const dropArea = document.getElementById('drop-area');
+    const uploadForm = $('#upload-form');
+    // Адрес загрузки: /upload web_ui или, если настроено, image_processing напрямую
+    const uploadUrl = uploadForm.data('upload-url') || '/upload';
 
-    // Получаем session_id из localStorage или создаем новый
-    let session_id = localStorage.getItem('session_id');
-    if (!session_id) {
+    // session_id текущей сессии приходит со страницей; иначе берём из localStorage или создаем новый
+    let session_id = uploadForm.data('session-id') || localStorage.getItem('session_id');
+    if (session_id) {
+        localStorage.setItem('session_id', session_id);
+    } else {
         $.getJSON('/get_session_id', function(data) {
             session_id = data.session_id;
             localStorage.setItem('session_id', session_id);
@@ -52,14 +57,16 @@ $(function () {
             formData.append('files', files[i]);
         }
         $.ajax({
-            url: '/upload',
+            url: uploadUrl,
             type: 'POST',
             data: formData,
             contentType: false,
             processData: false,
             headers: { 'X-Session-ID': session_id },
             success: function(response) {
-                if (response.success) {
+                // web_ui отвечает success, image_processing — списком filenames;
+                // новые файлы уже записаны в манифест сессии
+                if (response.success || response.filenames) {
                     // Обновляем список изображений
                     updateImageList();
                 } else {
@@ -72,15 +79,21 @@ $(function () {
         });
     }
 
+    // Версия манифеста сессии, по которой построен текущий порядок в галерее
+    let manifestVersion = null;
+
     function updateImageList() {
         $.getJSON('/get_images', function(data) {
+            manifestVersion = data.version;
             let imageContainer = $('#image-container');
             imageContainer.empty();
             let imageOrder = {};
             data.images.forEach((image, index) => {
                 imageOrder[index + 1] = image;
-                let imageWrapper = $('<div class="image-wrapper"></div>');
-                let imgElement = $('<img>').attr('src', `/uploads/${image}`).addClass('draggable');
+                let imageWrapper = $('<div class="image-wrapper"></div>').attr('data-image', image);
+                // В галерее показываем миниатюру, оригинал нужен только для генерации GIF
+                let thumbnailUrl = data.thumbnails ? data.thumbnails[index] : `/uploads/${image}`;
+                let imgElement = $('<img>').attr('src', thumbnailUrl).attr('loading', 'lazy').addClass('draggable');
                 let removeBtn = $('<button class="remove-btn" data-image-name="' + image + '">✖</button>');
                 imageWrapper.append(removeBtn).append(imgElement);
                 imageContainer.append(imageWrapper);
@@ -95,30 +108,40 @@ $(function () {
             update: function () {
                 let imageOrder = {};
                 $('#image-container').children().each(function(index) {
-                    let imageSrc = $(this).find('img').attr('src').split('/').pop();
-                    imageOrder[index + 1] = imageSrc;
+                    imageOrder[index + 1] = $(this).attr('data-image');
                 });
                 sessionStorage.setItem('imageOrder', JSON.stringify(imageOrder));
+                sendImageOrder(imageOrder);
+            }
+        });
+    }
 
-                $.ajax({
-                    url: '/reorder_images',
-                    type: 'POST',
-                    headers: { 'X-Session-ID': session_id },
-                    data: { image_order: JSON.stringify(imageOrder) },
-                    contentType: 'application/x-www-form-urlencoded',
-                    success: function(response) {
-                        if (!response.success) {
-                            console.error('Ошибка перестановки изображений:', response.error);
-                            alert('Ошибка перестановки изображений: ' + response.error);
-                        } else {
-                            console.log('Перестановка успешна:', response);
-                        }
-                    },
-                    error: function(xhr, status, error) {
-                        console.error('Ошибка перестановки изображений:', xhr.responseText || error);
-                        alert('Ошибка перестановки изображений: ' + (xhr.responseText || error));
-                    }
-                });
+    // Сохраняет новый порядок изображений. Если порядок успели изменить
+    // в другой вкладке (409), показывает актуальный порядок с сервера
+    function sendImageOrder(imageOrder) {
+        $.ajax({
+            url: '/reorder_images',
+            type: 'POST',
+            headers: { 'X-Session-ID': session_id },
+            data: { image_order: JSON.stringify(imageOrder), version: manifestVersion },
+            contentType: 'application/x-www-form-urlencoded',
+            success: function(response) {
+                if (!response.success) {
+                    console.error('Ошибка перестановки изображений:', response.error);
+                    alert('Ошибка перестановки изображений: ' + response.error);
+                } else {
+                    manifestVersion = response.version;
+                    console.log('Перестановка успешна:', response);
+                }
+            },
+            error: function(xhr, status, error) {
+                if (xhr.status === 409) {
+                    console.warn('Порядок изображений изменён в другой вкладке');
+                    updateImageList();
+                    return;
+                }
+                console.error('Ошибка перестановки изображений:', xhr.responseText || error);
+                alert('Ошибка перестановки изображений: ' + (xhr.responseText || error));
             }
         });
     }
@@ -156,26 +179,32 @@ $(function () {
     });
 
     $('#upload-form input[type="file"]').on('change', function () {
-        let formData = new FormData();
-        $.each(this.files, function (_, file) {
-            formData.append('files', file);
-        });
-        $.ajax({
-            url: '/upload',
-            type: 'POST',
-            data: formData,
-            contentType: false,
-            processData: false,
-            headers: { 'X-Session-ID': session_id },
-            success: function () {
-                updateImageList(); // Обновляем список изображений без перезагрузки страницы
-            },
-            error: function (xhr, status, error) {
-                console.error('Ошибка загрузки файлов:', error);
-                alert('Ошибка загрузки файлов: ' + error);
+        uploadFiles(this.files); // Список изображений обновится без перезагрузки страницы
+    });
+
+    // Опрашивает статус задачи генерации GIF и обновляет индикатор прогресса
+    function pollGifJob(jobId) {
+        $.getJSON('/jobs/' + jobId, function (job) {
+            if (job.frames_total > 0) {
+                let percentComplete = job.frames_done / job.frames_total * 100;
+                $('#progress-bar').width(percentComplete + '%').text(percentComplete.toFixed(0) + '%');
+            }
+            if (job.status === 'done') {
+                $('#progress-container').hide();
+                // Перенаправляем пользователя на главную страницу
+                window.location.href = '/';
+            } else if (job.status === 'failed') {
+                $('#progress-container').hide();
+                alert('Ошибка генерации GIF: ' + job.error);
+            } else {
+                setTimeout(function () { pollGifJob(jobId); }, 1000);
             }
+        }).fail(function (xhr, status, error) {
+            console.error('Ошибка получения статуса генерации GIF:', error);
+            $('#progress-container').hide();
+            alert('Ошибка генерации GIF: ' + error);
         });
-    });
+    }
 
     $('#generate-form').on('submit', function (e) {
         e.preventDefault();
@@ -190,29 +219,19 @@ $(function () {
             data: formData,
             contentType: false,
             processData: false,
-            xhr: function () {
-                let xhr = new window.XMLHttpRequest();
-                xhr.upload.addEventListener('progress', function (evt) {
-                    if (evt.lengthComputable) {
-                        let percentComplete = evt.loaded / evt.total * 100;
-                        $('#progress-bar').width(percentComplete + '%').text(percentComplete.toFixed(2) + '%');
-                    }
-                }, false);
-                return xhr;
-            },
             success: function (response) {
-                $('#progress-container').hide();
                 if (response.success) {
-                    // Перенаправляем пользователя на главную страницу
-                    window.location.href = '/';
+                    pollGifJob(response.job_id);
                 } else {
+                    $('#progress-container').hide();
                     alert('Ошибка генерации GIF: ' + response.error);
                 }
             },
             error: function (xhr, status, error) {
                 console.error('Ошибка генерации GIF:', error);
                 $('#progress-container').hide();
-                alert('Ошибка генерации GIF: ' + error);
+                let message = (xhr.responseJSON && xhr.responseJSON.error) || error;
+                alert('Ошибка генерации GIF: ' + message);
             }
         });
     });
@@ -223,28 +242,9 @@ $(function () {
 
         let imageOrder = {};
         images.forEach((img, index) => {
-            let imageSrc = $(img).find('img').attr('src').split('/').pop();
-            imageOrder[index + 1] = imageSrc;
-        });
-        $.ajax({
-            url: '/reorder_images',
-            type: 'POST',
-            headers: { 'X-Session-ID': session_id },
-            data: { image_order: JSON.stringify(imageOrder) },
-            contentType: 'application/x-www-form-urlencoded',
-            success: function(response) {
-                if (!response.success) {
-                    console.error('Ошибка перестановки изображений:', response.error);
-                    alert('Ошибка перестановки изображений: ' + response.error);
-                } else {
-                    console.log('Перестановка успешна:', response);
-                }
-            },
-            error: function(xhr, status, error) {
-                console.error('Ошибка перестановки изображений:', xhr.responseText || error);
-                alert('Ошибка перестановки изображений: ' + (xhr.responseText || error));
-            }
+            imageOrder[index + 1] = $(img).attr('data-image');
         });
+        sendImageOrder(imageOrder);
     });
 
     // Определяем функцию attachDraggableAndSortable
@@ -0,0 +1,343 @@
+# web_ui/asgi_app.py
+"""
+Асинхронный (ASGI) режим web_ui.
+
+Маршруты, которые только ждут ответа API (загрузка, удаление, перестановка,
+генерация GIF, статус задачи), выполняются как корутины Quart: запросы к API
+идут через общий httpx.AsyncClient, и один процесс держит тысячи
+одновременных запросов без потока на каждый. Остальные маршруты (страница,
+сессии, файлы) работают с локальной папкой загрузок и обслуживаются
+Flask-приложением из main.py через адаптер WSGI → ASGI.
+
+Cookie сессии подписываются тем же ключом и в том же формате
+(itsdangerous), поэтому сессия общая для обеих частей.
+
+Запуск:
+    uvicorn asgi_app:application --host 0.0.0.0 --port 5000
+"""
+
+import logging  # Для логирования событий
+import os  # Для работы с путями
+import time  # Для измерения задержек
+import threading  # Для защиты статистики
+import httpx  # Асинхронный HTTP-клиент для запросов к API
+from asgiref.wsgi import WsgiToAsgi  # Для обслуживания Flask-приложения из ASGI-сервера
+from quart import Quart, request, session, jsonify, redirect  # Асинхронный аналог Flask
+from common.manifest import read_manifest, image_names
+from common.logging_setup import init_request_logging, with_request_id
+from common.metrics import init_metrics
+import main  # Flask-приложение web_ui
+from upstream import (LatencyStats, UPSTREAM_SECONDS, UPSTREAM_URL, CONNECT_TIMEOUT, READ_TIMEOUT,
+                      UPLOAD_READ_TIMEOUT, POOL_SIZE, RETRIES)
+
+logger = logging.getLogger(__name__)
+
+async_app = Quart(__name__)
+async_app.secret_key = main.app.secret_key  # Тот же ключ: cookie сессии читаются обеими частями
+# Тело загрузки не ограничивается Quart (по умолчанию 16 МиБ): лимиты проверяет image_processing
+async_app.config['MAX_CONTENT_LENGTH'] = None
+async_app.config['BODY_TIMEOUT'] = UPLOAD_READ_TIMEOUT
+# Хуки-корутины: синхронные Quart выполняет в другом потоке, и идентификатор запроса туда не дошёл бы
+init_request_logging(async_app, request, asynchronous=True)
+# /metrics обслуживает Flask-приложение; реестр метрик общий для обеих частей
+init_metrics(async_app, request, asynchronous=True)
+
+# Пути, которые обслуживает асинхронная часть; остальные передаются Flask-приложению
+ASYNC_PATHS = ('/upload', '/remove_image', '/reorder_images', '/generate_gif', '/upstream_metrics')
+ASYNC_PREFIXES = ('/jobs/',)
+
+
+class AsyncUpstreamClient:
+    """
+    Асинхронный HTTP-клиент web_ui для запросов к API.
+
+    Аналог upstream.UpstreamClient: пул keep-alive соединений ограничен
+    UPSTREAM_POOL_SIZE на процесс, у запросов те же тайм-ауты, статистика
+    задержек собирается так же. Транспорт httpx повторяет запрос только при
+    ошибке установки соединения, поэтому повтор безопасен и для POST.
+    """
+
+    def __init__(self, base_url=UPSTREAM_URL, pool_size=POOL_SIZE, retries=RETRIES):
+        self.base_url = base_url
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            transport=httpx.AsyncHTTPTransport(retries=retries),
+        )
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    async def request(self, method, path, **kwargs):
+        """
+        Выполняет запрос к API.
+
+        Параметры:
+        - method: HTTP-метод.
+        - path: Путь относительно адреса шлюза, например '/upload'.
+        - kwargs: Остальные параметры httpx (data, content, headers, timeout, ...).
+
+        Возвращает:
+        - httpx.Response. Ошибки соединения и тайм-ауты возникают как httpx.TransportError.
+        """
+        endpoint = path.strip('/').split('/', 1)[0] or '/'
+        kwargs['headers'] = with_request_id(kwargs.get('headers'))
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = await self.client.request(method, path, **kwargs)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._stats_lock:
+                self._stats.setdefault(endpoint, LatencyStats()).observe(elapsed, failed)
+            UPSTREAM_SECONDS.labels(endpoint, 'true' if failed else 'false').observe(elapsed)
+            logger.debug('Upstream %s %s: %.1f ms', method, path, elapsed * 1000)
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    def metrics(self):
+        """Возвращает статистику задержек по конечным точкам API."""
+        with self._stats_lock:
+            return {endpoint: stats.snapshot() for endpoint, stats in sorted(self._stats.items())}
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+upstream = None
+
+
+@async_app.before_serving
+async def open_upstream():
+    """Создаёт клиент API в цикле событий сервера."""
+    global upstream
+    upstream = AsyncUpstreamClient()
+
+
+@async_app.after_serving
+async def close_upstream():
+    """Закрывает соединения пула при остановке сервера."""
+    await upstream.aclose()
+
+
+@async_app.before_request
+async def mark_session_used():
+    """Обновляет время использования сессии для очистки (см. main.mark_session_used)."""
+    session_id = session.get('session_id')
+    if session_id:
+        main.janitor.touch(session_id)
+
+
+@async_app.errorhandler(httpx.TransportError)
+async def upstream_unavailable(e):
+    """
+    Отвечает клиенту, если API недоступен: соединение не установлено
+    или ответ не получен за тайм-аут.
+
+    Возвращает:
+    - JSON с сообщением об ошибке и статусом 502 или 504
+    """
+    logger.error('Upstream request failed: %r', e)
+    status = 504 if isinstance(e, httpx.TimeoutException) else 502
+    return jsonify(success=False, error='Upstream service unavailable'), status
+
+
+@async_app.route('/upload', methods=['POST'])
+async def upload():
+    """
+    Обрабатывает загрузку изображений: тело запроса передаётся
+    в image_processing как есть, по мере получения (см. main.upload).
+
+    Возвращает:
+    - JSON с именами новых файлов или сообщение об ошибке
+    """
+    session_id = session.get('session_id')
+    if not session_id:
+        logger.error("Session ID не найден")
+        return jsonify(error='Session ID не найден'), 400
+    if request.mimetype != 'multipart/form-data':
+        logger.error('Неожиданный тип запроса: %s', request.mimetype)
+        return jsonify(error='Expected multipart/form-data'), 400
+    if request.content_length is None:
+        logger.error("Не указан Content-Length")
+        return jsonify(error='Content-Length required'), 411
+
+    # С явным Content-Length httpx передаёт тело без chunked-кодирования
+    headers = {'X-Session-ID': session_id, 'Content-Type': request.content_type,
+               'Content-Length': str(request.content_length)}
+    response = await upstream.post('/upload', content=request.body, headers=headers,
+                                   timeout=httpx.Timeout(UPLOAD_READ_TIMEOUT, connect=CONNECT_TIMEOUT))
+    if response.status_code == 200:
+        new_filenames = response.json().get('filenames', [])
+        if isinstance(new_filenames, list):
+            logger.debug('Новые имена файлов: %s', new_filenames)
+            return jsonify(success=True, filenames=new_filenames)
+        logger.error('Ошибка при загрузке файлов: "filenames" не является списком, получено: %s', new_filenames)
+        return jsonify(error='Unexpected response format from image_processing'), 500
+    logger.error('Ошибка при загрузке файлов: %s', response.text)
+    return jsonify(error='Failed to upload files'), response.status_code
+
+
+@async_app.route('/remove_image', methods=['POST'])
+async def remove_image():
+    """
+    Удаляет изображение.
+
+    Входные параметры:
+    - image_name: Имя файла для удаления
+
+    Возвращает:
+    - JSON с успешным статусом или сообщением об ошибке
+    """
+    session_id = session.get('session_id')
+    image_name = (await request.form).get('image_name')
+    if not image_name:
+        logger.error("Image name not provided in remove_image.")
+        return jsonify({'success': False, 'message': 'Image name not specified'}), 400
+    response = await upstream.post('/remove_image', headers={'X-Session-ID': session_id},
+                                   data={'image_name': image_name})
+    if response.status_code == 200:
+        logger.debug('Successfully removed image %s', image_name)
+        return jsonify(response.json()), 200
+    logger.error('Error removing image %s: %s', image_name, response.text)
+    return jsonify({'success': False, 'message': response.text}), response.status_code
+
+
+@async_app.route('/reorder_images', methods=['POST'])
+async def reorder_images():
+    """
+    Изменяет порядок изображений.
+
+    Входные параметры:
+    - image_order: JSON с новым порядком изображений
+    - version: Версия манифеста, по которой построен порядок (необязательно)
+
+    Возвращает:
+    - JSON с успешным статусом и новой версией манифеста, 409 с текущим
+      порядком или сообщение об ошибке
+    """
+    session_id = session.get('session_id')
+    if not session_id:
+        logger.error("Session ID not found in reorder_images.")
+        return jsonify(success=False, error='Session ID not found'), 400
+    form = await request.form
+    image_order = form.get('image_order')
+    if not image_order:
+        logger.error("Image order not provided in reorder_images.")
+        return jsonify(success=False, error='Image order not provided'), 400
+    data = {'image_order': image_order}
+    if form.get('version'):
+        data['version'] = form.get('version')
+    response = await upstream.post('/reorder_images', headers={'X-Session-ID': session_id}, data=data)
+    if response.status_code == 200:
+        logger.debug('Successfully reordered images')
+        return jsonify(success=True, version=response.json().get('version'))
+    elif response.status_code == 409:
+        logger.warning('Image order was changed concurrently, reorder rejected')
+        return jsonify(success=False, **response.json()), 409
+    logger.error('Error reordering images: %s', response.text)
+    return jsonify(success=False, error='Failed to reorder images'), response.status_code
+
+
+@async_app.route('/generate_gif', methods=['POST'])
+async def generate_gif():
+    """
+    Ставит генерацию GIF в очередь gif_generator.
+
+    Входные параметры:
+    - duration, loop, resize, dither, format: Параметры генерации (см. main.generate_gif)
+
+    Возвращает:
+    - JSON с идентификатором задачи генерации (202) или сообщение об ошибке
+    """
+    session_id = session.get('session_id')
+    if not session_id:
+        logger.error("Session ID not found in generate_gif.")
+        return redirect('/')
+    form = await request.form
+    # Манифест — небольшой файл, его чтение не блокирует цикл событий заметно
+    if not image_names(read_manifest(os.path.join(main.uploads_root, session_id))):
+        logger.error("No images found in session manifest in generate_gif.")
+        return jsonify(error='No images uploaded'), 400
+    data = {
+        'duration': form.get('duration', 300),
+        'loop': form.get('loop', 0),
+    }
+    for name in ('resize', 'dither', 'format'):
+        if form.get(name) is not None:
+            data[name] = form.get(name)
+    response = await upstream.post('/generate_gif', headers={'X-Session-ID': session_id}, data=data)
+    if response.status_code == 202:
+        job_id = response.json().get('job_id')
+        logger.debug('GIF generation job submitted: %s', job_id)
+        return jsonify(success=True, job_id=job_id), 202
+    elif response.status_code == 429:
+        logger.error('GIF generation queue is full.')
+        return jsonify(success=False, error='Сервер занят, попробуйте позже'), 429
+    elif response.status_code == 400:
+        logger.error('GIF generation rejected: %s', response.text)
+        is_json = response.headers.get('Content-Type', '').startswith('application/json')
+        error = (response.json() if is_json else {}).get('error', 'Invalid parameters')
+        return jsonify(success=False, error=error), 400
+    logger.error('Error generating GIF: %s', response.text)
+    return jsonify(error='Failed to generate GIF'), 500
+
+
+@async_app.route('/jobs/<job_id>', methods=['GET'])
+async def job_status(job_id):
+    """
+    Возвращает статус задачи генерации GIF.
+
+    Входные параметры:
+    - job_id: Идентификатор задачи
+
+    Возвращает:
+    - JSON со статусом, прогрессом (frames_done/frames_total) и URL GIF
+    """
+    session_id = session.get('session_id')
+    if not session_id:
+        logger.error("Session ID not found in job_status.")
+        return jsonify(error='Session ID not found'), 400
+    response = await upstream.get(f'/jobs/{job_id}', headers={'X-Session-ID': session_id})
+    if response.status_code == 200:
+        return jsonify(response.json())
+    logger.error('Error getting job status %s: %s', job_id, response.text)
+    return jsonify(error='Job not found'), response.status_code
+
+
+@async_app.route('/upstream_metrics', methods=['GET'])
+async def upstream_metrics():
+    """
+    Возвращает статистику запросов web_ui к API (см. main.upstream_metrics).
+    """
+    return jsonify(upstream.metrics())
+
+
+sync_app = WsgiToAsgi(main.app)
+
+
+async def application(scope, receive, send):
+    """
+    ASGI-приложение web_ui: маршруты, ожидающие API, — в асинхронной части,
+    остальные — во Flask-приложении (в пуле потоков адаптера).
+    """
+    if scope['type'] == 'lifespan':
+        await async_app(scope, receive, send)
+        return
+    path = scope.get('path', '')
+    if path in ASYNC_PATHS or path.startswith(ASYNC_PREFIXES):
+        await async_app(scope, receive, send)
+    else:
+        await sync_app(scope, receive, send)
+
+
+if __name__ == '__main__':
+    import uvicorn  # ASGI-сервер
+
+    uvicorn.run(application, host='0.0.0.0', port=5000)
@@ -0,0 +1,40 @@
+# web_ui/gunicorn.conf.py
+# Конфигурация gunicorn для web_ui (запуск: gunicorn -c gunicorn.conf.py)
+
+import os  # Для чтения настроек из окружения
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# web_ui почти всё время ждёт ответа API, поэтому на процесс приходится
+# много потоков; размер пула соединений к API (UPSTREAM_POOL_SIZE) по
+# умолчанию равен числу потоков. С WEB_UI_ASGI=1 приложение работает в
+# асинхронном режиме (asgi_app.py): потоки не нужны, один процесс держит
+# тысячи одновременных запросов.
+if os.environ.get('WEB_UI_ASGI') == '1':
+    wsgi_app = 'asgi_app:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'main:app'
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 32))
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 300))
+# Время на завершение текущих запросов при остановке
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Модуль приложения загружается в мастер-процессе до fork. Соединения к API
+# при импорте не открываются, поэтому пул каждого процесса начинается пустым
+preload_app = True
+
+# Журнал запросов пишет само приложение (common/logging_setup.py): структурированные
+# записи с идентификатором запроса и длительностью, поэтому журнал доступа gunicorn отключён
+accesslog = None
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+
+def post_fork(server, worker):
+    """Запускает фоновую очистку загрузок в рабочем процессе: потоки не переживают fork."""
+    import main
+
+    main.janitor.start()
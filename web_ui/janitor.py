@@ -0,0 +1,345 @@
+# web_ui/janitor.py
+"""
+Фоновая очистка папки загрузок.
+
+Сессия — папка uploads/<session_id>. Время последнего использования —
+mtime папки: его обновляют изменения файлов (загрузка, удаление, генерация
+GIF) и web_ui при запросах с этой сессией (touch, не чаще TOUCH_INTERVAL).
+
+Проход очистки (раз в JANITOR_INTERVAL секунд):
+- сессии, не использовавшиеся дольше SESSION_TTL, удаляются;
+- если загрузки занимают больше UPLOADS_QUOTA_BYTES, удаляются сессии,
+  которые дольше всего не использовались, кроме использованных за последние
+  SESSION_PROTECT_SECONDS;
+- у сессий больше SESSION_QUOTA_BYTES удаляется кэш подготовленных кадров
+  (он создаётся заново при генерации). Новые загрузки сверх квоты сессии
+  отклоняет image_processing.
+
+Удаляемая сессия сначала переименовывается в uploads/.trash (для
+пользователя она исчезает сразу и целиком), затем файлы удаляются пачками
+по JANITOR_BATCH_FILES с паузой между пачками, чтобы не занимать том и
+процессор надолго. Каталоги, имена которых начинаются с точки (.cache,
+.trash, .blobs), сессиями не считаются.
+
+Файлы сессий — жёсткие ссылки на записи общего хранилища uploads/.blobs
+(common/blobs.py). Запись, у которой осталась одна ссылка (из самого
+хранилища), удаляется после удаления сессий. Размер файла с несколькими
+ссылками делится между ними, поэтому сумма размеров сессий и хранилища
+равна занятому месту.
+
+Очистку выполняет один процесс: проход начинается только под
+неблокирующей flock-блокировкой uploads/.janitor.lock. Итоги последнего
+прохода записываются в uploads/.janitor.json, их отдают /janitor_stats и
+/metrics любого процесса web_ui.
+"""
+
+import fcntl  # Для блокировки между процессами
+import json  # Для файла итогов прохода
+import logging  # Для логирования событий
+import os  # Для работы с файловой системой
+import threading  # Для фонового потока
+import time  # Для отметок времени
+import uuid  # Для уникальных имён в корзине
+from common.blobs import BLOBS_DIR  # Общее хранилище содержимого
+from common.metrics import counter, gauge  # Метрики очистки
+
+logger = logging.getLogger(__name__)
+
+# Сессия удаляется, если не использовалась дольше SESSION_TTL секунд
+SESSION_TTL = int(os.environ.get('SESSION_TTL', 24 * 60 * 60))
+# Квота одной сессии и всех загрузок, байт
+SESSION_QUOTA_BYTES = int(os.environ.get('SESSION_QUOTA_BYTES', 2 * 1024 ** 3))
+UPLOADS_QUOTA_BYTES = int(os.environ.get('UPLOADS_QUOTA_BYTES', 50 * 1024 ** 3))
+# Сессии, использованные за это время, не удаляются при превышении общей квоты
+SESSION_PROTECT_SECONDS = int(os.environ.get('SESSION_PROTECT_SECONDS', 15 * 60))
+# Интервал между проходами, с
+JANITOR_INTERVAL = int(os.environ.get('JANITOR_INTERVAL', 300))
+# Сколько файлов удаляется за одну пачку и пауза между пачками, с
+JANITOR_BATCH_FILES = int(os.environ.get('JANITOR_BATCH_FILES', 200))
+JANITOR_BATCH_PAUSE = float(os.environ.get('JANITOR_BATCH_PAUSE', 0.05))
+# Как часто (не чаще, с) web_ui обновляет время использования сессии
+TOUCH_INTERVAL = 60
+
+TRASH_DIR = '.trash'
+LOCK_NAME = '.janitor.lock'
+STATS_NAME = '.janitor.json'
+# Подкаталоги сессии, которые можно удалить без потери данных пользователя
+REGENERABLE_DIRS = ('.frames',)
+# Записи хранилища моложе этого (по изменению числа ссылок) не удаляются:
+# сервис может как раз связывать с ними файл сессии
+BLOB_GRACE_SECONDS = 600
+
+EVICTED = counter('web_ui_janitor_evicted_sessions_total', 'Удалённые сессии по причине (ttl, quota)',
+                  ['reason'])
+RECLAIMED = counter('web_ui_janitor_reclaimed_bytes_total', 'Освобождено очисткой, байт')
+
+
+def _tree_size(path):
+    """
+    Возвращает суммарный размер файлов в каталоге (рекурсивно).
+
+    Размер файла с несколькими жёсткими ссылками делится на число ссылок.
+    """
+    total = 0
+    try:
+        entries = list(os.scandir(path))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                total += _tree_size(entry.path)
+            else:
+                stat = entry.stat(follow_symlinks=False)
+                total += stat.st_size // max(stat.st_nlink, 1)
+        except FileNotFoundError:
+            pass
+    return total
+
+
+class SessionJanitor:
+    """
+    Очистка папки загрузок (см. описание модуля).
+
+    Параметры:
+    - root: Папка загрузок.
+    - остальные параметры по умолчанию берутся из окружения.
+    """
+
+    def __init__(self, root, ttl=SESSION_TTL, session_quota=SESSION_QUOTA_BYTES, total_quota=UPLOADS_QUOTA_BYTES,
+                 protect=SESSION_PROTECT_SECONDS, interval=JANITOR_INTERVAL, batch_files=JANITOR_BATCH_FILES,
+                 batch_pause=JANITOR_BATCH_PAUSE):
+        self.root = root
+        self.ttl = ttl
+        self.session_quota = session_quota
+        self.total_quota = total_quota
+        self.protect = protect
+        self.interval = interval
+        self.batch_files = batch_files
+        self.batch_pause = batch_pause
+        self._touched = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def touch(self, session_id):
+        """Отмечает использование сессии (не чаще TOUCH_INTERVAL на процесс)."""
+        now = time.time()
+        if now - self._touched.get(session_id, 0) < TOUCH_INTERVAL:
+            return
+        if len(self._touched) > 10000:
+            self._touched.clear()
+        self._touched[session_id] = now
+        try:
+            os.utime(os.path.join(self.root, session_id))
+        except FileNotFoundError:
+            pass
+
+    def discard(self, session_id):
+        """
+        Удаляет сессию по запросу пользователя: папка сразу убирается в
+        корзину, файлы удалит следующий проход очистки.
+        """
+        try:
+            self._to_trash(os.path.join(self.root, session_id))
+        except FileNotFoundError:
+            pass
+
+    def sessions(self):
+        """Возвращает список (время использования, размер, session_id) всех сессий."""
+        result = []
+        if not os.path.isdir(self.root):
+            return result
+        for entry in os.scandir(self.root):
+            if entry.name.startswith('.') or not entry.is_dir(follow_symlinks=False):
+                continue
+            try:
+                last_used = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            result.append((last_used, _tree_size(entry.path), entry.name))
+        return result
+
+    def _to_trash(self, path):
+        """Атомарно убирает каталог в корзину."""
+        trash = os.path.join(self.root, TRASH_DIR)
+        os.makedirs(trash, exist_ok=True)
+        os.rename(path, os.path.join(trash, f'{os.path.basename(path)}-{uuid.uuid4().hex[:8]}'))
+
+    def _drain_trash(self):
+        """Удаляет содержимое корзины пачками по batch_files файлов. Возвращает число удалённых файлов."""
+        trash = os.path.join(self.root, TRASH_DIR)
+        removed = 0
+        for dirpath, dirnames, filenames in os.walk(trash, topdown=False):
+            for name in filenames:
+                try:
+                    os.remove(os.path.join(dirpath, name))
+                except FileNotFoundError:
+                    pass
+                removed += 1
+                if removed % self.batch_files == 0:
+                    if self._stop.wait(self.batch_pause):
+                        return removed
+            if dirpath != trash:
+                try:
+                    os.rmdir(dirpath)
+                except OSError:
+                    pass
+        return removed
+
+    def _collect_blobs(self):
+        """
+        Удаляет записи хранилища, на которые не ссылается ни одна сессия.
+
+        Возвращает:
+        - Кортеж (число удалённых записей, освобождено байт).
+        """
+        now = time.time()
+        removed = freed = 0
+        for dirpath, dirnames, filenames in os.walk(os.path.join(self.root, BLOBS_DIR)):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                    if stat.st_nlink > 1 or now - stat.st_ctime < BLOB_GRACE_SECONDS:
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                removed += 1
+                freed += stat.st_size
+                if removed % self.batch_files == 0:
+                    if self._stop.wait(self.batch_pause):
+                        return removed, freed
+        return removed, freed
+
+    def run_once(self):
+        """
+        Выполняет один проход очистки.
+
+        Возвращает:
+        - Словарь итогов прохода или None, если проход уже выполняет другой процесс.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, LOCK_NAME), 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            try:
+                return self._run_locked()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _run_locked(self):
+        started = time.perf_counter()
+        now = time.time()
+        evicted = {'ttl': 0, 'quota': 0}
+        reclaimed = 0
+        live = []
+        for last_used, size, session_id in sorted(self.sessions()):
+            if now - last_used > self.ttl:
+                reclaimed += self._evict(session_id, size, 'ttl')
+                evicted['ttl'] += 1
+            else:
+                live.append((last_used, size, session_id))
+
+        # Общая квота: от давно не использовавшихся к недавним, активные не трогаем
+        total = sum(size for _, size, _ in live)
+        while live and total > self.total_quota and now - live[0][0] > self.protect:
+            _, size, session_id = live.pop(0)
+            reclaimed += self._evict(session_id, size, 'quota')
+            evicted['quota'] += 1
+            total -= size
+        if total > self.total_quota:
+            logger.warning('Загрузки занимают %s байт при квоте %s: остались только активные сессии',
+                           total, self.total_quota)
+
+        # Квота сессии: удаляем то, что можно создать заново
+        for index, (last_used, size, session_id) in enumerate(live):
+            if size <= self.session_quota:
+                continue
+            for name in REGENERABLE_DIRS:
+                path = os.path.join(self.root, session_id, name)
+                if os.path.isdir(path):
+                    freed = _tree_size(path)
+                    self._to_trash(path)
+                    reclaimed += freed
+                    RECLAIMED.inc(freed)
+                    size -= freed
+                    total -= freed
+            live[index] = (last_used, size, session_id)
+
+        # Записи хранилища освобождаются после удаления файлов сессий
+        files_removed = self._drain_trash()
+        blobs_removed, blobs_freed = self._collect_blobs()
+        RECLAIMED.inc(blobs_freed)
+        total += _tree_size(os.path.join(self.root, BLOBS_DIR))
+        stats = {
+            'sessions': len(live),
+            'bytes': total,
+            'evicted_ttl': evicted['ttl'],
+            'evicted_quota': evicted['quota'],
+            'reclaimed_bytes': reclaimed,
+            'files_removed': files_removed,
+            'blobs_removed': blobs_removed,
+            'seconds': round(time.perf_counter() - started, 3),
+            'finished_at': time.time(),
+        }
+        self._write_stats(stats)
+        if evicted['ttl'] or evicted['quota'] or reclaimed or blobs_removed:
+            logger.info('Очистка загрузок: удалено сессий %s по сроку и %s по квоте, освобождено %s байт, '
+                        'записей хранилища %s, осталось сессий %s (%s байт)', evicted['ttl'], evicted['quota'],
+                        reclaimed, blobs_removed, len(live), total)
+        return stats
+
+    def _evict(self, session_id, size, reason):
+        """Убирает сессию в корзину. Возвращает освобождаемый объём."""
+        try:
+            self._to_trash(os.path.join(self.root, session_id))
+        except FileNotFoundError:
+            return 0
+        logger.debug('Сессия %s удалена (%s), %s байт', session_id, reason, size)
+        EVICTED.labels(reason).inc()
+        RECLAIMED.inc(size)
+        return size
+
+    def _write_stats(self, stats):
+        path = os.path.join(self.root, STATS_NAME)
+        temp_path = f'{path}.tmp-{uuid.uuid4().hex[:8]}'
+        with open(temp_path, 'w') as f:
+            json.dump(stats, f)
+        os.replace(temp_path, path)
+
+    def stats(self):
+        """Возвращает итоги последнего прохода (любого процесса) или пустой словарь."""
+        try:
+            with open(os.path.join(self.root, STATS_NAME)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def start(self):
+        """Запускает фоновый поток очистки. Повторные вызовы ничего не делают."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name='uploads-janitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('Ошибка при очистке загрузок')
+            self._stop.wait(self.interval)
+
+
+def register_janitor_metrics(janitor):
+    """Значения из итогов последнего прохода для /metrics."""
+    gauge('web_ui_sessions', 'Сессии в папке загрузок (по последнему проходу очистки)').set_function(
+        lambda: janitor.stats().get('sessions', 0))
+    gauge('web_ui_uploads_bytes', 'Объём папки загрузок, байт (по последнему проходу очистки)').set_function(
+        lambda: janitor.stats().get('bytes', 0))
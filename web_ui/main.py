@@ -1,21 +1,34 @@
 # web_ui/main.py
 
 import time
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, json
-from flask import send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+from flask import abort, send_file
 import os
 import uuid
+import hashlib  # Для версий результатов по содержимому
+import mimetypes  # Для типа содержимого файлов, которые отдаёт nginx
+import threading  # Для защиты памяти версий
+from collections import OrderedDict  # Для памяти версий с вытеснением
+from urllib.parse import quote  # Для пути в X-Accel-Redirect
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 import requests
 import logging
-import shutil
+from common.manifest import read_manifest, update_manifest, make_entry, image_names
+from upstream import upstream, error_status, StreamBody, UPLOAD_READ_TIMEOUT  # Общий пул соединений к API
+from common.health import register_health_routes, check_writable  # Проверки состояния сервиса
+from common.logging_setup import setup_logging, init_request_logging  # Общая настройка логирования
+from common.metrics import init_metrics  # /metrics и длительность запросов
+from janitor import SessionJanitor, register_janitor_metrics  # Фоновая очистка папки загрузок
 
 # Настройка логирования
-logging.basicConfig(level=logging.INFO)  # Установка уровня логирования в DEBUG для более подробного логирования
+setup_logging('web_ui')  # Уровень и формат задаются LOG_LEVEL и LOG_FORMAT
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'  # Секретный ключ для подписи сессии
+init_request_logging(app, request)  # Идентификатор запроса и журнал запросов
+init_metrics(app, request)  # /metrics: длительность запросов и запросов к API
 
 
 # Фильтр допустимых форматов файлов
@@ -29,29 +42,42 @@ def allowed_file(filename):
     Возвращает:
     - True, если файл допустимого типа, иначе False
     """
-    logger.debug(f"Checking if file {filename} is allowed.")
+    logger.debug('Checking if file %s is allowed.', filename)
     return filename.lower().endswith(('png', 'jpg', 'jpeg', 'bmp', 'tiff'))
 
 
 uploads_root = os.path.join(app.root_path, 'uploads')  # Путь к директории загрузок
 
-
-def clean_uploads():
-    """
-    Очищает директорию загрузок.
-    Удаляет все файлы и папки в директории uploads при старте приложения.
-    """
-    logger.info('Checking for uploads directory...')
-    if os.path.exists(uploads_root):
-        logger.info('Cleaning old uploads...')
-        for item in os.listdir(uploads_root):
-            item_path = os.path.join(uploads_root, item)
-            if os.path.isdir(item_path):
-                logger.debug(f"Removing directory: {item_path}")
-                shutil.rmtree(item_path)  # Рекурсивно удаляем директорию и её содержимое
-            else:
-                logger.debug(f"Removing file: {item_path}")
-                os.remove(item_path)  # Удаляем файл
+# /healthz и /readyz: сервис готов, если том загрузок доступен для записи
+register_health_routes(app, {'uploads': lambda: check_writable(uploads_root)})
+
+# Очистка папки загрузок: поток запускается в каждом рабочем процессе (gunicorn.conf.py),
+# проход выполняет один из них
+janitor = SessionJanitor(uploads_root)
+register_janitor_metrics(janitor)
+
+# Производные изображения, которые image_processing создаёт при загрузке
+# (см. image_processing/derivatives.py): <папка сессии>/<каталог>/<имя файла>.webp
+THUMBNAILS_DIR = '.thumbs'
+PREVIEWS_DIR = '.previews'
+DERIVATIVE_EXTENSION = 'webp'
+# Имена загруженных файлов уникальны и не меняются, поэтому готовые производные можно кэшировать
+DERIVATIVE_MAX_AGE = 24 * 3600
+# Результаты генерации в папке сессии (gif_generator хранит только последний)
+RESULT_NAMES = ('animation.gif', 'animation.webp', 'animation.png', 'animation.mp4')
+# Адрес результата содержит версию (?v=<хэш содержимого>), поэтому по такому адресу его можно кэшировать бессрочно
+RESULT_MAX_AGE = 365 * 24 * 3600
+# Сколько версий результатов помнить (по пути, inode, размеру и mtime файла)
+VERSION_MEMO_SIZE = 1024
+# Внутренняя location шлюза с папкой загрузок (см. nginx/api_gateway.conf). Если задана, web_ui только
+# проверяет сессию и возвращает заголовок X-Accel-Redirect, а файл (с ETag, Last-Modified и Range) отдаёт nginx.
+# Без неё (запуск без шлюза) файлы отдаёт сам web_ui
+X_ACCEL_PREFIX = os.environ.get('X_ACCEL_PREFIX')
+# Адрес, на который браузер отправляет файлы. По умолчанию — /upload web_ui,
+# который передаёт тело запроса в image_processing без разбора. Если задан
+# (например, /upload шлюза, который ведёт прямо в image_processing), браузер
+# загружает файлы в image_processing сам, а web_ui видит их в манифесте сессии
+UPLOAD_URL = os.environ.get('UPLOAD_URL')
 
 
 @app.route('/get_images', methods=['GET'])
@@ -60,43 +86,20 @@ def get_images():
     Возвращает список изображений для текущей сессии.
 
     Возвращает:
-    - JSON с именами изображений
+    - JSON с именами изображений (images), URL их миниатюр (thumbnails)
+      и версией манифеста (version) для перестановки
     """
     session_id = session.get('session_id')
     if not session_id:
         logger.error("Session ID not found in get_images.")
         return jsonify(error='Session ID not found'), 400
-    logger.info('Function get_images. Getting list of images...')
-    upload_folder = os.path.join(uploads_root, session_id)
-    images = []
-
-    if os.path.exists(upload_folder):
-        # Получаем сохраненный порядок изображений из сессии
-        image_order = session.get('images', {})
-        logger.debug(f'Image order from session: {image_order}')
-
-        # Если порядок изображений сохранен, используем его
-        if image_order:
-            # Проверяем, является ли image_order словарем
-            if isinstance(image_order, list):
-                # Преобразуем список в словарь
-                image_order = {idx + 1: image_name for idx, image_name in enumerate(image_order)}
-                session['images'] = image_order  # Обновляем сессию словарем
-                logger.debug(f'Converted image order to dictionary: {image_order}')
-
-            # Сортируем изображения по сохраненному порядку
-            sorted_images = sorted(image_order.items(), key=lambda x: int(x[0]))
-            images = [image_name for _, image_name in sorted_images]
-            logger.debug(f'Sorted images: {images}')
-        else:
-            # Если порядок не сохранен, собираем изображения из папки
-            for f in os.listdir(upload_folder):
-                file_path = os.path.join(upload_folder, f)
-                if os.path.isfile(file_path) and allowed_file(f) and f != 'animation.gif':
-                    images.append(f)
-                    logger.debug(f'Added image to list: {f}')
-    logger.info(f'Got list of images: {images}')
-    return jsonify(images=images)
+    logger.debug('Function get_images. Getting list of images...')
+    # Порядок изображений хранится в манифесте сессии: одно чтение небольшого файла
+    manifest = read_manifest(os.path.join(uploads_root, session_id))
+    images = image_names(manifest)
+    logger.debug('Got list of images: %s', images)
+    thumbnails = [url_for('get_thumbnail', filename=image) for image in images]
+    return jsonify(images=images, thumbnails=thumbnails, version=manifest['version'])
 
 
 @app.route('/get_session_id', methods=['GET'])
@@ -107,14 +110,14 @@ def get_session_id():
     Возвращает:
     - JSON с session_id
     """
-    logger.info("Generating session_id")
+    logger.debug("Generating session_id")
     session_id = session.get('session_id')
-    logger.debug(f'Current session_id: {session_id}')
+    logger.debug('Current session_id: %s', session_id)
     if not session_id:
         session_id = str(uuid.uuid4())
         session['session_id'] = session_id
-        logger.info(f'Created new session_id: {session_id}')
-    logger.debug(f'Returning session_id: {session_id}')
+        logger.info('Created new session_id: %s', session_id)
+    logger.debug('Returning session_id: %s', session_id)
     return jsonify(session_id=session_id)
 
 
@@ -127,48 +130,51 @@ def index():
     Возвращает:
     - HTML шаблон с загруженными изображениями и параметрами для создания GIF
     """
-    logger.info('Transition to the home page...')
+    logger.debug('Transition to the home page...')
     # Проверяем, есть ли session_id в сессии
     if 'session_id' not in session:
         session['session_id'] = str(uuid.uuid4())
-        logger.info(f'Created new session session_id={session["session_id"]}')
+        logger.info('Created new session session_id=%s', session["session_id"])
 
         # Создаем папку для загрузки только при инициализации новой сессии
         upload_folder = os.path.join(uploads_root, session['session_id'])
         if not os.path.exists(upload_folder):
             try:
                 os.makedirs(upload_folder, exist_ok=True)
-                logger.info(f'Folder successfully created: {upload_folder}')
+                logger.info('Folder successfully created: %s', upload_folder)
             except Exception as e:
-                logger.error(f'Error creating folder: {e}')
+                logger.error('Error creating folder: %s', e)
                 return jsonify(error='Failed to create upload directory'), 500
 
     session_id = session['session_id']
-    logger.debug(f'Using existing session_id={session_id}')
+    logger.debug('Using existing session_id=%s', session_id)
 
-    # Получаем список изображений из папки загрузки
+    # Получаем список изображений из манифеста сессии
     upload_folder = os.path.join(uploads_root, session_id)
-    images = []
-    if os.path.exists(upload_folder):
-        for f in os.listdir(upload_folder):
-            file_path = os.path.join(upload_folder, f)
-            if os.path.isfile(file_path) and allowed_file(f) and f != 'animation.gif':
-                images.append(f)
-                logger.debug(f'Loaded image: {f}')
+    images = image_names(read_manifest(upload_folder))
 
-    gif_file = os.path.join(upload_folder, 'animation.gif')
+    # Результат последней генерации (animation.gif, .webp, .png или .mp4)
+    result_file = next((name for name in RESULT_NAMES if os.path.exists(os.path.join(upload_folder, name))), None)
 
     if request.method == 'POST':
         files = request.files.getlist('files')
+        entries = []
         for file in files:
             if file and allowed_file(file.filename):
                 filename = secure_filename(file.filename)  # Безопасное имя файла
                 file_path = os.path.join(upload_folder, filename)
                 file.save(file_path)
-                logger.debug(f'File {filename} saved to {file_path}')
-                images.append(filename)
+                logger.debug('File %s saved to %s', filename, file_path)
+                entries.append(make_entry(filename, file.filename, os.path.getsize(file_path)))
+        if entries:
+            names = [entry['name'] for entry in entries]
+            manifest = update_manifest(upload_folder, lambda manifest: manifest.update(
+                images=[entry for entry in manifest['images'] if entry['name'] not in names] + entries))
+            images = image_names(manifest)
 
-    return render_template('index.html', images=images, gif_file=gif_file if os.path.exists(gif_file) else None)
+    return render_template('index.html', images=images, gif_file=result_file,
+                           gif_url=result_url(upload_folder, result_file),
+                           upload_url=UPLOAD_URL or url_for('upload'), session_id=session_id)
 
 
 @app.route('/new_session', methods=['GET'])
@@ -180,13 +186,11 @@ def new_session():
     - Перенаправление на главную страницу
     """
     session_id = session.get('session_id')
-    logger.info(f'Cleaning session... Current session_id={session_id}')
+    logger.info('Cleaning session... Current session_id=%s', session_id)
 
     if session_id:
-        session_folder = os.path.join(uploads_root, session_id)
-        if os.path.exists(session_folder):
-            logger.info(f'Removing session folder: {session_folder}')
-            shutil.rmtree(session_folder)  # Полностью удаляем папку сессии
+        # Папка сразу убирается в корзину, файлы удаляются в фоне
+        janitor.discard(session_id)
 
     # Удаляем сессионные данные
     session.pop('session_id', None)
@@ -195,23 +199,106 @@ def new_session():
     # Генерируем новый session_id
     new_session_id = str(uuid.uuid4())
     session['session_id'] = new_session_id
-    logger.info(f'Created new session_id={new_session_id}')
+    logger.info('Created new session_id=%s', new_session_id)
     logger.info('Creating folder for uploads...')
     upload_folder = os.path.join(uploads_root, new_session_id)
     try:
         os.makedirs(upload_folder, exist_ok=True)
-        logger.info(f'Folder successfully created: {upload_folder}')
+        logger.info('Folder successfully created: %s', upload_folder)
     except Exception as e:
-        logger.error(f'Error creating folder: {e}')
+        logger.error('Error creating folder: %s', e)
         return jsonify(error='Failed to create upload directory'), 500
 
     return redirect(url_for('index'))
 
 
+_versions = OrderedDict()
+_versions_lock = threading.Lock()
+
+
+def file_version(path):
+    """
+    Возвращает версию файла: начало SHA-256 его содержимого.
+
+    Результат запоминается по (путь, inode, размер, mtime), поэтому файл
+    перечитывается, только когда меняется.
+    """
+    stat = os.stat(path)
+    memo_key = (path, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    with _versions_lock:
+        version = _versions.get(memo_key)
+        if version is not None:
+            _versions.move_to_end(memo_key)
+            return version
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    version = sha.hexdigest()[:16]
+    with _versions_lock:
+        _versions[memo_key] = version
+        if len(_versions) > VERSION_MEMO_SIZE:
+            _versions.popitem(last=False)
+    return version
+
+
+def result_url(upload_folder, result_file):
+    """Возвращает адрес результата с версией по содержимому или None, если результата нет."""
+    if not result_file:
+        return None
+    try:
+        version = file_version(os.path.join(upload_folder, result_file))
+    except FileNotFoundError:
+        return None
+    return url_for('get_uploaded_file', filename=result_file, v=version)
+
+
+def send_session_file(session_id, filename, max_age=None, immutable=False, etag=True):
+    """
+    Отдаёт файл из папки сессии.
+
+    С X_ACCEL_PREFIX файл отдаёт nginx по заголовку X-Accel-Redirect (тело
+    ответа пустое, Content-Type и Cache-Control nginx берёт из ответа), без
+    неё — send_file с ETag и поддержкой условных запросов и Range.
+
+    Входные параметры:
+    - session_id: Идентификатор сессии
+    - filename: Путь файла внутри папки сессии
+    - max_age: Время кэширования в браузере в секундах; None — браузер проверяет файл при каждом обращении
+    - immutable: Файл по этому адресу никогда не меняется
+    - etag: ETag для send_file (строка) или True — вычислить по файлу
+
+    Возвращает:
+    - Ответ с файлом; 404, если файла нет
+    """
+    path = safe_join(uploads_root, session_id, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    if X_ACCEL_PREFIX:
+        response = app.response_class(mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = X_ACCEL_PREFIX + quote(os.path.relpath(path, uploads_root))
+    else:
+        response = send_file(path, conditional=True, etag=etag)
+    if max_age:
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = max_age
+        response.cache_control.immutable = immutable
+        # Файлы сессии не должны попадать в общие кэши
+        response.cache_control.public = False
+        response.cache_control.private = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
 @app.route('/uploads/<filename>')
 def get_uploaded_file(filename):
     """
-    Возвращает загруженный файл.
+    Возвращает загруженный файл или результат генерации.
+
+    Результат по адресу с актуальной версией (?v=, см. result_url)
+    кэшируется бессрочно; по адресу без версии или с устаревшей версией
+    браузер проверяет его при каждом обращении.
 
     Входные параметры:
     - filename: Имя файла
@@ -223,20 +310,79 @@ def get_uploaded_file(filename):
     if not session_id:
         logger.error("Session ID not found in get_uploaded_file.")
         return "Session ID not found", 404
-    logger.debug(f'Returning file {filename} from session {session_id}')
-    return send_from_directory(os.path.join(uploads_root, session_id), filename)
+    logger.debug('Returning file %s from session %s', filename, session_id)
+    if filename not in RESULT_NAMES:
+        return send_session_file(session_id, filename)
+    try:
+        version = file_version(os.path.join(uploads_root, session_id, filename))
+    except FileNotFoundError:
+        abort(404)
+    if request.args.get('v') == version:
+        return send_session_file(session_id, filename, max_age=RESULT_MAX_AGE, immutable=True, etag=version)
+    return send_session_file(session_id, filename, etag=version)
+
+
+def send_derivative(kind_dir, filename):
+    """
+    Возвращает производное изображение текущей сессии.
+
+    Пока производное изображение не создано (оно создаётся в фоне после
+    загрузки), возвращается оригинал без кэширования в браузере.
+    """
+    session_id = session.get('session_id')
+    if not session_id:
+        logger.error("Session ID not found in send_derivative.")
+        return "Session ID not found", 404
+    upload_folder = os.path.join(uploads_root, session_id)
+    derivative_name = f'{secure_filename(filename)}.{DERIVATIVE_EXTENSION}'
+    if os.path.isfile(os.path.join(upload_folder, kind_dir, derivative_name)):
+        return send_session_file(session_id, f'{kind_dir}/{derivative_name}', max_age=DERIVATIVE_MAX_AGE)
+    logger.debug('Derivative %s/%s is not ready, returning original', kind_dir, filename)
+    return send_session_file(session_id, filename)
+
+
+@app.route('/thumbnails/<filename>')
+def get_thumbnail(filename):
+    """
+    Возвращает миниатюру загруженного изображения для галереи.
+
+    Входные параметры:
+    - filename: Имя исходного файла
+
+    Возвращает:
+    - Миниатюру (WebP) или оригинал, если миниатюра ещё не готова
+    """
+    return send_derivative(THUMBNAILS_DIR, filename)
+
+
+@app.route('/previews/<filename>')
+def get_preview(filename):
+    """
+    Возвращает превью загруженного изображения среднего размера.
+
+    Входные параметры:
+    - filename: Имя исходного файла
+
+    Возвращает:
+    - Превью (WebP) или оригинал, если превью ещё не готово
+    """
+    return send_derivative(PREVIEWS_DIR, filename)
 
 
 @app.route('/upload', methods=['POST'])
 def upload():
     """
     Обрабатывает загрузку изображений.
+
+    Тело запроса (multipart/form-data) не разбирается и не сохраняется:
+    оно передаётся в image_processing как есть, блоками, по мере получения.
+
     Входные параметры:
     - files: Файлы для загрузки
     Возвращает:
     - JSON с именами новых файлов или сообщение об ошибке
     """
-    logger.info("@@@ Вызываем маршрут /upload")
+    logger.debug("@@@ Вызываем маршрут /upload")
 
     # Получаем session_id из сессии
     session_id = session.get('session_id')
@@ -244,52 +390,48 @@ def upload():
         logger.error("Session ID не найден")
         return jsonify(error='Session ID не найден'), 400
 
-    logger.info(f'Session ID: {session_id}')
+    logger.debug('Session ID: %s', session_id)
 
-    # Получаем файлы из запроса
-    files = request.files.getlist('files')
-    if not files:
-        logger.error("Нет загруженных файлов")
-        return jsonify(error='No files uploaded'), 400
+    if request.mimetype != 'multipart/form-data':
+        logger.error('Неожиданный тип запроса: %s', request.mimetype)
+        return jsonify(error='Expected multipart/form-data'), 400
+    # Длина нужна, чтобы передать тело с Content-Length; браузеры всегда её указывают
+    if request.content_length is None:
+        logger.error("Не указан Content-Length")
+        return jsonify(error='Content-Length required'), 411
 
-    # Подготавливаем данные для отправки на image_processing
-    upload_url = 'http://api/upload'
-    headers = {'X-Session-ID': session_id}
-    files_data = [('files', (file.filename, file.stream, file.mimetype)) for file in files]
+    # Передаём тело запроса в image_processing вместе с исходным Content-Type (в нём граница multipart)
+    headers = {'X-Session-ID': session_id, 'Content-Type': request.content_type}
+    body = StreamBody(request.stream, request.content_length)
 
     try:
         # Отправляем запрос на image_processing
-        response = requests.post(upload_url, files=files_data, headers=headers)
+        started = time.perf_counter()
+        response = upstream.post('/upload', data=body, headers=headers,
+                                 timeout=(upstream.timeout[0], UPLOAD_READ_TIMEOUT))
+        elapsed = time.perf_counter() - started
+        logger.info('Передано в image_processing %s байт за %.2f с', body.bytes_sent, elapsed,
+                    extra={'bytes': body.bytes_sent, 'duration_ms': round(elapsed * 1000, 2)})
 
         # Проверяем статус ответа
         if response.status_code == 200:
             response_data = response.json()
             new_filenames = response_data.get('filenames', [])
             if isinstance(new_filenames, list):
-                # Получаем текущий порядок изображений из сессии
-                image_order = session.get('images', {})
-
-                # Преобразуем все ключи в строки
-                image_order = {str(k): v for k, v in image_order.items()}
-
-                # Добавляем новые изображения в словарь с новыми ключами
-                current_index = len(image_order) + 1
-                for new_filename in new_filenames:
-                    image_order[str(current_index)] = new_filename
-                    current_index += 1
-
-                # Обновляем сессию новым порядком изображений
-                session['images'] = image_order
-                logger.debug(f'Новые имена файлов добавлены в сессию: {new_filenames}')
+                # Порядок изображений image_processing записал в манифест сессии
+                logger.debug('Новые имена файлов: %s', new_filenames)
                 return jsonify(success=True, filenames=new_filenames)
             else:
-                logger.error(f'Ошибка при загрузке файлов: "filenames" не является списком, получено: {new_filenames}')
+                logger.error('Ошибка при загрузке файлов: "filenames" не является списком, получено: %s', new_filenames)
                 return jsonify(error='Unexpected response format from image_processing'), 500
         else:
-            logger.error(f'Ошибка при загрузке файлов: {response.text}')
+            logger.error('Ошибка при загрузке файлов: %s', response.text)
             return jsonify(error='Failed to upload files'), response.status_code
+    except requests.RequestException as e:
+        logger.error('image_processing недоступен при загрузке файлов: %s', e)
+        return jsonify(error='Image processing service unavailable'), error_status(e)
     except Exception as e:
-        logger.error(f'Ошибка при отправке запроса на image_processing: {str(e)}')
+        logger.error('Ошибка при отправке запроса на image_processing: %s', e)
         return jsonify(error='Internal server error'), 500
 
 
@@ -305,36 +447,29 @@ def remove_image():
     - JSON с успешным статусом или сообщением об ошибке
     """
     session_id = session.get('session_id')
-    logger.info(f"@@@ Route Remove Image. Sending Session ID from web_ui: {session_id}")
+    logger.debug('@@@ Route Remove Image. Sending Session ID from web_ui: %s', session_id)
     try:
         image_name = request.form.get('image_name')
         if not image_name:
             logger.error("Image name not provided in remove_image.")
             return jsonify({'success': False, 'message': 'Image name not specified'}), 400
 
-        # Удаляем изображение из сессии
-        image_order = session.get('images', {})
-        if image_order:
-            if isinstance(image_order, dict):
-                image_order = {k: v for k, v in image_order.items() if v != image_name}
-            elif isinstance(image_order, list):
-                image_order = [img for img in image_order if img != image_name]
-            session['images'] = image_order
-            logger.debug(f'Updated image order in session: {image_order}')
-
         # Отправляем запрос к микросервису image_processing
-        response = requests.post(f'http://api/remove_image',
+        response = upstream.post('/remove_image',
                                  headers={'X-Session-ID': session_id},
                                  data={'image_name': image_name})
 
         if response.status_code == 200:
-            logger.debug(f'Successfully removed image {image_name}')
+            logger.debug('Successfully removed image %s', image_name)
             return jsonify(response.json()), 200
         else:
-            logger.error(f'Error removing image {image_name}: {response.text}')
+            logger.error('Error removing image %s: %s', image_name, response.text)
             return jsonify({'success': False, 'message': response.text}), response.status_code
+    except requests.RequestException as e:
+        logger.error('Error removing image %s: image_processing unavailable: %s', image_name, e)
+        return jsonify({'success': False, 'message': 'Image processing service unavailable'}), error_status(e)
     except Exception as e:
-        logger.error(f'Error removing image {image_name}: {str(e)}')
+        logger.error('Error removing image %s: %s', image_name, e)
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
@@ -345,9 +480,12 @@ def reorder_images():
 
     Входные параметры:
     - image_order: JSON с новым порядком изображений
+    - version: Версия манифеста, по которой построен порядок (необязательно)
 
     Возвращает:
-    - JSON с успешным статусом или сообщением об ошибке
+    - JSON с успешным статусом и новой версией манифеста, 409 с текущим
+      порядком, если порядок успели изменить из другой вкладки,
+      или сообщение об ошибке
     """
     session_id = session.get('session_id')
     if not session_id:
@@ -355,33 +493,27 @@ def reorder_images():
         return jsonify(success=False, error='Session ID not found'), 400
 
     image_order = request.form.get('image_order')
-    logger.info(f'Received image_order!!!!!!!!!!: {image_order}')
+    logger.debug('Received image_order: %s', image_order)
 
     if not image_order:
         logger.error("Image order not provided in reorder_images.")
         return jsonify(success=False, error='Image order not provided'), 400
 
-    # Преобразуем строку image_order в словарь
-    image_order_dict = json.loads(image_order)
-    logger.debug(f'Received image_order: {image_order_dict}')
-
-    # Обновляем порядок изображений в сессии
-    session['images'] = image_order_dict  # Убедимся, что сохраняем словарь
-    logger.debug(f'Updated image order in session: {image_order_dict}')
+    # Отправляем запрос в image_processing: он записывает новый порядок в манифест сессии
+    data = {'image_order': image_order, 'version': request.form.get('version')}
 
-    # Отправляем запрос в image_processing для изменения порядка изображений
-    reorder_url = 'http://api/reorder_images'
-    logger.info(f'Sending image_order: {image_order_dict}')
-
-    response = requests.post(reorder_url,
+    response = upstream.post('/reorder_images',
                              headers={'X-Session-ID': session_id},
-                             data={'image_order': json.dumps(image_order_dict)})
+                             data=data)
 
     if response.status_code == 200:
         logger.debug('Successfully reordered images')
-        return jsonify(success=True)
+        return jsonify(success=True, version=response.json().get('version'))
+    elif response.status_code == 409:
+        logger.warning('Image order was changed concurrently, reorder rejected')
+        return jsonify(success=False, **response.json()), 409
     else:
-        logger.error(f'Error reordering images: {response.text}')
+        logger.error('Error reordering images: %s', response.text)
         return jsonify(success=False, error='Failed to reorder images'), response.status_code
 
 
@@ -394,54 +526,133 @@ def generate_gif():
     - duration: Длительность кадра в миллисекундах
     - loop: Количество циклов воспроизведения GIF
     - resize: Новые размеры изображений в формате "ШxВ"
+    - dither: Дизеринг при отображении кадров в общую палитру ("1" — включён)
+    - format: Формат результата (gif, webp, apng, mp4)
 
     Возвращает:
-    - Перенаправление на главную страницу или сообщение об ошибке
+    - JSON с идентификатором задачи генерации (202) или сообщение об ошибке
     """
     session_id = session.get('session_id')
-    logger.info('@@@ Selected route Create GIF...')
-    logger.info("Sending data to gif-generator")
+    logger.debug('@@@ Selected route Create GIF...')
+    logger.debug("Sending data to gif-generator")
     if not session_id:
         logger.error("Session ID not found in generate_gif.")
         return redirect(url_for('index'))
-    logger.debug(f'session_id={session_id}')
+    logger.debug('session_id=%s', session_id)
     duration = request.form.get('duration', 300)
-    logger.debug(f'duration={duration}')
+    logger.debug('duration=%s', duration)
     loop = request.form.get('loop', 0)
-    logger.debug(f'loop={loop}')
+    logger.debug('loop=%s', loop)
     resize = request.form.get('resize')
-    logger.debug(f'resize={resize}')
+    logger.debug('resize=%s', resize)
+    dither = request.form.get('dither')
+    logger.debug('dither=%s', dither)
+    output_format = request.form.get('format')
+    logger.debug('format=%s', output_format)
 
-    # Получаем порядок изображений из сессии
-    image_order = session.get('images', {})
-    if not image_order:
-        logger.error("No image order found in session in generate_gif.")
-        return jsonify(error='No image order found in session'), 400
+    # Порядок кадров gif_generator читает из манифеста сессии
+    if not image_names(read_manifest(os.path.join(uploads_root, session_id))):
+        logger.error("No images found in session manifest in generate_gif.")
+        return jsonify(error='No images uploaded'), 400
 
-    generate_url = 'http://api/generate_gif'
     headers = {'X-Session-ID': session_id}
     data = {
         'duration': duration,
         'loop': loop,
         'resize': resize,
-        'image_order': json.dumps(image_order)  # Добавляем порядок изображений в данные запроса
+        'dither': dither,
+        'format': output_format,
     }
 
-    response = requests.post(generate_url, headers=headers, data=data)
-    if response.status_code == 200:
-        response_data = response.json()
-        gif_url = response_data.get('gif_url')
-        if gif_url:
-            logger.debug(f'Successfully generated GIF: {gif_url}')
-            return jsonify(success=True, gif_url=gif_url)
-        else:
-            logger.error("GIF URL not found in response in generate_gif.")
-            return jsonify(success=False, error='GIF URL not found in response'), 500
+    response = upstream.post('/generate_gif', headers=headers, data=data)
+    if response.status_code == 202:
+        job_id = response.json().get('job_id')
+        logger.debug('GIF generation job submitted: %s', job_id)
+        return jsonify(success=True, job_id=job_id), 202
+    elif response.status_code == 429:
+        logger.error('GIF generation queue is full.')
+        return jsonify(success=False, error='Сервер занят, попробуйте позже'), 429
+    elif response.status_code == 400:
+        # Неверные параметры или недоступный формат: сообщение gif_generator показывается пользователю
+        logger.error('GIF generation rejected: %s', response.text)
+        is_json = response.headers.get('Content-Type', '').startswith('application/json')
+        error = (response.json() if is_json else {}).get('error', 'Invalid parameters')
+        return jsonify(success=False, error=error), 400
     else:
-        logger.error(f'Error generating GIF: {response.text}')
+        logger.error('Error generating GIF: %s', response.text)
         return jsonify(error='Failed to generate GIF'), 500
 
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    Возвращает статус задачи генерации GIF.
+
+    Входные параметры:
+    - job_id: Идентификатор задачи
+
+    Возвращает:
+    - JSON со статусом, прогрессом (frames_done/frames_total) и URL GIF
+    """
+    session_id = session.get('session_id')
+    if not session_id:
+        logger.error("Session ID not found in job_status.")
+        return jsonify(error='Session ID not found'), 400
+
+    response = upstream.get(f'/jobs/{job_id}', headers={'X-Session-ID': session_id})
+    if response.status_code == 200:
+        return jsonify(response.json())
+    else:
+        logger.error('Error getting job status %s: %s', job_id, response.text)
+        return jsonify(error='Job not found'), response.status_code
+
+
+@app.errorhandler(requests.RequestException)
+def upstream_unavailable(e):
+    """
+    Отвечает клиенту, если API недоступен: соединение не установлено
+    или ответ не получен за тайм-аут (после всех повторов).
+
+    Возвращает:
+    - JSON с сообщением об ошибке и статусом 502 или 504
+    """
+    logger.error('Upstream request failed: %s', e)
+    return jsonify(success=False, error='Upstream service unavailable'), error_status(e)
+
+
+@app.before_request
+def mark_session_used():
+    """Обновляет время использования сессии для очистки (не чаще раза в минуту)."""
+    session_id = session.get('session_id')
+    if session_id:
+        janitor.touch(session_id)
+
+
+@app.route('/janitor_stats', methods=['GET'])
+def janitor_stats():
+    """
+    Возвращает итоги последнего прохода очистки папки загрузок.
+
+    Возвращает:
+    - JSON: число сессий и их объём, удалённые сессии (по сроку и по квоте),
+      освобождённые байты, длительность и время завершения прохода
+    """
+    return jsonify(janitor.stats())
+
+
+@app.route('/upstream_metrics', methods=['GET'])
+def upstream_metrics():
+    """
+    Возвращает статистику запросов web_ui к API.
+
+    Возвращает:
+    - JSON: для каждой конечной точки число запросов, ошибок (5xx и сбои соединения)
+      и задержки (среднее, p50, p95, p99, максимум) в миллисекундах
+    """
+    return jsonify(upstream.metrics())
+
+
 if __name__ == '__main__':
-    clean_uploads()  # Очищаем директорию загрузок при запуске приложения
-    app.run(debug=True, host='0.0.0.0', port=5000)  # Запускаем Flask-приложение
+    # Сервер разработки; в контейнере сервис запускается через gunicorn (gunicorn.conf.py)
+    janitor.start()  # Фоновая очистка старых сессий
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=5000)  # Запускаем Flask-приложение
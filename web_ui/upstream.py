@@ -0,0 +1,181 @@
+# web_ui/upstream.py
+
+import logging  # Для логирования событий
+import os  # Для чтения настроек из окружения
+import threading  # Для защиты статистики от одновременного изменения
+import time  # Для измерения задержек
+from collections import deque  # Для окна последних измерений
+import requests  # Для HTTP-запросов к API
+from requests.adapters import HTTPAdapter  # Для пула соединений
+from urllib3.util.retry import Retry  # Для повторов с экспоненциальной задержкой
+from common.logging_setup import with_request_id  # Передача идентификатора запроса в API
+from common.metrics import histogram  # Длительность запросов к API для /metrics
+
+logger = logging.getLogger(__name__)
+
+# Адрес шлюза API (nginx), через который web_ui обращается к остальным сервисам
+UPSTREAM_URL = os.environ.get('UPSTREAM_URL', 'http://api').rstrip('/')
+# Тайм-ауты в секундах: на установку соединения и на ожидание ответа.
+# Загрузка файлов идёт дольше обычных вызовов, поэтому у неё свой тайм-аут ответа
+CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.environ.get('UPSTREAM_READ_TIMEOUT', 30))
+UPLOAD_READ_TIMEOUT = float(os.environ.get('UPSTREAM_UPLOAD_READ_TIMEOUT', 300))
+# Размер пула keep-alive соединений к шлюзу, по умолчанию — по числу потоков
+# gunicorn. Когда все соединения заняты, запрос ждёт свободное, а не открывает новое
+POOL_SIZE = int(os.environ.get('UPSTREAM_POOL_SIZE', os.environ.get('GUNICORN_THREADS', 32)))
+# Повторы: идемпотентные запросы (GET и т. п.) повторяются при ошибках соединения,
+# обрыве ответа и ответах 502/503/504; POST — только если соединение не удалось
+# установить (запрос до сервиса не дошёл)
+RETRIES = int(os.environ.get('UPSTREAM_RETRIES', 2))
+RETRY_BACKOFF = float(os.environ.get('UPSTREAM_RETRY_BACKOFF', 0.2))
+RETRY_STATUSES = (502, 503, 504)
+# Размер блока при передаче тела запроса в API (см. StreamBody)
+RELAY_CHUNK_SIZE = 256 * 1024
+# Сколько последних измерений хранится для расчёта процентилей
+LATENCY_WINDOW = 1024
+
+# Те же измерения в /metrics; метка error — ответ 5xx или ошибка соединения
+UPSTREAM_SECONDS = histogram('web_ui_upstream_request_duration_seconds', 'Длительность запросов web_ui к API',
+                             ['endpoint', 'error'])
+
+
+class LatencyStats:
+    """Статистика задержек запросов к одной конечной точке API."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, elapsed, failed):
+        self.count += 1
+        self.errors += failed
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.samples.append(elapsed)
+
+    def snapshot(self):
+        samples = sorted(self.samples)
+
+        def percentile(p):
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 2)
+
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': round(self.total / self.count * 1000, 2) if self.count else None,
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'max_ms': round(self.max * 1000, 2),
+        }
+
+
+class UpstreamClient:
+    """
+    Общий HTTP-клиент web_ui для запросов к API.
+
+    Одна requests.Session на процесс: соединения к шлюзу переиспользуются
+    (keep-alive), их число ограничено пулом, у каждого запроса есть
+    тайм-ауты, а повторы выполняются по политике urllib3 Retry.
+    Сессия и пул потокобезопасны, поэтому клиент общий для всех потоков.
+    """
+
+    def __init__(self, base_url=UPSTREAM_URL, pool_size=POOL_SIZE, retries=RETRIES,
+                 backoff=RETRY_BACKOFF, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)):
+        self.base_url = base_url
+        self.timeout = timeout
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                      backoff_factor=backoff, status_forcelist=RETRY_STATUSES,
+                      allowed_methods=Retry.DEFAULT_ALLOWED_METHODS, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def request(self, method, path, timeout=None, **kwargs):
+        """
+        Выполняет запрос к API.
+
+        Параметры:
+        - method: HTTP-метод.
+        - path: Путь относительно адреса шлюза, например '/upload'.
+        - timeout: Тайм-ауты (соединение, ответ) или None — по умолчанию клиента.
+        - kwargs: Остальные параметры requests (data, files, headers, ...).
+
+        Возвращает:
+        - requests.Response. Ошибки соединения и тайм-ауты (после повторов)
+          возникают как requests.RequestException.
+        """
+        endpoint = path.strip('/').split('/', 1)[0] or '/'
+        kwargs['headers'] = with_request_id(kwargs.get('headers'))
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = self.session.request(method, f'{self.base_url}{path}',
+                                            timeout=timeout or self.timeout, **kwargs)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._stats_lock:
+                self._stats.setdefault(endpoint, LatencyStats()).observe(elapsed, failed)
+            UPSTREAM_SECONDS.labels(endpoint, 'true' if failed else 'false').observe(elapsed)
+            logger.debug('Upstream %s %s: %.1f ms', method, path, elapsed * 1000)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def metrics(self):
+        """Возвращает статистику задержек по конечным точкам API."""
+        with self._stats_lock:
+            return {endpoint: stats.snapshot() for endpoint, stats in sorted(self._stats.items())}
+
+
+class StreamBody:
+    """
+    Тело входящего запроса для передачи в API без разбора и буферизации.
+
+    requests отправляет объект с __len__ и read() потоково, с заголовком
+    Content-Length (без chunked-кодирования). http.client запрашивает данные
+    блоками по 8–16 КиБ; read() читает более крупными блоками chunk_size,
+    чтобы уменьшить число системных вызовов.
+    """
+
+    def __init__(self, stream, length, chunk_size=RELAY_CHUNK_SIZE):
+        self.stream = stream
+        self.length = length
+        self.chunk_size = chunk_size
+        self.bytes_sent = 0
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        chunk = self.stream.read(max(size, self.chunk_size))
+        self.bytes_sent += len(chunk)
+        return chunk
+
+    def __iter__(self):
+        while True:
+            chunk = self.read()
+            if not chunk:
+                return
+            yield chunk
+
+
+def error_status(exc):
+    """Возвращает HTTP-статус ответа клиенту для ошибки запроса к API: 504 при тайм-ауте, иначе 502."""
+    return 504 if isinstance(exc, requests.Timeout) else 502
+
+
+upstream = UpstreamClient()